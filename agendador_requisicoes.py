@@ -0,0 +1,214 @@
+import time
+import random
+import logging
+import threading
+from datetime import datetime, timezone
+
+import requests
+
+# Campos de limite de taxa acrescentados a cada query
+RATE_LIMIT_FIELDS = "rateLimit { cost remaining resetAt }"
+
+# Limite primário da API GraphQL: 5000 pontos por hora por token
+POINTS_PER_HOUR = 5000
+# Abaixo desse saldo o token é pausado até o resetAt
+MIN_REMAINING = 50
+# Espera mínima recomendada pelo GitHub para limites secundários sem Retry-After
+SECONDARY_LIMIT_WAIT = 60
+RETRYABLE_STATUS = (500, 502, 503, 504)
+
+def with_rate_limit(query):
+    """Acrescenta 'rateLimit { cost remaining resetAt }' à seleção raiz da query (se ainda não houver)."""
+    if 'rateLimit' in query:
+        return query
+    start = query.index('{')
+    return f"{query[:start + 1]}\n  {RATE_LIMIT_FIELDS}{query[start + 1:]}"
+
+def parse_reset_at(reset_at):
+    return datetime.strptime(reset_at, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc).timestamp()
+
+class TokenBucket:
+    """Balde de fichas: 'rate' pontos por segundo, acumulando até 'capacity'."""
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """Bloqueia até haver 'amount' pontos. Retorna o tempo esperado (s)."""
+        waited = 0.0
+        amount = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= amount:
+                    self._tokens -= amount
+                    return waited
+                wait = (amount - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+class TokenState:
+    def __init__(self, token):
+        self.token = token
+        self.remaining = POINTS_PER_HOUR
+        self.reset_at = 0.0
+        self.blocked_until = 0.0
+
+class RequestScheduler:
+    """
+    Agendador de requisições GraphQL ciente dos limites de taxa do GitHub.
+
+    - Cada query passa a retornar rateLimit { cost remaining resetAt }; o custo
+      observado alimenta um balde de fichas que ritma as requisições, e o
+      saldo de cada token decide quando ele deve ser pausado até o reset.
+    - Respeita Retry-After e respostas de limite secundário (403/429),
+      pausando apenas o token afetado.
+    - Erros transitórios usam backoff exponencial com jitter completo.
+    - Com vários tokens, escolhe o de maior saldo que não esteja pausado.
+    - Vazão e tempo de espera são registrados periodicamente no log.
+    """
+    def __init__(self, tokens, url, session=None, points_per_hour=POINTS_PER_HOUR, burst=100,
+                 max_retries=6, base_backoff=1.0, max_backoff=120.0, log_every=50):
+        tokens = [token for token in tokens if token] or ['']
+        self.url = url
+        self.session = session or requests.Session()
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.log_every = log_every
+        self._tokens = [TokenState(token) for token in tokens]
+        self._bucket = TokenBucket(len(self._tokens) * points_per_hour / 3600.0, burst)
+        self._lock = threading.Lock()
+        self._last_cost = 1
+        self._started = time.monotonic()
+        self._requests = 0
+        self._points = 0
+        self._wait_time = 0.0
+
+    def _pick_token(self):
+        """Escolhe o token disponível com maior saldo, esperando se todos estiverem pausados."""
+        while True:
+            with self._lock:
+                now = time.time()
+                for state in self._tokens:
+                    if state.blocked_until <= now and state.reset_at and state.reset_at <= now:
+                        state.remaining = POINTS_PER_HOUR
+                available = [state for state in self._tokens if state.blocked_until <= now]
+                if available:
+                    return max(available, key=lambda state: state.remaining)
+                wait = min(state.blocked_until for state in self._tokens) - now
+            logging.info(f"Todos os tokens em espera; aguardando {wait:.1f}s")
+            self._sleep(max(wait, 0.1))
+
+    def _sleep(self, seconds):
+        time.sleep(seconds)
+        with self._lock:
+            self._wait_time += seconds
+
+    def _backoff(self, attempt):
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+
+    def _block(self, state, until, reason):
+        with self._lock:
+            state.blocked_until = max(state.blocked_until, until)
+        logging.warning(f"Token ...{state.token[-4:]} pausado por {until - time.time():.0f}s: {reason}")
+
+    def _update_rate_limit(self, state, result):
+        rate_limit = (result.get("data") or {}).get("rateLimit")
+        if not rate_limit:
+            return
+        with self._lock:
+            state.remaining = rate_limit["remaining"]
+            state.reset_at = parse_reset_at(rate_limit["resetAt"])
+            self._last_cost = max(1, rate_limit["cost"])
+            self._points += rate_limit["cost"]
+        if state.remaining < MIN_REMAINING:
+            self._block(state, state.reset_at, f"saldo baixo ({state.remaining} pontos)")
+
+    def _handle_limited_response(self, state, response):
+        """Trata 403/429 de limite de taxa. Retorna True se a resposta era de limite."""
+        text = response.text.lower()
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            self._block(state, time.time() + float(retry_after), "Retry-After")
+            return True
+        if response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers.get("X-RateLimit-Reset", time.time() + SECONDARY_LIMIT_WAIT))
+            self._block(state, reset, "limite primário esgotado")
+            return True
+        if "secondary rate limit" in text or "abuse" in text or response.status_code == 429:
+            self._block(state, time.time() + SECONDARY_LIMIT_WAIT, "limite secundário")
+            return True
+        return False
+
+    def _log_throughput(self):
+        with self._lock:
+            self._requests += 1
+            if self._requests % self.log_every:
+                return
+            elapsed = time.monotonic() - self._started
+            requests_count, points, wait_time = self._requests, self._points, self._wait_time
+            remaining = ", ".join(f"...{state.token[-4:]}={state.remaining}" for state in self._tokens)
+        logging.info(f"GraphQL: {requests_count} requisições em {elapsed:.0f}s "
+                     f"({requests_count / elapsed:.2f} req/s, {points / elapsed * 3600:.0f} pontos/h), "
+                     f"espera acumulada {wait_time:.1f}s, saldo: {remaining}")
+
+    @property
+    def stats(self):
+        with self._lock:
+            return {'requests': self._requests, 'points': self._points, 'wait_time': self._wait_time,
+                    'elapsed': time.monotonic() - self._started}
+
+    def execute(self, query, variables):
+        """Executa a query respeitando os limites; retorna o JSON da resposta."""
+        query = with_rate_limit(query)
+        # Esperas por limite de taxa não contam como tentativa; apenas erros contam
+        attempt = 0
+        while attempt < self.max_retries:
+            waited = self._bucket.acquire(self._last_cost)
+            if waited:
+                with self._lock:
+                    self._wait_time += waited
+            state = self._pick_token()
+            headers = {"Authorization": f"Bearer {state.token}"} if state.token else {}
+
+            try:
+                response = self.session.post(self.url, json={'query': query, 'variables': variables},
+                                             headers=headers, timeout=30)
+            except requests.exceptions.RequestException as e:
+                wait = self._backoff(attempt)
+                logging.warning(f"Tentativa {attempt + 1}/{self.max_retries}: erro de requisição ({e}); "
+                                f"nova tentativa em {wait:.1f}s")
+                self._sleep(wait)
+                attempt += 1
+                continue
+
+            if response.status_code in (403, 429) and self._handle_limited_response(state, response):
+                continue
+
+            if response.status_code in RETRYABLE_STATUS:
+                wait = self._backoff(attempt)
+                logging.warning(f"Tentativa {attempt + 1}/{self.max_retries}: HTTP {response.status_code}; "
+                                f"nova tentativa em {wait:.1f}s")
+                self._sleep(wait)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            result = response.json()
+            self._update_rate_limit(state, result)
+
+            errors = result.get("errors") or []
+            if any(error.get("type") == "RATE_LIMITED" for error in errors):
+                self._block(state, state.reset_at or time.time() + SECONDARY_LIMIT_WAIT, "RATE_LIMITED")
+                continue
+
+            self._log_throughput()
+            return result
+
+        raise Exception(f"Query falhou após {self.max_retries} tentativas.")
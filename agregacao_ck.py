@@ -0,0 +1,129 @@
+import os
+import numpy as np
+import pandas as pd
+
+# Colunas lidas dos CSVs do CK (as demais nem chegam a ser carregadas)
+CLASS_METRIC_COLUMNS = ['cbo', 'dit', 'lcom', 'loc']
+METHOD_METRIC_COLUMNS = ['cbo', 'wmc', 'rfc', 'loc']
+STATISTICS = ['count', 'sum', 'mean', 'std', 'min', 'max', 'median', 'p90']
+
+CHUNK_SIZE = 50_000
+RESERVOIR_SIZE = 20_000  # Amostra usada para mediana/p90 (exatos até esse número de linhas)
+
+class StreamingStats:
+    """
+    Estatísticas de uma coluna calculadas em uma única passada, por blocos.
+
+    Média e desvio padrão usam a combinação de Chan et al. (n, média, M2)
+    acumulada em float64; soma (de colunas inteiras), mínimo e máximo são
+    exatos; mediana e p90 vêm de uma
+    amostra de reservatório de tamanho fixo, então a memória não cresce com o
+    número de linhas.
+    """
+    def __init__(self, reservoir_size=RESERVOIR_SIZE, seed=0):
+        self.count = 0
+        self.total = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._reservoir = np.empty(reservoir_size, dtype=np.float64)
+        self._reservoir_size = reservoir_size
+        self._rng = np.random.default_rng(seed)
+
+    def update(self, values):
+        values = np.asarray(values)
+        if values.dtype.kind == 'i':
+            # Soma inteira exata (como o int64 do pandas); o restante segue em float64
+            self.total += int(values.sum())
+            values = values.astype(np.float64)
+        else:
+            values = values.astype(np.float64)
+            values = values[~np.isnan(values)]
+            self.total += values.sum()
+        n = values.size
+        if n == 0:
+            return
+
+        chunk_mean = values.mean()
+        chunk_m2 = ((values - chunk_mean) ** 2).sum()
+        delta = chunk_mean - self.mean
+        new_count = self.count + n
+        self.m2 += chunk_m2 + delta ** 2 * self.count * n / new_count
+        self.mean += delta * n / new_count
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._sample(values)
+        self.count = new_count
+
+    def _sample(self, values):
+        """Algoritmo R vetorizado: o elemento de índice global t entra com probabilidade k/(t+1)."""
+        k = self._reservoir_size
+        filled = min(self.count, k)
+        if filled < k:
+            take = min(k - filled, values.size)
+            self._reservoir[filled:filled + take] = values[:take]
+            values = values[take:]
+            start = self.count + take
+        else:
+            start = self.count
+        if values.size == 0:
+            return
+        positions = self._rng.integers(0, np.arange(start, start + values.size) + 1)
+        accepted = positions < k
+        self._reservoir[positions[accepted]] = values[accepted]
+
+    def result(self):
+        if self.count == 0:
+            return {stat: np.nan if stat != 'count' else 0 for stat in STATISTICS}
+        sample = self._reservoir[:min(self.count, self._reservoir_size)]
+        median, p90 = np.quantile(sample, [0.5, 0.9])
+        return {
+            'count': self.count,
+            'sum': float(self.total),
+            'mean': float(self.mean),
+            'std': float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else np.nan,
+            'min': float(self.min),
+            'max': float(self.max),
+            'median': float(median),
+            'p90': float(p90)
+        }
+
+def aggregate_csv(path, columns, chunksize=CHUNK_SIZE):
+    """
+    Agrega um CSV do CK em blocos, lendo apenas as colunas pedidas. As
+    métricas do CK são inteiras: lidas como int64 (com valores ausentes
+    descartados), sem o arredondamento que float32 impõe acima de 2^24 (o
+    LCOM de classes grandes passa disso).
+
+    Returns:
+        dict: coluna -> estatísticas (ver STATISTICS). Vazio se o arquivo não existir.
+    """
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return {}
+
+    header = pd.read_csv(path, nrows=0).columns
+    present = [column for column in columns if column in header]
+    stats = {column: StreamingStats() for column in present}
+    if not present:
+        return {}
+
+    for chunk in pd.read_csv(path, usecols=present, dtype={column: 'Int64' for column in present},
+                             chunksize=chunksize):
+        for column in present:
+            stats[column].update(chunk[column].dropna().to_numpy(dtype=np.int64))
+
+    return {column: column_stats.result() for column, column_stats in stats.items()}
+
+def flatten(prefix, aggregated, columns):
+    """Achata {coluna: {estatística: valor}} em {prefixo_coluna_estatística: valor}."""
+    return {
+        f"{prefix}_{column}_{stat}": aggregated.get(column, {}).get(stat, np.nan)
+        for column in columns for stat in STATISTICS
+    }
+
+def detailed_columns():
+    """Colunas do CSV de estatísticas detalhadas, na ordem de escrita."""
+    return (['repo_name']
+            + list(flatten('class', {}, CLASS_METRIC_COLUMNS))
+            + list(flatten('method', {}, METHOD_METRIC_COLUMNS)))
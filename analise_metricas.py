@@ -0,0 +1,274 @@
+from dataclasses import dataclass, fields
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+METRICAS_QUALIDADE_MEDIA = ['cbo_mean', 'dit_mean', 'lcom_mean']
+METRICAS_QUALIDADE_TOTAL = ['cbo_total', 'dit_total', 'lcom_total']
+METRICAS_REPOSITORIO = ['stars', 'releases', 'age_years']
+METRICAS = METRICAS_QUALIDADE_MEDIA + METRICAS_QUALIDADE_TOTAL + METRICAS_REPOSITORIO
+
+# Pares usados nas RQs (scatter plots e relatório de correlações)
+PARES_RQ = [
+    ('stars', 'cbo_mean'),
+    ('stars', 'dit_mean'),
+    ('stars', 'lcom_mean'),
+    ('stars', 'releases'),
+    ('age_years', 'cbo_mean'),
+    ('age_years', 'releases'),
+    ('releases', 'cbo_mean'),
+]
+
+CATEGORIAS = {
+    'categoria_stars': ('stars', [0, 1000, 10000, 50000, float('inf')],
+                        ['Baixa (<1K)', 'Média (1K-10K)', 'Alta (10K-50K)', 'Muito Alta (>50K)']),
+    'categoria_idade': ('age_years', [0, 2, 5, 10, float('inf')],
+                        ['Novo (0-2 anos)', 'Jovem (2-5 anos)', 'Maduro (5-10 anos)', 'Antigo (>10 anos)']),
+}
+
+# Métricas normalizadas (0-1) usadas nos scores do ranking
+METRICAS_NORMALIZADAS = ['stars', 'releases', 'age_years', 'cbo_mean', 'dit_mean', 'lcom_mean']
+
+N_BOOTSTRAP = 2000
+NIVEL_CONFIANCA = 0.95
+
+# Amostra uniforme de tamanho fixo (KDE e pontos nos gráficos agregados)
+TAMANHO_AMOSTRA = 5000
+# Faixas de mesma contagem usadas nas linhas de tendência por quantis
+N_FAIXAS_QUANTIS = 20
+
+# Limite de elementos (reamostragens x repositórios) por bloco do bootstrap
+BOOTSTRAP_BLOCO = 4_000_000
+# Limite total de elementos do bootstrap; acima dele o número de reamostragens é reduzido
+BOOTSTRAP_MAX_ELEMENTOS = 50_000_000
+N_BOOTSTRAP_MINIMO = 200
+
+def _congelar(valor):
+    """Converte dicionários em MappingProxyType e arrays em arrays somente leitura (recursivo)."""
+    if isinstance(valor, (dict, MappingProxyType)):
+        return MappingProxyType({chave: _congelar(item) for chave, item in valor.items()})
+    if isinstance(valor, np.ndarray):
+        valor = valor.copy()
+        valor.setflags(write=False)
+    return valor
+
+def _descongelar(valor):
+    if isinstance(valor, MappingProxyType):
+        return {chave: _descongelar(item) for chave, item in valor.items()}
+    return valor
+
+def _correlacao_matriz(X):
+    """Pearson entre todas as colunas de X (n x k) em um único produto matricial."""
+    Z = X - X.mean(axis=0)
+    desvio = np.sqrt((Z ** 2).sum(axis=0))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        Z = Z / desvio
+    return Z.T @ Z
+
+def _postos_medios(denso, k, indices):
+    """
+    Postos em cada amostra (linha de 'indices'), com empates recebendo o posto
+    médio, como no Spearman. 'denso' é o código (0..k-1) de cada valor; em vez
+    de ordenar cada amostra: posto = (valores menores) + (valores iguais + 1) / 2.
+    """
+    amostras = denso[indices]
+    b, n = amostras.shape
+    # Códigos de cada amostra em um plano próprio (linha * k + código): uma só bincount/cumsum
+    planos = amostras + (np.arange(b) * k)[:, None]
+    contagens = np.bincount(planos.ravel(), minlength=b * k)
+    # Cada linha tem n valores, então o acumulado da linha r começa em r * n
+    postos = np.cumsum(contagens) - (contagens - 1) / 2 - np.repeat(np.arange(b) * n, k)
+    return postos[planos]
+
+def _padronizar_linhas(A):
+    """Centraliza cada linha e a divide pela sua norma: Pearson vira a soma do produto."""
+    A = A - A.mean(axis=1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return A / np.sqrt((A ** 2).sum(axis=1, keepdims=True))
+
+def _bootstrap(X, colunas, pares, n_bootstrap, rng):
+    """
+    Pearson e Spearman de todas as reamostragens, para todos os pares, sem
+    laço por reamostragem. As reamostragens são geradas em blocos e, em cada
+    bloco, valores e postos de cada coluna são padronizados uma única vez e
+    reaproveitados por todos os pares que a usam.
+
+    Returns:
+        dict: par -> (array de Pearson, array de Spearman), um valor por reamostragem
+    """
+    n = X.shape[0]
+    usadas = sorted({colunas.index(coluna) for par in pares for coluna in par})
+    codigos = {}
+    for i in usadas:
+        unicos, denso = np.unique(X[:, i], return_inverse=True)
+        codigos[i] = (denso, len(unicos))
+    resultados = {par: ([], []) for par in pares}
+    bloco = max(1, BOOTSTRAP_BLOCO // n)
+    for inicio in range(0, n_bootstrap, bloco):
+        amostras = rng.integers(0, n, size=(min(bloco, n_bootstrap - inicio), n))
+        valores = {i: _padronizar_linhas(X[amostras, i]) for i in usadas}
+        postos = {i: _padronizar_linhas(_postos_medios(*codigos[i], amostras)) for i in usadas}
+        for x, y in pares:
+            ix, iy = colunas.index(x), colunas.index(y)
+            resultados[(x, y)][0].append((valores[ix] * valores[iy]).sum(axis=1))
+            resultados[(x, y)][1].append((postos[ix] * postos[iy]).sum(axis=1))
+    return {par: (np.concatenate(pearson), np.concatenate(spearman))
+            for par, (pearson, spearman) in resultados.items()}
+
+def _reconstruir(campos):
+    return AnaliseMetricas(**{nome: _congelar(valor) for nome, valor in campos.items()})
+
+@dataclass(frozen=True)
+class AnaliseMetricas:
+    """
+    Resultados pré-calculados e imutáveis, consumidos por todos os gráficos e relatórios.
+
+    Arrays são somente leitura e dicionários são MappingProxyType. Os gráficos
+    não alteram 'dados': colunas derivadas vêm sempre de uma cópia (tabela()).
+    """
+    dados: pd.DataFrame
+    colunas: tuple
+    pearson: np.ndarray
+    spearman: np.ndarray
+    resumo: MappingProxyType
+    resumo_por_categoria: MappingProxyType
+    normalizados: MappingProxyType
+    score_popularidade: np.ndarray
+    score_qualidade: np.ndarray
+    tendencias: MappingProxyType
+    tendencias_quantis: MappingProxyType
+    intervalos: MappingProxyType
+    n_bootstrap: int
+    amostra: np.ndarray
+    nivel_confianca: float
+
+    def __reduce__(self):
+        # MappingProxyType não é serializável; o pool de processos recebe dicionários e recongela
+        return _reconstruir, ({campo.name: _descongelar(getattr(self, campo.name)) for campo in fields(self)},)
+
+    def correlacao(self, a, b, metodo='pearson'):
+        matriz = self.pearson if metodo == 'pearson' else self.spearman
+        return matriz[self.colunas.index(a), self.colunas.index(b)]
+
+    def matriz(self, metodo='pearson'):
+        matriz = self.pearson if metodo == 'pearson' else self.spearman
+        return pd.DataFrame(matriz, index=list(self.colunas), columns=list(self.colunas))
+
+    def dados_amostra(self):
+        """Linhas da amostra uniforme de tamanho fixo (todas, se houver poucas)."""
+        return self.dados.iloc[self.amostra]
+
+    def tabela(self):
+        """Cópia dos dados com categorias, métricas normalizadas e scores."""
+        df = self.dados.copy()
+        for categoria, (coluna, bins, labels) in CATEGORIAS.items():
+            df[categoria] = pd.cut(df[coluna], bins=bins, labels=labels)
+        for metrica, valores in self.normalizados.items():
+            df[f'{metrica}_norm'] = valores
+        df['score_popularidade'] = self.score_popularidade
+        df['score_qualidade'] = self.score_qualidade
+        return df
+
+def calcular_analise(df, n_bootstrap=0, nivel_confianca=NIVEL_CONFIANCA, seed=42):
+    """
+    Calcula em uma única passada vetorizada tudo o que os gráficos e o
+    relatório usam: matrizes de Pearson e Spearman, resumos por métrica e por
+    categoria, métricas normalizadas, scores do ranking, coeficientes das
+    linhas de tendência (lineares e por quantis), intervalos de confiança
+    bootstrap dos pares das RQs (só com n_bootstrap > 0; N_BOOTSTRAP é o
+    valor usual) e uma amostra uniforme de tamanho fixo.
+
+    Repositórios com alguma métrica ausente são descartados.
+
+    Returns:
+        AnaliseMetricas: Resultados congelados
+    """
+    colunas = tuple(coluna for coluna in METRICAS if coluna in df.columns)
+    dados = df[['repo_name', *colunas]].dropna(subset=list(colunas)).reset_index(drop=True)
+    X = dados[list(colunas)].to_numpy(dtype=np.float64)
+    n = X.shape[0]
+
+    pearson = _correlacao_matriz(X)
+    spearman = _correlacao_matriz(pd.DataFrame(X).rank(method='average').to_numpy())
+
+    medias = X.mean(axis=0)
+    medianas = np.median(X, axis=0)
+    desvios = X.std(axis=0, ddof=1)
+    minimos, maximos = X.min(axis=0), X.max(axis=0)
+    resumo = {
+        coluna: {'media': medias[i], 'mediana': medianas[i], 'desvio': desvios[i],
+                 'minimo': minimos[i], 'maximo': maximos[i]}
+        for i, coluna in enumerate(colunas)
+    }
+
+    resumo_por_categoria = {}
+    for categoria, (coluna, bins, labels) in CATEGORIAS.items():
+        grupos = pd.cut(dados[coluna], bins=bins, labels=labels)
+        agregado = dados[list(colunas)].groupby(grupos, observed=False).agg(['count', 'mean', 'median'])
+        resumo_por_categoria[categoria] = {
+            str(label): {f'{metrica}_{estatistica}': valor for (metrica, estatistica), valor in linha.items()}
+            for label, linha in agregado.iterrows()
+        }
+
+    # Normalização min-max (0-1) de todas as colunas de uma vez
+    indices_norm = [colunas.index(metrica) for metrica in METRICAS_NORMALIZADAS]
+    amplitude = maximos[indices_norm] - minimos[indices_norm]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        norm = np.where(amplitude > 0, (X[:, indices_norm] - minimos[indices_norm]) / amplitude, 0.0)
+    normalizados = {metrica: norm[:, i] for i, metrica in enumerate(METRICAS_NORMALIZADAS)}
+    score_popularidade = (normalizados['stars'] + normalizados['releases']) / 2
+    # Inverso das métricas de qualidade - menores valores são melhores
+    score_qualidade = (3 - (normalizados['cbo_mean'] + normalizados['dit_mean'] + normalizados['lcom_mean'])) / 3
+
+    # Retas de mínimos quadrados (equivalentes a np.polyfit grau 1) para todos os pares
+    ix = np.array([colunas.index(x) for x, _ in PARES_RQ])
+    iy = np.array([colunas.index(y) for _, y in PARES_RQ])
+    centrado = X - medias
+    with np.errstate(invalid='ignore', divide='ignore'):
+        inclinacoes = (centrado[:, ix] * centrado[:, iy]).sum(axis=0) / (centrado[:, ix] ** 2).sum(axis=0)
+    interceptos = medias[iy] - inclinacoes * medias[ix]
+    tendencias = {par: (inclinacoes[i], interceptos[i]) for i, par in enumerate(PARES_RQ)}
+
+    # Tendência por quantis: mediana e quartis de y em faixas de x com a mesma contagem
+    tendencias_quantis = {}
+    faixas = np.arange(n) * N_FAIXAS_QUANTIS // max(n, 1)
+    for x, y in PARES_RQ:
+        ordem = np.argsort(X[:, colunas.index(x)], kind='stable')
+        grupos = pd.DataFrame({'faixa': faixas, 'x': X[ordem, colunas.index(x)],
+                               'y': X[ordem, colunas.index(y)]}).groupby('faixa')
+        quartis = grupos['y'].quantile([0.25, 0.5, 0.75]).unstack()
+        tendencias_quantis[(x, y)] = {'x': grupos['x'].median().to_numpy(), 'p25': quartis[0.25].to_numpy(),
+                                      'mediana': quartis[0.5].to_numpy(), 'p75': quartis[0.75].to_numpy()}
+
+    # Bootstrap: as mesmas reamostragens valem para todos os pares. Com muitos
+    # repositórios o custo (B x n) é limitado, mantendo ao menos N_BOOTSTRAP_MINIMO
+    rng = np.random.default_rng(seed)
+    n_bootstrap = max(min(n_bootstrap, N_BOOTSTRAP_MINIMO), min(n_bootstrap, BOOTSTRAP_MAX_ELEMENTOS // max(n, 1)))
+    intervalos = {}
+    if n > 2 and n_bootstrap > 0:
+        alfa = 1 - nivel_confianca
+        limites = [100 * alfa / 2, 100 * (1 - alfa / 2)]
+        for par, (pearson_b, spearman_b) in _bootstrap(X, colunas, PARES_RQ, n_bootstrap, rng).items():
+            intervalos[par] = {'pearson': tuple(np.nanpercentile(pearson_b, limites)),
+                               'spearman': tuple(np.nanpercentile(spearman_b, limites))}
+
+    amostra = np.sort(rng.choice(n, size=min(n, TAMANHO_AMOSTRA), replace=False))
+
+    return _reconstruir(dict(
+        dados=dados,
+        colunas=colunas,
+        pearson=pearson,
+        spearman=spearman,
+        resumo=resumo,
+        resumo_por_categoria=resumo_por_categoria,
+        normalizados=normalizados,
+        score_popularidade=score_popularidade,
+        score_qualidade=score_qualidade,
+        tendencias=tendencias,
+        tendencias_quantis=tendencias_quantis,
+        intervalos=intervalos,
+        n_bootstrap=n_bootstrap,
+        amostra=amostra,
+        nivel_confianca=nivel_confianca,
+    ))
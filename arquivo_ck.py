@@ -0,0 +1,188 @@
+import os
+import csv
+import shutil
+import argparse
+import threading
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as pads
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Arquivo colunar (Parquet/zstd) das saídas brutas do CK, particionado por repositório:
+#   arquivo_ck/class/repo=<owner%2Fname>/part-0.parquet
+#   arquivo_ck/method/repo=<owner%2Fname>/part-0.parquet
+# Novas sumarizações podem ser recalculadas sem git nem Java:
+#   python arquivo_ck.py reagregar --saida resultados_metricas.csv
+#   python arquivo_ck.py reagregar --colunas cbo dit lcom loc --estatisticas mean sum median p90
+ARCHIVE_DIR = 'arquivo_ck'
+LEVELS = ('class', 'method')
+TEXT_COLUMNS = ('file', 'class', 'type', 'method')
+BOOLEAN_COLUMNS = ('constructor', 'hasJavadoc')
+CSV_BLOCK_SIZE = 16 * 1024 ** 2
+
+def is_available():
+    return pa is not None
+
+def partition_dir(archive_dir, level, repo_name):
+    return os.path.join(archive_dir, level, f"repo={quote(repo_name, safe='')}")
+
+def column_type(column):
+    """Tipo fixo de cada coluna do CK: texto, booleano ou float64 (métricas)."""
+    if column in TEXT_COLUMNS:
+        return pa.string()
+    if column in BOOLEAN_COLUMNS:
+        return pa.bool_()
+    return pa.float64()
+
+def _convert_options(csv_path):
+    """
+    Esquema fixo a partir do cabeçalho: a inferência por arquivo daria int64
+    numa partição e double noutra para a mesma métrica (ex.: lcom).
+    """
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f), [])
+    return pacsv.ConvertOptions(column_types={column: column_type(column) for column in header})
+
+def _write_parquet(batches, parquet_path):
+    writer = None
+    rows = 0
+    try:
+        for batch in batches:
+            if writer is None:
+                writer = pq.ParquetWriter(parquet_path, batch.schema, compression='zstd')
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+def _archive_file(csv_path, target_dir):
+    """Grava um CSV como Parquet em target_dir (substituindo a partição anterior de forma atômica)."""
+    # Prefixo '_' faz o pyarrow ignorar a partição em construção durante leituras concorrentes
+    tmp_dir = os.path.join(os.path.dirname(target_dir), f"_tmp-{threading.get_ident()}-{os.path.basename(target_dir)}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    parquet_path = os.path.join(tmp_dir, 'part-0.parquet')
+    convert_options = _convert_options(csv_path)
+
+    # Leitura em blocos: memória limitada ao tamanho do bloco (os tipos são fixos, não inferidos)
+    with pacsv.open_csv(csv_path, read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                        convert_options=convert_options) as reader:
+        rows = _write_parquet(reader, parquet_path)
+
+    if rows == 0:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        return 0
+
+    if os.path.exists(target_dir):
+        shutil.rmtree(target_dir)
+    os.replace(tmp_dir, target_dir)
+    return rows
+
+def archive_repository(repo_name, csv_files, archive_dir=ARCHIVE_DIR):
+    """
+    Arquiva as saídas brutas de um repositório.
+
+    Args:
+        repo_name: Nome do repositório (owner/name)
+        csv_files: Dicionário nível -> caminho do CSV (ex.: {'class': '...class.csv'})
+
+    Returns:
+        dict: nível -> número de linhas arquivadas
+    """
+    archived = {}
+    for level, csv_path in csv_files.items():
+        if not csv_path or not os.path.exists(csv_path) or os.path.getsize(csv_path) == 0:
+            continue
+        target_dir = partition_dir(archive_dir, level, repo_name)
+        os.makedirs(os.path.dirname(target_dir), exist_ok=True)
+        archived[level] = _archive_file(csv_path, target_dir)
+    return archived
+
+def load_level(archive_dir, level, columns):
+    """
+    Carrega um nível do arquivo como DataFrame com a coluna 'repo_name' e
+    apenas as colunas pedidas (poda de colunas feita pelo Parquet).
+    """
+    dataset = pads.dataset(os.path.join(archive_dir, level), format='parquet',
+                           partitioning=pads.partitioning(pa.schema([('repo', pa.string())]), flavor='hive'))
+    available = [column for column in columns if column in dataset.schema.names]
+    table = dataset.to_table(columns=['repo', *available])
+    df = table.to_pandas()
+    return df.rename(columns={'repo': 'repo_name'})
+
+def p90(values):
+    return np.quantile(values, 0.9)
+
+STATISTIC_FUNCTIONS = {
+    'count': 'count', 'sum': 'sum', 'mean': 'mean', 'std': 'std',
+    'min': 'min', 'max': 'max', 'median': 'median', 'p90': p90
+}
+
+def reaggregate(archive_dir=ARCHIVE_DIR, level='class', columns=('cbo', 'dit', 'lcom'),
+                statistics=('mean', 'sum')):
+    """
+    Recalcula sumarizações por repositório a partir do arquivo.
+
+    Com os valores padrão, produz as mesmas colunas de resultados_metricas.csv
+    ('sum' é exportado com o sufixo '_total').
+
+    Returns:
+        pd.DataFrame: Uma linha por repositório
+    """
+    df = load_level(archive_dir, level, columns)
+    missing = [column for column in columns if column not in df.columns]
+    if missing:
+        raise ValueError(f"Colunas ausentes no arquivo '{level}': {', '.join(missing)}")
+    invalid = [column for column in columns if not pd.api.types.is_numeric_dtype(df[column])]
+    if invalid:
+        raise ValueError(f"Colunas não numéricas não podem ser agregadas: {', '.join(invalid)}")
+    grouped = df.groupby('repo_name', observed=True)
+
+    result = {}
+    for stat in statistics:
+        suffix = 'total' if stat == 'sum' else stat
+        aggregated = grouped[list(columns)].agg(STATISTIC_FUNCTIONS[stat])
+        for column in columns:
+            result[f"{column}_{suffix}"] = aggregated[column]
+
+    return pd.DataFrame(result).reset_index()
+
+def main():
+    parser = argparse.ArgumentParser(description='Arquivo colunar das saídas brutas do CK')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    reagregar = subparsers.add_parser('reagregar', help='Recalcula sumarizações a partir do arquivo')
+    reagregar.add_argument('--arquivo', default=ARCHIVE_DIR, help='Diretório do arquivo colunar')
+    reagregar.add_argument('--nivel', default='class', choices=LEVELS)
+    reagregar.add_argument('--colunas', nargs='+', default=['cbo', 'dit', 'lcom'])
+    reagregar.add_argument('--estatisticas', nargs='+', default=['mean', 'sum'],
+                           choices=list(STATISTIC_FUNCTIONS))
+    reagregar.add_argument('--saida', default='resultados_metricas_reagregados.csv')
+
+    args = parser.parse_args()
+
+    if not is_available():
+        print("ERRO: pyarrow não está instalado.")
+        return
+
+    if args.comando == 'reagregar':
+        try:
+            df = reaggregate(args.arquivo, args.nivel, args.colunas, args.estatisticas)
+        except ValueError as e:
+            print(f"ERRO: {e}")
+            return
+        df.to_csv(args.saida, index=False, float_format='%.6f')
+        print(f"{len(df)} repositórios reagregados em '{args.saida}'")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,432 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import argparse
+import platform
+import threading
+import subprocess
+from datetime import datetime
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+import clonagem
+
+# Benchmark offline do pipeline de main.py: repositórios Java sintéticos em
+# repositórios git bare locais, clonados via file:// (sem GitHub):
+#   python benchmark_pipeline.py executar --repos 24 --classes 50 500 2000 --ck stub
+#   python benchmark_pipeline.py executar --ck real --ck-jar ck-0.7.1-SNAPSHOT-jar-with-dependencies.jar
+#   python benchmark_pipeline.py comparar benchmark/antes.json benchmark/depois.json
+# O modo 'stub' substitui o CK por um gerador trivial de CSVs, isolando o
+# custo de orquestração (clonagem, filas, escrita, limpeza).
+BENCHMARK_DIR = 'benchmark'
+REPO_OWNER = 'bench'
+SAMPLING_INTERVAL = 0.2
+PERCENTILES = [50, 90, 99]
+STAGES = ('clone', 'espera_ck', 'ck', 'total')
+GIT_IDENTITY = ['-c', 'user.name=benchmark', '-c', 'user.email=benchmark@localhost']
+
+# Métricas comparadas pelo subcomando 'comparar' (caminho no JSON, maior é melhor)
+COMPARED_METRICS = [
+    (('repos_por_minuto',), True),
+    (('tempo_total_s',), False),
+    (('estagios', 'clone', 'p50'), False),
+    (('estagios', 'clone', 'p90'), False),
+    (('estagios', 'ck', 'p50'), False),
+    (('estagios', 'ck', 'p90'), False),
+    (('estagios', 'total', 'p50'), False),
+    (('estagios', 'total', 'p90'), False),
+    (('pico_rss_arvore_kb',), False),
+    (('pico_rss_processo_kb',), False),
+    (('pico_disco_bytes',), False),
+]
+
+def java_class_source(index, classes, depth, coupling, methods):
+    """
+    Código de uma classe sintética: herança em cadeias de 'depth' classes e
+    'coupling' campos que referenciam outras classes (usados nos métodos).
+    """
+    parent = f" extends Classe{index - 1}" if index % depth else ""
+    targets = sorted({(index * 7 + k * 13 + 1) % classes for k in range(coupling)} - {index})
+    lines = ["package bench;", "", f"public class Classe{index}{parent} {{"]
+    lines += [f"    private Classe{target} campo{target};" for target in targets]
+    lines.append(f"    private int valor = {index};")
+    for m in range(methods):
+        lines += [
+            f"    public int metodo{m}(int x) {{",
+            f"        int y = x * {m + 1} + valor;",
+            f"        if (y > {index}) {{",
+            "            y -= 1;",
+            "        }",
+            "        return y;",
+            "    }",
+        ]
+    for target in targets:
+        lines += [
+            f"    public int usa{target}() {{",
+            f"        return campo{target} != null ? campo{target}.metodo0(valor) : 0;",
+            "    }",
+        ]
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+def create_bare_repository(bare_path, classes, depth, coupling, methods):
+    """Gera um projeto Java sintético, faz commit e o publica como repositório bare."""
+    work_path = f"{bare_path}.trabalho"
+    shutil.rmtree(work_path, ignore_errors=True)
+    source_dir = os.path.join(work_path, 'src', 'main', 'java', 'bench')
+    os.makedirs(source_dir)
+    for index in range(classes):
+        with open(os.path.join(source_dir, f"Classe{index}.java"), 'w', encoding='utf-8') as f:
+            f.write(java_class_source(index, classes, depth, coupling, methods))
+    with open(os.path.join(work_path, 'README.md'), 'w', encoding='utf-8') as f:
+        f.write(f"Repositório sintético: {classes} classes, profundidade {depth}, acoplamento {coupling}\n")
+
+    git = lambda *args, cwd=work_path: subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True)
+    git('init', '-q')
+    git('add', '-A')
+    git(*GIT_IDENTITY, 'commit', '-q', '-m', 'Projeto sintético')
+    git('clone', '-q', '--bare', work_path, bare_path, cwd=None)
+    # Permite clones parciais (--filter=blob:none) pelo transporte file://
+    git('config', 'uploadpack.allowFilter', 'true', cwd=bare_path)
+    shutil.rmtree(work_path)
+
+def generate_repositories(base_dir, count, class_counts, depth, coupling, methods):
+    """
+    Gera (ou reaproveita) os repositórios sintéticos. O diretório é derivado
+    dos parâmetros, então execuções com os mesmos parâmetros usam os mesmos repositórios.
+
+    Returns:
+        tuple: (diretório raiz dos repositórios bare, lista de (nome, classes))
+    """
+    params = {'repos': count, 'classes': list(class_counts), 'profundidade': depth,
+              'acoplamento': coupling, 'metodos': methods}
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    root = os.path.abspath(os.path.join(base_dir, 'repos', digest))
+    repos = [(f"{REPO_OWNER}/repo-{i:04d}", class_counts[i % len(class_counts)]) for i in range(count)]
+
+    marker = os.path.join(root, 'parametros.json')
+    if os.path.exists(marker):
+        return root, repos
+
+    start = time.perf_counter()
+    shutil.rmtree(root, ignore_errors=True)
+    os.makedirs(os.path.join(root, REPO_OWNER))
+    for name, classes in repos:
+        create_bare_repository(os.path.join(root, f"{name}.git"), classes, depth, coupling, methods)
+    with open(marker, 'w', encoding='utf-8') as f:
+        json.dump(params, f, indent=2)
+    print(f"{count} repositórios sintéticos gerados em {time.perf_counter() - start:.1f}s ({root})")
+    return root, repos
+
+def stub_run_ck(repo_clone_path, ck_output_path, thread_name, timeout=600, heap_mb=None):
+    """
+    Substituto do CK: uma linha por arquivo .java com valores derivados do
+    tamanho do arquivo, no formato de class.csv/method.csv do CK.
+    """
+    class_rows, method_rows = [], []
+    for root, dirs, files in os.walk(repo_clone_path):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        for name in files:
+            if not name.endswith('.java'):
+                continue
+            path = os.path.join(root, name)
+            size = os.path.getsize(path)
+            class_name = f"bench.{name[:-5]}"
+            class_rows.append(f"{path},{class_name},class,{size % 17},{size % 5 + 1},{size % 31},{size // 40}")
+            method_rows.append(f"{path},{class_name},metodo0/1[int],{size % 7},{size % 11 + 1},{size % 13},{size // 200}")
+    with open(f"{ck_output_path}class.csv", 'w', encoding='utf-8') as f:
+        f.write("file,class,type,cbo,dit,lcom,loc\n" + "".join(f"{row}\n" for row in class_rows))
+    with open(f"{ck_output_path}method.csv", 'w', encoding='utf-8') as f:
+        f.write("file,class,method,cbo,wmc,rfc,loc\n" + "".join(f"{row}\n" for row in method_rows))
+
+def process_tree_rss_kb(pid):
+    """RSS (KB) do processo e de todos os descendentes, lido de /proc (None fora do Linux)."""
+    total = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        try:
+            with open(f"/proc/{current}/status", 'r') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+                        break
+            for task in os.listdir(f"/proc/{current}/task"):
+                with open(f"/proc/{current}/task/{task}/children", 'r') as f:
+                    pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            if current == pid:
+                return None
+    return total
+
+class ResourceMonitor:
+    """Amostra periodicamente o espaço em disco do diretório da execução e o RSS da árvore de processos."""
+    def __init__(self, paths, interval=SAMPLING_INTERVAL):
+        self.paths = paths
+        self.interval = interval
+        self.peak_disk = 0
+        self.peak_rss = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="Benchmark-Monitor", daemon=True)
+
+    def _sample(self):
+        self.peak_disk = max(self.peak_disk, sum(clonagem.directory_size(path) for path in self.paths))
+        rss = process_tree_rss_kb(os.getpid())
+        if rss is not None:
+            self.peak_rss = max(self.peak_rss or 0, rss)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+class StageTimer:
+    """Registra, por repositório, os instantes de início e fim de cada estágio do pipeline."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.events = {}
+
+    def mark(self, repo_name, event):
+        now = time.perf_counter()
+        with self._lock:
+            self.events.setdefault(repo_name, {})[event] = now
+
+    def wrap(self, function, repo_name_of, start_event, end_event):
+        def wrapper(*args, **kwargs):
+            repo_name = repo_name_of(*args)
+            if repo_name is None:
+                return function(*args, **kwargs)
+            self.mark(repo_name, start_event)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.mark(repo_name, end_event)
+        return wrapper
+
+    def durations(self):
+        """Duração de cada estágio (s) para os repositórios em que ele foi observado."""
+        intervals = {
+            'clone': ('clone_inicio', 'clone_fim'),
+            'espera_ck': ('clone_fim', 'ck_inicio'),
+            'ck': ('ck_inicio', 'ck_fim'),
+            'total': ('clone_inicio', 'escrita_fim'),
+        }
+        result = {stage: [] for stage in STAGES}
+        for events in self.events.values():
+            for stage, (start, end) in intervals.items():
+                if start in events and end in events:
+                    result[stage].append(events[end] - events[start])
+        return result
+
+def summarize(values):
+    if not values:
+        return {'n': 0}
+    values = np.asarray(values)
+    summary = {'n': int(values.size), 'media': float(values.mean()), 'max': float(values.max())}
+    summary.update({f"p{p}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))})
+    return summary
+
+def configure_pipeline(main, run_dir, bare_root, args):
+    """Redireciona caminhos e opções de main.py para o diretório da execução."""
+    main.CLONE_URL_TEMPLATE = f"file://{bare_root}/{{repo_name}}.git"
+    main.CLONE_DIR_BASE = os.path.join(run_dir, 'clones')
+    main.CK_OUTPUT_DIR_BASE = os.path.join(run_dir, 'ck_output')
+    main.TRASH_DIR = os.path.join(main.CLONE_DIR_BASE, '.lixeira')
+    main.OUTPUT_CSV_FILE = os.path.join(run_dir, 'resultados_metricas.csv')
+    main.OUTPUT_STATS_CSV_FILE = os.path.join(run_dir, 'estatisticas_ck_detalhadas.csv')
+    main.MANIFEST_FILE = os.path.join(run_dir, 'manifesto_progresso.json')
+    main.FAILED_REPOS_FILE = os.path.join(run_dir, 'repositorios_com_falha.json')
+    main.ARCHIVE_DIR = os.path.join(run_dir, 'arquivo_ck')
+    main.CLONE_MODE = args.modo_clone
+    main.ARCHIVE_RAW_OUTPUT = args.arquivar
+    main.USE_RESIDENT_CK = args.ck == 'real' and args.ck_residente
+    # --workers vira o teto do controlador adaptativo; sem --adaptativo o limite é fixo
+    main.ADAPTIVE_CONCURRENCY = args.adaptativo
+    main.SCHEDULING_POLICY = args.escalonamento
+    # Histórico próprio (vazio, ou o informado em --historico) para não misturar com as execuções reais
+    main.cost_history = main.escalonamento.CostHistory(args.historico or os.path.join(run_dir, 'historico_custos.json'))
+    # Sem cache: cada execução do benchmark mede o trabalho completo
+    main.result_cache = None
+    main.progress_manifest = main.ProgressManifest(main.MANIFEST_FILE)
+    main.instrumentation = main.instrumentacao.PipelineInstrumentation(
+        os.path.join(run_dir, 'eventos_pipeline.jsonl'), os.path.join(run_dir, 'ck_pipeline.prom'))
+    main.repository_deleter = main.BackgroundDeleter(main.TRASH_DIR, main.MAX_PENDING_DELETIONS)
+    if args.ck == 'stub':
+        main.run_ck = stub_run_ck
+    else:
+        main.CK_JAR_PATH = os.path.abspath(args.ck_jar)
+    os.makedirs(main.CLONE_DIR_BASE, exist_ok=True)
+    os.makedirs(main.CK_OUTPUT_DIR_BASE, exist_ok=True)
+
+def instrument_pipeline(main, timer):
+    main.clonar_repositorio = timer.wrap(main.clonar_repositorio, lambda repo_info: repo_info[1],
+                                         'clone_inicio', 'clone_fim')
+    main.executar_ck = timer.wrap(main.executar_ck, lambda clone_job: clone_job['repo_name'],
+                                  'ck_inicio', 'ck_fim')
+    main.write_metrics_to_file = timer.wrap(
+        main.write_metrics_to_file, lambda metrics: metrics['repo_name'] if metrics else None,
+        'escrita_inicio', 'escrita_fim')
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], check=True, capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(args):
+    """Gera os repositórios, executa o pipeline e retorna os resultados como dicionário."""
+    bare_root, repos = generate_repositories(args.diretorio, args.repos, args.classes, args.profundidade,
+                                             args.acoplamento, args.metodos)
+    run_dir = os.path.abspath(os.path.join(args.diretorio, 'execucoes', datetime.now().strftime('%Y%m%d-%H%M%S')))
+    os.makedirs(run_dir)
+
+    import main  # Importado aqui: configura o logging do pipeline
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    configure_pipeline(main, run_dir, bare_root, args)
+    timer = StageTimer()
+    instrument_pipeline(main, timer)
+
+    import pandas as pd
+    repos_df = pd.DataFrame({'name': [name for name, _ in repos]})
+    max_workers = args.workers
+    clone_workers = args.clone_workers or 2 * max_workers
+
+    with ResourceMonitor([run_dir]) as monitor:
+        start = time.perf_counter()
+        main.process_repositories_multithread(repos_df, max_workers, clone_workers, args.max_pendentes)
+        elapsed = time.perf_counter() - start
+
+    manifest = main.progress_manifest.load()['repos']
+    statuses = {}
+    for entry in manifest.values():
+        statuses[entry['status']] = statuses.get(entry['status'], 0) + 1
+    finished = statuses.get('concluido', 0)
+
+    return {
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'revisao': git_revision(),
+        'ambiente': {'python': platform.python_version(), 'sistema': platform.platform(),
+                     'cpus': os.cpu_count()},
+        'parametros': {
+            'repos': args.repos, 'classes': args.classes, 'profundidade': args.profundidade,
+            'acoplamento': args.acoplamento, 'metodos': args.metodos, 'ck': args.ck,
+            'ck_residente': main.USE_RESIDENT_CK, 'modo_clone': args.modo_clone, 'arquivar': args.arquivar,
+            'workers': max_workers, 'adaptativo': args.adaptativo,
+            'escalonamento': args.escalonamento, 'clone_workers': clone_workers, 'max_pendentes': args.max_pendentes,
+        },
+        'status': statuses,
+        'tempo_total_s': elapsed,
+        'repos_por_minuto': finished / elapsed * 60 if elapsed > 0 else None,
+        'estagios': {stage: summarize(values) for stage, values in timer.durations().items()},
+        'pico_rss_arvore_kb': monitor.peak_rss,
+        'pico_rss_processo_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+        'pico_rss_filho_kb': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss if resource else None,
+        'pico_disco_bytes': monitor.peak_disk,
+        'diretorio_execucao': run_dir,
+    }
+
+def print_results(results):
+    print(f"\nRepositórios: {results['status']}")
+    print(f"Tempo total: {results['tempo_total_s']:.2f}s ({results['repos_por_minuto'] or 0:.1f} repos/min)")
+    for stage, summary in results['estagios'].items():
+        if summary['n']:
+            print(f"  {stage:<10} n={summary['n']:<4} " +
+                  "  ".join(f"p{p}={summary[f'p{p}']:.3f}s" for p in PERCENTILES) + f"  max={summary['max']:.3f}s")
+    print(f"Pico de RSS (árvore de processos): {results['pico_rss_arvore_kb'] or 0:,} KB")
+    print(f"Pico de disco: {results['pico_disco_bytes'] / 1024 ** 2:.1f} MB")
+
+def lookup(results, path):
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+def compare(base_path, new_path):
+    """Imprime a variação das principais métricas entre duas execuções."""
+    with open(base_path, 'r', encoding='utf-8') as f:
+        base = json.load(f)
+    with open(new_path, 'r', encoding='utf-8') as f:
+        new = json.load(f)
+
+    if base.get('parametros') != new.get('parametros'):
+        print("AVISO: as execuções usaram parâmetros diferentes.")
+    print(f"{'métrica':<24} {'base':>14} {'nova':>14} {'variação':>10}")
+    for path, higher_is_better in COMPARED_METRICS:
+        before, after = lookup(base, path), lookup(new, path)
+        if before is None or after is None:
+            continue
+        change = (after - before) / before * 100 if before else 0.0
+        better = change > 0 if higher_is_better else change < 0
+        marker = '' if abs(change) < 1 else (' +' if better else ' -')
+        print(f"{'.'.join(path):<24} {before:>14.3f} {after:>14.3f} {change:>9.1f}%{marker}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark offline do pipeline de análise')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    executar = subparsers.add_parser('executar', help='Gera repositórios sintéticos e mede o pipeline')
+    executar.add_argument('--repos', type=int, default=24, help='Número de repositórios sintéticos')
+    executar.add_argument('--classes', type=int, nargs='+', default=[50, 500, 2000],
+                          help='Número de classes por repositório (alternado entre os valores)')
+    executar.add_argument('--profundidade', type=int, default=4, help='Tamanho das cadeias de herança')
+    executar.add_argument('--acoplamento', type=int, default=5, help='Classes referenciadas por classe')
+    executar.add_argument('--metodos', type=int, default=5, help='Métodos por classe')
+    executar.add_argument('--ck', choices=['stub', 'real'], default='stub')
+    executar.add_argument('--ck-jar', default='ck-0.7.1-SNAPSHOT-jar-with-dependencies.jar')
+    executar.add_argument('--ck-residente', action='store_true', help='Usa as JVMs residentes (modo real)')
+    executar.add_argument('--modo-clone', choices=['esparso', 'completo'], default='esparso')
+    executar.add_argument('--arquivar', action='store_true', help='Inclui o arquivamento em Parquet')
+    executar.add_argument('--workers', type=int, default=min(os.cpu_count() or 1, 6))
+    executar.add_argument('--adaptativo', action='store_true',
+                          help='Concorrência adaptativa do CK (--workers passa a ser o teto)')
+    executar.add_argument('--escalonamento', choices=['maior_primeiro', 'original'], default='maior_primeiro')
+    executar.add_argument('--historico', default=None,
+                          help='Histórico de custos reaproveitado entre execuções do benchmark')
+    executar.add_argument('--clone-workers', type=int, default=None)
+    executar.add_argument('--max-pendentes', type=int, default=None)
+    executar.add_argument('--diretorio', default=BENCHMARK_DIR)
+    executar.add_argument('--saida', default=None, help='Arquivo JSON de resultados')
+    executar.add_argument('--verbose', action='store_true', help='Mantém o log INFO do pipeline')
+
+    comparar = subparsers.add_parser('comparar', help='Compara dois arquivos de resultados')
+    comparar.add_argument('base')
+    comparar.add_argument('nova')
+
+    args = parser.parse_args()
+
+    if args.comando == 'comparar':
+        compare(args.base, args.nova)
+        return
+
+    if args.ck == 'real' and not os.path.exists(args.ck_jar):
+        print(f"ERRO: jar do CK não encontrado: {args.ck_jar}")
+        return
+
+    results = run_benchmark(args)
+    output = args.saida or os.path.join(results['diretorio_execucao'], 'resultados_benchmark.json')
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print_results(results)
+    print(f"Resultados salvos em '{output}'")
+
+if __name__ == '__main__':
+    main()
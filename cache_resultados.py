@@ -0,0 +1,186 @@
+import os
+import json
+import gzip
+import shutil
+import hashlib
+import subprocess
+import threading
+import time
+import logging
+from functools import lru_cache
+
+def resolve_remote_head(clone_url, timeout=60):
+    """
+    Consulta o commit do HEAD remoto com 'git ls-remote', sem clonar.
+
+    Returns:
+        str: SHA do HEAD remoto ou None se não for possível resolver
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'ls-remote', clone_url, 'HEAD'],
+            check=True, capture_output=True, text=True, timeout=timeout
+        )
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+        logging.warning(f"Não foi possível consultar o HEAD remoto de {clone_url}: {getattr(e, 'stderr', e)}")
+        return None
+
+    for line in result.stdout.splitlines():
+        sha, _, ref = line.partition('\t')
+        if ref == 'HEAD':
+            return sha
+    return None
+
+def resolve_local_head(repo_path):
+    """Retorna o SHA do HEAD de um clone local."""
+    result = subprocess.run(
+        ['git', '-C', repo_path, 'rev-parse', 'HEAD'],
+        check=True, capture_output=True, text=True, timeout=30
+    )
+    return result.stdout.strip()
+
+@lru_cache(maxsize=None)
+def ck_jar_version(jar_path):
+    """Identifica a versão do CK pelo hash do conteúdo do jar."""
+    if not os.path.exists(jar_path):
+        return os.path.basename(jar_path)
+    digest = hashlib.sha256()
+    with open(jar_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ResultCache:
+    """
+    Cache endereçado por conteúdo dos resultados do CK, com chave
+    (repositório, SHA do HEAD, versão do jar do CK, flags do CK, arquivos
+    clonados: modo de clonagem e padrões do sparse-checkout).
+
+    Cada entrada guarda as métricas agregadas (metricas.json) e as saídas
+    brutas do CK compactadas (class.csv.gz, method.csv.gz). O índice mantém
+    tamanho e último acesso de cada entrada para a remoção LRU por tamanho.
+    """
+    INDEX_FILE = 'indice.json'
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index = None
+
+    @staticmethod
+    def make_key(repo_name, commit_sha, ck_version, ck_flags, file_set=()):
+        payload = json.dumps([repo_name, commit_sha, ck_version, list(ck_flags), list(file_set)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        if self._index is None:
+            index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+            if os.path.exists(index_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            else:
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE)
+        tmp_path = f"{index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f, indent=2)
+        os.replace(tmp_path, index_path)
+
+    @property
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry['size'] for entry in self._load_index().values())
+
+    def get(self, key):
+        """
+        Retorna as métricas agregadas da entrada, ou None se não estiver no cache.
+        Um acerto atualiza o último acesso da entrada.
+        """
+        with self._lock:
+            index = self._load_index()
+            metrics_file = os.path.join(self._entry_dir(key), 'metricas.json')
+            if key not in index or not os.path.exists(metrics_file):
+                return None
+            with open(metrics_file, 'r', encoding='utf-8') as f:
+                metrics = json.load(f)
+            index[key]['last_access'] = time.time()
+            self._save_index()
+            return metrics
+
+    def raw_path(self, key, name):
+        """Caminho da saída bruta compactada (ex.: 'class.csv') de uma entrada."""
+        path = os.path.join(self._entry_dir(key), f"{name}.gz")
+        return path if os.path.exists(path) else None
+
+    def latest_commit(self, repo_name, key_for_commit):
+        """
+        Commit mais recente do repositório com saída bruta no cache, para a
+        análise incremental. key_for_commit(commit_sha) gera a chave com o jar
+        e as flags atuais do CK: entradas de outras versões do CK são ignoradas.
+
+        Returns:
+            tuple: (commit_sha, chave) ou None
+        """
+        with self._lock:
+            index = self._load_index()
+            candidates = [
+                (entry.get('stored_at', entry['last_access']), entry['commit_sha'], key)
+                for key, entry in index.items()
+                if entry.get('repo_name') == repo_name and entry.get('commit_sha')
+            ]
+        for _, commit_sha, key in sorted(candidates, reverse=True):
+            if key_for_commit(commit_sha) == key and self.raw_path(key, 'class.csv'):
+                return commit_sha, key
+        return None
+
+    def put(self, key, metrics, raw_files, **info):
+        """
+        Armazena métricas agregadas e saídas brutas do CK.
+
+        Args:
+            key: Chave gerada por make_key
+            metrics: Dicionário de métricas agregadas (serializável em JSON)
+            raw_files: Dicionário nome -> caminho (ex.: {'class.csv': '...class.csv'})
+            info: Campos informativos guardados no índice (repo_name, commit_sha, ...)
+        """
+        entry_dir = self._entry_dir(key)
+        tmp_dir = f"{entry_dir}.tmp-{threading.get_ident()}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        with open(os.path.join(tmp_dir, 'metricas.json'), 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, ensure_ascii=False, indent=2)
+        for name, path in raw_files.items():
+            if path and os.path.exists(path):
+                with open(path, 'rb') as src, gzip.open(os.path.join(tmp_dir, f"{name}.gz"), 'wb') as dst:
+                    shutil.copyfileobj(src, dst)
+
+        size = sum(os.path.getsize(os.path.join(tmp_dir, name)) for name in os.listdir(tmp_dir))
+
+        with self._lock:
+            if os.path.exists(entry_dir):
+                shutil.rmtree(entry_dir)
+            os.replace(tmp_dir, entry_dir)
+            index = self._load_index()
+            index[key] = dict(info, size=size, last_access=time.time(), stored_at=time.time())
+            self._evict()
+            self._save_index()
+
+    def _evict(self):
+        """Remove as entradas menos recentemente usadas até caber em max_bytes."""
+        index = self._load_index()
+        total = sum(entry['size'] for entry in index.values())
+        for key in sorted(index, key=lambda k: index[k]['last_access']):
+            if total <= self.max_bytes:
+                break
+            total -= index[key]['size']
+            shutil.rmtree(self._entry_dir(key), ignore_errors=True)
+            del index[key]
+            logging.info(f"Cache: entrada {key[:12]} removida (LRU)")
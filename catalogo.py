@@ -0,0 +1,154 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Catálogo incremental de repositórios (substitui os arrays JSON acrescentados a repo.json)
+CATALOG_FILE = 'catalogo_repos.db'
+CATALOG_FIELDS = ['name', 'stars', 'releases', 'age_years', 'created_at']
+# Campos de tamanho, preenchidos apenas pela busca em lote (ausentes na busca por estrelas)
+SIZE_FIELDS = ['disk_usage_kb', 'language_bytes', 'java_bytes']
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    name TEXT PRIMARY KEY,
+    stars INTEGER,
+    releases INTEGER,
+    age_years INTEGER,
+    created_at TEXT,
+    disk_usage_kb INTEGER,
+    language_bytes INTEGER,
+    java_bytes INTEGER,
+    fetched_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS repos_stars ON repos(stars DESC);
+CREATE INDEX IF NOT EXISTS repos_fetched_at ON repos(fetched_at);
+"""
+
+# Atualiza apenas campos alterados; fetched_at é sempre renovado
+UPSERT = """
+INSERT INTO repos (name, stars, releases, age_years, created_at, disk_usage_kb, language_bytes, java_bytes,
+                   fetched_at, updated_at)
+VALUES (:name, :stars, :releases, :age_years, :created_at, :disk_usage_kb, :language_bytes, :java_bytes,
+        :fetched_at, :fetched_at)
+ON CONFLICT(name) DO UPDATE SET
+    updated_at = CASE WHEN stars IS NOT excluded.stars OR releases IS NOT excluded.releases
+                        OR age_years IS NOT excluded.age_years OR created_at IS NOT excluded.created_at
+                      THEN excluded.fetched_at ELSE updated_at END,
+    stars = excluded.stars,
+    releases = excluded.releases,
+    age_years = excluded.age_years,
+    created_at = excluded.created_at,
+    disk_usage_kb = COALESCE(excluded.disk_usage_kb, disk_usage_kb),
+    language_bytes = COALESCE(excluded.language_bytes, language_bytes),
+    java_bytes = COALESCE(excluded.java_bytes, java_bytes),
+    fetched_at = excluded.fetched_at
+"""
+
+class RepositoryCatalog:
+    """
+    Catálogo SQLite de repositórios com chave nameWithOwner.
+
+    Cada coleta faz upsert dos campos (stars, releases, created_at...) e
+    registra o instante da busca por repositório, permitindo atualizar apenas
+    as entradas mais antigas que um TTL. A leitura é feita por cursor, sem
+    carregar o histórico inteiro em memória.
+    """
+    def __init__(self, path=CATALOG_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Catálogos criados antes das colunas de tamanho
+            existing = {row['name'] for row in conn.execute("PRAGMA table_info(repos)")}
+            for field in SIZE_FIELDS:
+                if field not in existing:
+                    conn.execute(f"ALTER TABLE repos ADD COLUMN {field} INTEGER")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        try:
+            with conn:  # commit/rollback
+                yield conn
+        finally:
+            conn.close()
+
+    def upsert(self, repos, fetched_at=None):
+        """
+        Insere ou atualiza repositórios (dicionários no formato de repo.json).
+
+        Returns:
+            int: Quantidade de repositórios gravados
+        """
+        fetched_at = fetched_at or time.time()
+        rows = [dict({field: repo.get(field) for field in CATALOG_FIELDS + SIZE_FIELDS}, fetched_at=fetched_at)
+                for repo in repos]
+        with self._lock, self._connect() as conn:
+            conn.executemany(UPSERT, rows)
+        return len(rows)
+
+    def stale_names(self, ttl_seconds, now=None):
+        """Repositórios buscados há mais de ttl_seconds."""
+        cutoff = (now or time.time()) - ttl_seconds
+        with self._connect() as conn:
+            return [row['name'] for row in conn.execute(
+                "SELECT name FROM repos WHERE fetched_at < ? ORDER BY fetched_at", (cutoff,))]
+
+    def iter_repos(self, limit=None, min_stars=None):
+        """Itera os repositórios ordenados por estrelas (do maior para o menor)."""
+        query = f"SELECT {', '.join(CATALOG_FIELDS + SIZE_FIELDS)}, fetched_at FROM repos"
+        params = []
+        if min_stars is not None:
+            query += " WHERE stars >= ?"
+            params.append(min_stars)
+        query += " ORDER BY stars DESC, name"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        with self._connect() as conn:
+            for row in conn.execute(query, params):
+                yield dict(row)
+
+    def count(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM repos").fetchone()[0]
+
+    def load_dataframe(self, columns=CATALOG_FIELDS, limit=None):
+        """Carrega o catálogo como DataFrame (ordenado por estrelas)."""
+        import pandas as pd
+        query = f"SELECT {', '.join(columns)} FROM repos ORDER BY stars DESC, name"
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        with self._connect() as conn:
+            return pd.read_sql_query(query, conn)
+
+    def import_json(self, json_path):
+        """
+        Importa um repo.json legado, inclusive quando ele contém vários arrays
+        JSON concatenados (resultado do modo append antigo).
+
+        Returns:
+            int: Quantidade de registros importados
+        """
+        fetched_at = os.path.getmtime(json_path)
+        with open(json_path, 'r', encoding='utf-8') as f:
+            content = f.read()
+
+        decoder = json.JSONDecoder()
+        position = 0
+        imported = 0
+        while True:
+            while position < len(content) and content[position].isspace():
+                position += 1
+            if position >= len(content):
+                break
+            chunk, position = decoder.raw_decode(content, position)
+            repos = chunk if isinstance(chunk, list) else [chunk]
+            imported += self.upsert(repos, fetched_at)
+        return imported
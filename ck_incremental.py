@@ -0,0 +1,236 @@
+import os
+import re
+import csv
+import gzip
+import subprocess
+
+# Reanálise incremental do CK entre duas versões de um repositório.
+#
+# Parte da saída bruta (class.csv/method.csv) da versão analisada antes, guardada
+# no cache de resultados, e reanalisa apenas:
+#   - os .java adicionados ou alterados desde aquele commit;
+#   - os .java que mencionam classes alteradas ou removidas (o CBO deles pode
+#     mudar), mais as subclasses transitivas dessas classes (o DIT pode mudar);
+#   - os .java das classes citadas nas linhas alteradas, antes e depois da
+#     mudança: o NOC (subclasses) e o FANIN (quem as referencia) dessas classes
+#     dependem dos arquivos alterados, mesmo sem que elas mudem.
+# As linhas desses arquivos (e as dos arquivos removidos) são trocadas na
+# tabela anterior pelas da análise parcial; as métricas agregadas do
+# repositório são recalculadas a partir da tabela mesclada, como numa análise completa.
+#
+# Uso (ver main.executar_ck_incremental):
+#   plano = planejar(clone, commit_anterior, linhas_anteriores_por_arquivo, total_java)
+#   ... CK apenas sobre plano['arquivos'] ...
+#   mesclar_saida(anterior_gz, parcial_csv, saida_csv, plano['substituidos'], clone, marcador)
+INCREMENTAL_MAX_FRACTION = 0.5  # Acima dessa fração de arquivos a reanalisar, a análise completa compensa mais
+GIT_TIMEOUT = 300
+ANONYMOUS_CLASS = re.compile(r'^Anonymous\d+$')
+IDENTIFIER = re.compile(r'[A-Za-z_$][\w$]*')
+
+def _git(repo_path, *args, timeout=GIT_TIMEOUT, check=True):
+    return subprocess.run(
+        ['git', '-C', repo_path, *args], check=check, capture_output=True, text=True, timeout=timeout
+    )
+
+def buscar_commit(repo_path, commit_sha, timeout=GIT_TIMEOUT):
+    """
+    Traz o commit anterior para o clone raso (só commit e árvores: o diff de
+    nomes não precisa dos blobs). Lança CalledProcessError se o servidor não
+    tiver mais o commit (ex.: histórico reescrito).
+    """
+    if _git(repo_path, 'cat-file', '-e', f"{commit_sha}^{{commit}}", check=False).returncode == 0:
+        return
+    _git(repo_path, 'fetch', '--depth', '1', '--filter=blob:none', 'origin', commit_sha, timeout=timeout)
+
+def arquivos_alterados(repo_path, old_commit, new_commit='HEAD'):
+    """
+    .java alterados entre dois commits (renomeações viram remoção + adição).
+
+    Returns:
+        tuple: (adicionados ou modificados, removidos), caminhos relativos à raiz do clone
+    """
+    output = _git(repo_path, 'diff', '--name-status', '--no-renames', old_commit, new_commit, '--', '*.java').stdout
+    changed, deleted = set(), set()
+    for line in output.splitlines():
+        status, _, path = line.partition('\t')
+        (deleted if status.startswith('D') else changed).add(path)
+    return changed, deleted
+
+def _nomes_simples(class_name, internas):
+    parts = class_name.rpartition('.')[2].split('$')
+    return [part for part in (parts if internas else parts[:1]) if part and not ANONYMOUS_CLASS.match(part)]
+
+def nomes_de_classes(paths, previous_classes, internas=False):
+    """
+    Nomes simples das classes declaradas nos arquivos: o nome do arquivo mais
+    as classes de nível superior que a análise anterior encontrou neles. Com
+    internas=True, também os nomes das classes internas (Builder, Entry...):
+    comuns demais para o git grep, mas usados para reconhecer subclasses em
+    arquivos que já mencionam a classe externa.
+    """
+    names = set()
+    for path in paths:
+        names.add(os.path.splitext(os.path.basename(path))[0])
+        for class_name in previous_classes.get(path, ()):
+            names.update(_nomes_simples(class_name, internas))
+    return names
+
+def arquivos_que_mencionam(repo_path, names):
+    """.java da árvore de trabalho que contêm algum dos nomes como palavra inteira (git grep)."""
+    if not names:
+        return set()
+    result = subprocess.run(
+        ['git', '-C', repo_path, 'grep', '-l', '-w', '-F', '-f', '-', '--', '*.java'],
+        input='\n'.join(sorted(names)) + '\n', capture_output=True, text=True, timeout=GIT_TIMEOUT
+    )
+    if result.returncode not in (0, 1):  # 1 = nenhuma ocorrência
+        raise subprocess.CalledProcessError(result.returncode, result.args, result.stdout, result.stderr)
+    return set(result.stdout.splitlines())
+
+def _subclasses(repo_path, paths, names):
+    """Arquivos (entre paths) que estendem alguma das classes pelo nome."""
+    pattern = re.compile(r'\bextends\s+(?:[\w.]+\.)?(?:' + '|'.join(map(re.escape, sorted(names))) + r')\b')
+    found = set()
+    for path in paths:
+        try:
+            with open(os.path.join(repo_path, path), 'r', encoding='utf-8', errors='replace') as f:
+                if pattern.search(f.read()):
+                    found.add(path)
+        except OSError:
+            pass
+    return found
+
+def dependentes(repo_path, paths, previous_classes):
+    """
+    Arquivos cujas métricas podem mudar quando as classes declaradas em
+    'paths' mudam: os que as mencionam (CBO) e, transitivamente, as
+    subclasses (DIT). A busca usa só os nomes de nível superior: qualquer
+    uso de uma classe interna fora do seu arquivo cita a externa (import,
+    nome qualificado ou herança).
+    """
+    mentions = arquivos_que_mencionam(repo_path, nomes_de_classes(paths, previous_classes))
+    dependents = set(mentions)
+    parents = nomes_de_classes(paths, previous_classes, internas=True)
+    seen = set(parents)
+    while True:
+        # Só as subclasses propagam a mudança adiante (DIT); quem apenas as menciona não muda
+        subclasses = _subclasses(repo_path, mentions, parents)
+        dependents |= subclasses
+        parents = nomes_de_classes(subclasses, previous_classes, internas=True) - seen
+        if not parents:
+            return dependents
+        seen |= parents
+        mentions = arquivos_que_mencionam(repo_path, parents & nomes_de_classes(subclasses, previous_classes))
+
+def identificadores_alterados(repo_path, old_commit, new_commit='HEAD'):
+    """
+    Identificadores das linhas removidas e adicionadas nos .java entre os dois
+    commits (um único git diff: num clone parcial, os blobs anteriores são
+    buscados em lote).
+    """
+    output = _git(repo_path, 'diff', '--no-renames', '--no-color', '--no-ext-diff', '-U0',
+                  old_commit, new_commit, '--', '*.java').stdout
+    identifiers = set()
+    in_hunk = False
+    for line in output.splitlines():
+        if line.startswith('diff --git '):
+            in_hunk = False
+        elif line.startswith('@@'):
+            in_hunk = True
+        elif in_hunk and line[:1] in ('+', '-'):
+            identifiers.update(IDENTIFIER.findall(line, 1))
+    return identifiers
+
+def referenciados(repo_path, old_commit, previous_classes):
+    """
+    Arquivos das classes citadas (estendidas, implementadas ou usadas) nas
+    linhas alteradas, na versão anterior ou na nova: o NOC e o FANIN delas
+    mudam com a mudança das citações, ainda que o arquivo delas não mude.
+    Como em dependentes, só os nomes de nível superior são procurados (o
+    arquivo de uma classe interna é o da externa).
+    """
+    declared = {}
+    for path, class_names in previous_classes.items():
+        for class_name in class_names:
+            for name in _nomes_simples(class_name, internas=False):
+                declared.setdefault(name, set()).add(path)
+    referenced = set()
+    for identifier in identificadores_alterados(repo_path, old_commit) & declared.keys():
+        referenced |= declared[identifier]
+    return referenced
+
+def caminho_relativo(path, marker):
+    """Caminho do arquivo relativo à raiz do clone, a partir do caminho absoluto gravado pelo CK."""
+    _, found, relative = path.replace('\\', '/').partition(marker)
+    return relative if found else None
+
+def classes_por_arquivo(class_csv_gz, marker):
+    """Classes de cada arquivo (caminho relativo) na saída bruta anterior."""
+    classes = {}
+    with gzip.open(class_csv_gz, 'rt', encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(f):
+            relative = caminho_relativo(row['file'], marker)
+            if relative is not None:
+                classes.setdefault(relative, []).append(row['class'])
+    return classes
+
+def planejar(repo_path, old_commit, previous_classes, java_files, max_fraction=INCREMENTAL_MAX_FRACTION):
+    """
+    Arquivos a reanalisar entre old_commit e o HEAD do clone.
+
+    Returns:
+        dict: 'arquivos' (a analisar, existentes no HEAD), 'substituidos'
+        (linhas anteriores descartadas: analisados + removidos), 'alterados',
+        'removidos', 'dependentes', 'referenciados' e 'completa' (True se a
+        análise completa compensa mais)
+    """
+    changed, deleted = arquivos_alterados(repo_path, old_commit)
+    dependents = dependentes(repo_path, changed | deleted, previous_classes) - changed - deleted
+    referenced = referenciados(repo_path, old_commit, previous_classes) - changed - deleted - dependents
+    # Arquivos fora do sparse-checkout não estão na árvore de trabalho: as linhas deles são só descartadas
+    files = {path for path in changed | dependents | referenced if os.path.exists(os.path.join(repo_path, path))}
+    return {
+        'arquivos': sorted(files),
+        'substituidos': changed | dependents | referenced | deleted,
+        'alterados': len(changed),
+        'removidos': len(deleted),
+        'dependentes': len(dependents),
+        'referenciados': len(referenced),
+        'completa': bool(java_files) and len(files) > max_fraction * java_files,
+    }
+
+def mesclar_saida(previous_gz, partial_csv, output_csv, replaced, repo_path, marker):
+    """
+    Tabela da nova versão: linhas anteriores dos arquivos não substituídos
+    (com o caminho reescrito para o clone atual) seguidas das linhas da
+    análise parcial. Processada linha a linha, sem carregar as tabelas.
+
+    Returns:
+        int: Quantidade de linhas gravadas
+    """
+    repo_root = os.path.abspath(repo_path)
+    count = 0
+    with gzip.open(previous_gz, 'rt', encoding='utf-8', newline='') as previous, \
+            open(output_csv, 'w', encoding='utf-8', newline='') as output:
+        previous_reader = csv.reader(previous)
+        header = next(previous_reader)
+        file_column = header.index('file')
+        writer = csv.writer(output, lineterminator='\n')
+        writer.writerow(header)
+        for row in previous_reader:
+            relative = caminho_relativo(row[file_column], marker)
+            if relative is None or relative in replaced:
+                continue
+            row[file_column] = os.path.join(repo_root, relative)
+            writer.writerow(row)
+            count += 1
+        if os.path.exists(partial_csv):
+            with open(partial_csv, 'r', encoding='utf-8', newline='') as partial:
+                partial_reader = csv.reader(partial)
+                partial_header = next(partial_reader, None)
+                if partial_header is not None and partial_header != header:
+                    raise ValueError(f"Colunas de {partial_csv} diferem das da análise anterior")
+                for row in partial_reader:
+                    writer.writerow(row)
+                    count += 1
+    return count
@@ -0,0 +1,190 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import logging
+import instrumentacao
+
+# Fonte e diretório de compilação do servidor residente do CK
+CK_SERVER_SOURCE = os.path.join('ck_servidor', 'CKServidor.java')
+CK_SERVER_BUILD_DIR = os.path.join('ck_servidor', 'build')
+CK_SERVER_CLASS = 'CKServidor'
+CK_SERVER_LOG = 'ck_servidor.log'
+
+compile_lock = threading.Lock()
+
+def compile_server(jar_path):
+    """
+    Compila o CKServidor.java (uma única vez) contra o jar do CK.
+
+    Returns:
+        bool: True se a classe compilada estiver disponível
+    """
+    class_file = os.path.join(CK_SERVER_BUILD_DIR, f"{CK_SERVER_CLASS}.class")
+    with compile_lock:
+        if os.path.exists(class_file) and os.path.getmtime(class_file) >= os.path.getmtime(CK_SERVER_SOURCE):
+            return True
+        if shutil.which('javac') is None or not os.path.exists(jar_path):
+            return False
+        os.makedirs(CK_SERVER_BUILD_DIR, exist_ok=True)
+        try:
+            subprocess.run(
+                ['javac', '-encoding', 'UTF-8', '-cp', jar_path, '-d', CK_SERVER_BUILD_DIR, CK_SERVER_SOURCE],
+                check=True, capture_output=True, text=True, timeout=120
+            )
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+            logging.error(f"Falha ao compilar o servidor residente do CK: {getattr(e, 'stderr', e)}")
+            return False
+        return True
+
+def is_available(jar_path):
+    """Indica se o modo residente pode ser usado (java presente e servidor compilável)."""
+    return shutil.which('java') is not None and compile_server(jar_path)
+
+class ResidentCKServer:
+    """
+    Cliente de uma JVM residente do CK. Cada requisição é uma linha na entrada
+    padrão do processo e cada resposta uma linha na saída padrão. As falhas
+    são reportadas com as mesmas exceções do subprocess.run, para que o
+    tratamento de erros de quem chama não mude.
+    """
+    def __init__(self, jar_path, name, java_options=()):
+        self.jar_path = jar_path
+        self.name = name
+        self.java_options = list(java_options)
+        self._process = None
+        self._responses = None
+        self._log_file = None
+
+    @property
+    def command(self):
+        classpath = os.pathsep.join([self.jar_path, CK_SERVER_BUILD_DIR])
+        return ['java', *self.java_options, '-cp', classpath, CK_SERVER_CLASS]
+
+    @property
+    def pid(self):
+        return self._process.pid if self._process is not None else None
+
+    def start(self, timeout=60):
+        """Inicia a JVM e aguarda a linha 'PRONTO'."""
+        self._log_file = open(CK_SERVER_LOG, 'a', encoding='utf-8')
+        self._process = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=self._log_file,
+            text=True, encoding='utf-8', bufsize=1
+        )
+        self._responses = queue.Queue()
+        threading.Thread(target=self._read_responses, args=(self._process, self._responses),
+                         name=f"{self.name}-Reader", daemon=True).start()
+        ready = self._next_response(timeout)
+        if ready != 'PRONTO':
+            self.stop()
+            raise subprocess.CalledProcessError(1, self.command, stderr=f"Servidor CK não iniciou: {ready}")
+        logging.info(f"[{self.name}] JVM residente do CK iniciada (pid {self._process.pid})")
+
+    @staticmethod
+    def _read_responses(process, responses):
+        for line in process.stdout:
+            responses.put(line.rstrip('\n'))
+        responses.put(None)  # processo encerrado
+
+    def _next_response(self, timeout):
+        try:
+            return self._responses.get(timeout=timeout)
+        except queue.Empty:
+            raise subprocess.TimeoutExpired(self.command, timeout)
+
+    def analyze(self, project_path, output_prefix, use_jars=False, max_at_once=0,
+                variables_and_fields=False, timeout=600, files=None):
+        """
+        Executa o CK sobre project_path, gerando output_prefix + 'class.csv' etc.
+        Com files, só esses arquivos .java são analisados (os tipos ainda são
+        resolvidos contra o projeto inteiro); a lista vai em output_prefix + 'arquivos.txt'.
+
+        Returns:
+            tuple: (tempo em ms reportado pela JVM, quantidade de classes,
+                    uso de recursos da JVM nesta requisição: {'cpu_s', 'pico_rss_kb'})
+        """
+        if self._process is None or self._process.poll() is not None:
+            self.stop()
+            self.start()
+
+        # CPU por diferença; pico de RSS zerado antes da requisição (senão seria o pico da vida da JVM)
+        pid = self._process.pid
+        peak_reset = instrumentacao.reset_peak_rss(pid)
+        cpu_before, _ = instrumentacao.read_proc_usage(pid)
+
+        fields = [os.path.abspath(project_path), str(use_jars).lower(), str(max_at_once),
+                  str(variables_and_fields).lower(), os.path.abspath(output_prefix)]
+        if files is not None:
+            files_list = os.path.abspath(f"{output_prefix}arquivos.txt")
+            with open(files_list, 'w', encoding='utf-8') as f:
+                f.writelines(f"{os.path.abspath(path)}\n" for path in files)
+            fields.append(files_list)
+        request = '\t'.join(fields)
+        try:
+            self._process.stdin.write(request + '\n')
+            self._process.stdin.flush()
+            response = self._next_response(timeout)
+        except subprocess.TimeoutExpired:
+            # A JVM pode estar presa no repositório: descarta para não contaminar os próximos
+            self.stop()
+            raise
+        except OSError as e:
+            self.stop()
+            raise subprocess.CalledProcessError(1, self.command, stderr=f"Servidor CK encerrado: {e}")
+
+        if response is None:
+            self.stop()
+            raise subprocess.CalledProcessError(1, self.command, stderr="Servidor CK encerrado inesperadamente")
+
+        status, _, detail = response.partition('\t')
+        if status != 'OK':
+            raise subprocess.CalledProcessError(1, self.command, stderr=detail)
+
+        cpu_after, peak_rss_kb = instrumentacao.read_proc_usage(pid)
+        usage = {}
+        if cpu_before is not None and cpu_after is not None:
+            usage['cpu_s'] = cpu_after - cpu_before
+            usage['pico_rss_kb'] = peak_rss_kb
+            usage['pico_rss_por_requisicao'] = peak_reset
+
+        elapsed_ms, _, class_count = detail.partition('\t')
+        return int(elapsed_ms), int(class_count), usage
+
+    def stop(self):
+        if self._process is not None:
+            try:
+                self._process.stdin.close()
+                self._process.wait(timeout=10)
+            except Exception:
+                self._process.kill()
+                self._process.wait()
+            self._process = None
+        if self._log_file is not None:
+            self._log_file.close()
+            self._log_file = None
+
+class ResidentCKPool:
+    """
+    Pool de N JVMs residentes do CK compartilhado pelas threads de CK.
+    As JVMs são iniciadas sob demanda.
+    """
+    def __init__(self, jar_path, size, java_options=()):
+        self._servers = queue.Queue()
+        self._all = []
+        for i in range(size):
+            server = ResidentCKServer(jar_path, f"CK-JVM_{i}", java_options)
+            self._all.append(server)
+            self._servers.put(server)
+
+    def analyze(self, project_path, output_prefix, **kwargs):
+        server = self._servers.get()
+        try:
+            return server.analyze(project_path, output_prefix, **kwargs)
+        finally:
+            self._servers.put(server)
+
+    def close(self):
+        for server in self._all:
+            server.stop()
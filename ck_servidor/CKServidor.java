@@ -0,0 +1,108 @@
+import com.github.mauricioaniche.ck.CK;
+import com.github.mauricioaniche.ck.CKClassResult;
+import com.github.mauricioaniche.ck.CKNotifier;
+import com.github.mauricioaniche.ck.ResultWriter;
+
+import java.io.BufferedReader;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+import java.nio.charset.StandardCharsets;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.HashMap;
+import java.util.List;
+import java.util.Map;
+
+/**
+ * Servidor residente do CK.
+ *
+ * Mantém uma única JVM viva e analisa vários repositórios, evitando pagar a
+ * inicialização da JVM, o carregamento de classes e o aquecimento do JIT a
+ * cada repositório. Recebe uma requisição por linha na entrada padrão:
+ *
+ *     caminho_do_projeto \t useJars \t maxAtOnce \t variablesAndFields \t prefixo_de_saida [\t lista_de_arquivos]
+ *
+ * A lista de arquivos (opcional) é um arquivo texto com um caminho .java por
+ * linha: só esses arquivos são analisados, mas os tipos continuam sendo
+ * resolvidos contra todas as pastas de código do projeto (análise incremental).
+ *
+ * e responde uma linha por requisição na saída padrão:
+ *
+ *     OK \t tempo_ms \t quantidade_de_classes
+ *     ERRO \t mensagem
+ *
+ * Os arquivos gerados são os mesmos do Runner do CK (prefixo + "class.csv",
+ * "method.csv", ...). Qualquer saída do próprio CK é redirecionada para a
+ * saída de erro, para não corromper o protocolo.
+ */
+public class CKServidor {
+
+    public static void main(String[] args) throws Exception {
+        PrintStream protocolo = new PrintStream(System.out, true, "UTF-8");
+        System.setOut(System.err);
+
+        BufferedReader entrada = new BufferedReader(new InputStreamReader(System.in, StandardCharsets.UTF_8));
+        protocolo.println("PRONTO");
+
+        String linha;
+        while ((linha = entrada.readLine()) != null) {
+            if (linha.isEmpty()) {
+                continue;
+            }
+            try {
+                String[] campos = linha.split("\t", -1);
+                if (campos.length != 5 && campos.length != 6) {
+                    protocolo.println("ERRO\trequisição inválida: esperados 5 ou 6 campos, recebidos " + campos.length);
+                    continue;
+                }
+                long inicio = System.currentTimeMillis();
+                String listaDeArquivos = campos.length == 6 && !campos[5].isEmpty() ? campos[5] : null;
+                int classes = analisar(campos[0], Boolean.parseBoolean(campos[1]), Integer.parseInt(campos[2]),
+                        Boolean.parseBoolean(campos[3]), campos[4], listaDeArquivos);
+                protocolo.println("OK\t" + (System.currentTimeMillis() - inicio) + "\t" + classes);
+            } catch (OutOfMemoryError e) {
+                // O estado da JVM não é mais confiável: responde e encerra para o cliente reiniciar
+                protocolo.println("ERRO\tOutOfMemoryError: " + e.getMessage());
+                System.exit(3);
+            } catch (Throwable e) {
+                e.printStackTrace(System.err);
+                protocolo.println("ERRO\t" + e.getClass().getSimpleName() + ": " + String.valueOf(e.getMessage()).replace('\n', ' '));
+            }
+        }
+    }
+
+    private static int analisar(String caminho, boolean useJars, int maxAtOnce, boolean variablesAndFields,
+                                String saida, String listaDeArquivos) throws Exception {
+        ResultWriter writer = new ResultWriter(saida + "class.csv", saida + "method.csv",
+                saida + "variable.csv", saida + "field.csv", variablesAndFields);
+        Map<String, CKClassResult> resultados = new HashMap<>();
+
+        CKNotifier notificador = new CKNotifier() {
+            @Override
+            public void notify(CKClassResult result) {
+                resultados.put(result.getClassName(), result);
+            }
+
+            @Override
+            public void notifyError(String sourceFilePath, Exception e) {
+                System.err.println("Erro em " + sourceFilePath);
+                e.printStackTrace(System.err);
+            }
+        };
+        CK ck = new CK(useJars, maxAtOnce, variablesAndFields);
+        if (listaDeArquivos == null) {
+            ck.calculate(caminho, notificador);
+        } else {
+            List<String> linhas = Files.readAllLines(Paths.get(listaDeArquivos), StandardCharsets.UTF_8);
+            Path[] arquivos = linhas.stream().filter(l -> !l.isEmpty()).map(Paths::get).toArray(Path[]::new);
+            ck.calculate(Paths.get(caminho), notificador, arquivos);
+        }
+
+        for (CKClassResult resultado : resultados.values()) {
+            writer.printResult(resultado);
+        }
+        writer.flushAndClose();
+        return resultados.size();
+    }
+}
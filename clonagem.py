@@ -0,0 +1,130 @@
+import os
+import re
+import time
+import shutil
+import subprocess
+import logging
+
+# Mensagem do git quando o servidor não suporta clones parciais (--filter)
+FILTER_NOT_SUPPORTED_WARNING = 'filtering not recognized by server'
+# Erros de um clone esparso que justificam recair para o clone completo: servidor
+# que recusa o filtro ou git local sem suporte a --filter/sparse-checkout.
+# Falhas de rede, repositório inexistente ou sem acesso não entram aqui.
+SPARSE_UNSUPPORTED_PATTERN = re.compile(
+    r"filter.*not (supported|recognized|allowed)|not support.*filter|invalid filter|"
+    r"unknown option|is not a git command|sparse-checkout.*(unknown|not supported)",
+    re.IGNORECASE)
+
+def directory_size(path):
+    """Soma o tamanho (em bytes) de todos os arquivos sob path."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def count_java_files(path):
+    """Conta os arquivos .java da árvore de trabalho (ignorando .git)."""
+    total = 0
+    for root, dirs, files in os.walk(path):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        total += sum(1 for name in files if name.endswith('.java'))
+    return total
+
+def sparse_patterns(include_patterns, exclude_patterns):
+    """
+    Padrões do sparse-checkout (modo não-cone, sintaxe do .gitignore). Uma
+    exclusão de diretório ('**/src/test/') não remove os arquivos incluídos
+    por '*.java' dentro dele: vira exclusão do conteúdo ('**/src/test/**').
+    """
+    return list(include_patterns) + [f"!{pattern}**" if pattern.endswith('/') else f"!{pattern}"
+                                     for pattern in exclude_patterns]
+
+def _run_until(command, deadline, timeout):
+    """subprocess.run com o tempo que resta até o prazo da clonagem inteira."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise subprocess.TimeoutExpired(command, timeout)
+    try:
+        return subprocess.run(command, check=True, capture_output=True, text=True, timeout=remaining)
+    except subprocess.TimeoutExpired:
+        # Reporta o limite total configurado, não o que restava para este passo
+        raise subprocess.TimeoutExpired(command, timeout)
+
+def clone_full(clone_url, clone_path, timeout, deadline=None):
+    deadline = deadline if deadline is not None else time.monotonic() + timeout
+    _run_until(['git', 'clone', '--depth', '1', clone_url, clone_path], deadline, timeout)
+
+def clone_sparse(clone_url, clone_path, include_patterns, exclude_patterns, timeout, deadline=None):
+    """
+    Clone parcial (--filter=blob:none) sem checkout, seguido de sparse-checkout
+    apenas dos padrões desejados; os blobs são buscados no checkout final,
+    somente para os arquivos selecionados. Os três passos dividem o mesmo prazo.
+
+    Returns:
+        bool: True se o servidor aplicou o filtro de blobs
+    """
+    deadline = deadline if deadline is not None else time.monotonic() + timeout
+    clone_result = _run_until(
+        ['git', 'clone', '--depth', '1', '--filter=blob:none', '--no-checkout', clone_url, clone_path],
+        deadline, timeout
+    )
+    _run_until(
+        ['git', '-C', clone_path, 'sparse-checkout', 'set', '--no-cone',
+         *sparse_patterns(include_patterns, exclude_patterns)],
+        deadline, timeout
+    )
+    _run_until(['git', '-C', clone_path, 'checkout'], deadline, timeout)
+    return FILTER_NOT_SUPPORTED_WARNING not in clone_result.stderr
+
+def is_sparse_unsupported(error):
+    """Indica se a falha do clone esparso vem de falta de suporte a --filter/sparse-checkout."""
+    stderr = error.stderr if isinstance(error.stderr, str) else (error.stderr or b'').decode('utf-8', 'replace')
+    return bool(SPARSE_UNSUPPORTED_PATTERN.search(stderr or ''))
+
+def clonar(clone_url, clone_path, mode='esparso', include_patterns=('*.java',), exclude_patterns=(),
+           timeout=300):
+    """
+    Clona um repositório no modo indicado e mede o I/O gerado.
+
+    Modos:
+        'esparso': clone parcial sem blobs + sparse-checkout dos fontes Java.
+            Se o servidor ignorar o filtro, o clone continua válido (apenas sem
+            economia de transferência); se o servidor recusar o filtro ou o git
+            local não suportar algum passo, recai para um clone completo.
+            Outras falhas (rede, repositório inexistente, acesso) são propagadas.
+        'completo': 'git clone --depth 1' tradicional.
+
+    timeout vale para a clonagem inteira, inclusive a eventual recaída.
+
+    Returns:
+        dict: modo efetivo, tamanho de .git (aproxima o que foi transferido),
+        tamanho em disco e quantidade de arquivos .java
+    """
+    deadline = time.monotonic() + timeout
+    effective_mode = mode
+    if mode == 'esparso':
+        try:
+            if not clone_sparse(clone_url, clone_path, include_patterns, exclude_patterns, timeout, deadline):
+                effective_mode = 'esparso_sem_filtro'
+                logging.info(f"Servidor de {clone_url} não suporta --filter; blobs transferidos integralmente")
+        except subprocess.CalledProcessError as e:
+            if not is_sparse_unsupported(e):
+                raise
+            logging.warning(f"Clone esparso não suportado para {clone_url} ({e.stderr.strip()}); usando clone completo")
+            shutil.rmtree(clone_path, ignore_errors=True)
+            effective_mode = 'completo'
+            clone_full(clone_url, clone_path, timeout, deadline)
+    else:
+        clone_full(clone_url, clone_path, timeout, deadline)
+
+    return {
+        'clone_mode': effective_mode,
+        'git_dir_size': directory_size(os.path.join(clone_path, '.git')),
+        'disk_size': directory_size(clone_path),
+        'java_files': count_java_files(clone_path)
+    }
@@ -0,0 +1,221 @@
+import os
+import time
+import shutil
+import logging
+import threading
+
+# Heap de cada JVM do CK, estimado a partir do tamanho do repositório
+HEAP_BASE_MB = 256
+HEAP_MB_PER_JAVA_FILE = 0.5
+HEAP_MB_PER_DISK_MB = 4  # Usado quando a contagem de arquivos .java não está disponível
+HEAP_MIN_MB = 256
+HEAP_MAX_MB = 8192
+HEAP_STEP_MB = 128
+
+# Limites do controlador
+CPU_HIGH = 0.90  # Acima disso a concorrência diminui
+CPU_LOW = 0.70  # Abaixo disso (com trabalho esperando) a concorrência aumenta
+MEMORY_RESERVE_MB = 1024  # Memória mantida livre para o sistema e para o próprio pipeline
+DISK_RESERVE_MB = 2048  # Espaço livre mínimo para novas clonagens
+SAMPLE_INTERVAL = 2.0
+STARVATION_SECONDS = 120  # Depois disso, apenas o repositório mais antigo na espera pode ser admitido
+
+def estimate_heap_mb(java_files=None, disk_size=None, max_heap_mb=HEAP_MAX_MB):
+    """
+    Heap (MB) para o CK analisar um repositório, a partir da quantidade de
+    arquivos .java ou, na falta dela, do tamanho do clone em disco.
+    """
+    if java_files:
+        heap = HEAP_BASE_MB + java_files * HEAP_MB_PER_JAVA_FILE
+    elif disk_size:
+        heap = HEAP_BASE_MB + disk_size / 1024 ** 2 * HEAP_MB_PER_DISK_MB
+    else:
+        heap = HEAP_BASE_MB
+    heap = -(-heap // HEAP_STEP_MB) * HEAP_STEP_MB  # arredonda para cima
+    return int(min(max(heap, HEAP_MIN_MB), max_heap_mb))
+
+def read_meminfo():
+    """(MemTotal, MemAvailable) em MB, lidos de /proc/meminfo; (None, None) fora do Linux."""
+    values = {}
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                key, _, rest = line.partition(':')
+                if key in ('MemTotal', 'MemAvailable'):
+                    values[key] = int(rest.split()[0]) / 1024
+    except (OSError, ValueError):
+        pass
+    return values.get('MemTotal'), values.get('MemAvailable')
+
+class CpuSampler:
+    """Fração de CPU ocupada entre duas leituras de /proc/stat (ou pela carga média, fora do Linux)."""
+    def __init__(self):
+        self._last = self._read()
+
+    @staticmethod
+    def _read():
+        try:
+            with open('/proc/stat', 'r') as f:
+                values = [int(value) for value in f.readline().split()[1:]]
+            idle = values[3] + (values[4] if len(values) > 4 else 0)  # idle + iowait
+            return sum(values), idle
+        except (OSError, ValueError, IndexError):
+            return None
+
+    def sample(self):
+        current = self._read()
+        if current is None or self._last is None:
+            if hasattr(os, 'getloadavg'):
+                return min(os.getloadavg()[0] / (os.cpu_count() or 1), 1.0)
+            return None
+        total, idle = current[0] - self._last[0], current[1] - self._last[1]
+        self._last = current
+        return 1.0 - idle / total if total > 0 else None
+
+class AdaptiveController:
+    """
+    Controla quantas análises do CK rodam ao mesmo tempo e quanta memória
+    elas podem reservar.
+
+    - Uma thread amostra CPU, memória disponível e disco livre e ajusta o
+      limite de concorrência entre min_workers e max_workers: diminui com CPU
+      saturada, pouca memória ou pouco disco; aumenta com CPU ociosa enquanto
+      houver repositórios esperando.
+    - Cada análise reserva o heap estimado da sua JVM; só é admitida se a
+      soma das reservas couber no orçamento de memória. Repositórios grandes
+      esperam até haver memória livre, e após STARVATION_SECONDS na espera
+      passam à frente dos menores.
+    """
+    def __init__(self, min_workers, max_workers, initial_workers=None, disk_path='.',
+                 memory_reserve_mb=MEMORY_RESERVE_MB, disk_reserve_mb=DISK_RESERVE_MB,
+                 sample_interval=SAMPLE_INTERVAL, on_change=None):
+        self.min_workers = max(1, min_workers)
+        self.max_workers = max(self.min_workers, max_workers)
+        self.limit = min(max(initial_workers or self.max_workers, self.min_workers), self.max_workers)
+        self.disk_path = disk_path
+        self.memory_reserve_mb = memory_reserve_mb
+        self.disk_reserve_mb = disk_reserve_mb
+        self.sample_interval = sample_interval
+        self.on_change = on_change
+        self._condition = threading.Condition()
+        self._active = 0
+        self._reserved_mb = 0
+        self._waiting = []  # (instante de chegada, repo, heap), em ordem de chegada
+        self._cpu = CpuSampler()
+        _, self._initial_available_mb = read_meminfo()
+        self._available_mb = self._initial_available_mb
+        self._disk_free_mb = self._read_disk_free()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _read_disk_free(self):
+        try:
+            return shutil.disk_usage(self.disk_path).free / 1024 ** 2
+        except OSError:
+            return None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="Concurrency-Controller", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @property
+    def active(self):
+        with self._condition:
+            return self._active
+
+    def memory_budget_mb(self):
+        """
+        Memória que as reservas podem somar. A memória disponível agora já
+        desconta o que as JVMs em execução usam, por isso as reservas atuais
+        são somadas de volta, limitadas à memória disponível no início.
+        """
+        if self._available_mb is None:
+            return None
+        budget = self._available_mb + self._reserved_mb
+        if self._initial_available_mb is not None:
+            budget = min(budget, self._initial_available_mb)
+        return budget - self.memory_reserve_mb
+
+    def _can_admit(self, entry):
+        if self._active >= self.limit:
+            return False
+        heap_mb = entry[2]
+        oldest = self._waiting[0]
+        if entry is not oldest and time.monotonic() - oldest[0] > STARVATION_SECONDS:
+            return False
+        # Sempre admite quando nada está rodando, para não travar com repositórios maiores que o orçamento
+        budget = self.memory_budget_mb()
+        return self._active == 0 or budget is None or self._reserved_mb + heap_mb <= budget
+
+    def acquire(self, repo_name, heap_mb):
+        """Bloqueia até a análise poder começar. Retorna o tempo de espera (s)."""
+        start = time.monotonic()
+        entry = (start, repo_name, heap_mb)
+        with self._condition:
+            self._waiting.append(entry)
+            try:
+                if not self._can_admit(entry):
+                    logging.info(f"Admissão de {repo_name} ({heap_mb} MB de heap) adiada: "
+                                 f"{self._active}/{self.limit} análises, {self._reserved_mb} MB reservados")
+                self._condition.wait_for(lambda: self._can_admit(entry))
+            finally:
+                self._waiting.remove(entry)
+            self._active += 1
+            self._reserved_mb += heap_mb
+            self._condition.notify_all()
+        return time.monotonic() - start
+
+    def release(self, heap_mb):
+        with self._condition:
+            self._active -= 1
+            self._reserved_mb -= heap_mb
+            self._condition.notify_all()
+
+    def wait_for_disk(self):
+        """Pausa novas clonagens enquanto o disco estiver abaixo da reserva e houver análises que vão liberá-lo."""
+        with self._condition:
+            if self._disk_free_mb is None or self._disk_free_mb >= self.disk_reserve_mb or self._active == 0:
+                return
+            logging.info(f"Pausando novas clonagens: {self._disk_free_mb:.0f} MB livres em disco")
+            self._condition.wait_for(lambda: self._disk_free_mb is None or self._active == 0
+                                     or self._disk_free_mb >= self.disk_reserve_mb)
+
+    def _adjust(self, cpu):
+        """Aumento e redução de uma unidade por amostra (retorna o motivo da mudança ou None)."""
+        low_memory = self._available_mb is not None and self._available_mb < self.memory_reserve_mb
+        low_disk = self._disk_free_mb is not None and self._disk_free_mb < self.disk_reserve_mb
+        if (low_memory or low_disk or (cpu is not None and cpu > CPU_HIGH)) and self.limit > self.min_workers:
+            self.limit -= 1
+            return 'pouca memória' if low_memory else 'pouco disco' if low_disk else 'CPU saturada'
+        demand = len(self._waiting) > 0 and self._active >= self.limit
+        if demand and cpu is not None and cpu < CPU_LOW and not low_memory and self.limit < self.max_workers:
+            self.limit += 1
+            return 'CPU ociosa'
+        return None
+
+    def _run(self):
+        while not self._stop.wait(self.sample_interval):
+            cpu = self._cpu.sample()
+            _, available_mb = read_meminfo()
+            disk_free_mb = self._read_disk_free()
+            with self._condition:
+                self._available_mb = available_mb
+                self._disk_free_mb = disk_free_mb
+                previous = self.limit
+                reason = self._adjust(cpu)
+                snapshot = {'limite': self.limit, 'ativos': self._active, 'esperando': len(self._waiting),
+                            'reservado_mb': self._reserved_mb, 'cpu': cpu, 'memoria_disponivel_mb': available_mb,
+                            'disco_livre_mb': disk_free_mb}
+                self._condition.notify_all()
+            if reason:
+                logging.info(f"Concorrência do CK: {previous} -> {self.limit} ({reason}; "
+                             f"CPU {cpu or 0:.0%}, {available_mb or 0:.0f} MB livres)")
+                if self.on_change:
+                    self.on_change(motivo=reason, **snapshot)
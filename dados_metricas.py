@@ -0,0 +1,187 @@
+import os
+import re
+import json
+import hashlib
+from array import array
+
+import numpy as np
+import pandas as pd
+
+# Carregamento compacto da tabela métricas + repositórios usada por visualizar_metricas.py:
+#   - repo.json (array JSON) ou JSONL lido em streaming, objeto a objeto, direto para arrays tipados
+#   - colunas numéricas reduzidas (int32/float32), nomes como categóricos
+#   - junção por posições de um índice de nomes (sem pd.merge por string)
+#   - cópia opcional em Arrow IPC (Feather v2, sem compressão) aberta por memory map nas execuções
+#     seguintes; invalidada quando o tamanho ou a data de modificação das entradas muda
+REPO_COLUMNS = ['stars', 'releases', 'age_years']
+CACHE_FILE = 'cache_tabela_metricas.arrow'
+READ_BLOCK_SIZE = 1024 ** 2
+SEPARADORES = re.compile(r'[\s\[\],]*')  # Entre objetos de um array JSON ou de um JSONL
+
+def _pyarrow():
+    """pyarrow só é importado quando o cache é usado (≈0,15 s e dezenas de MB); None se não instalado."""
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc
+    except ImportError:
+        return None
+    return pa
+
+def iterar_json(path, block_size=READ_BLOCK_SIZE):
+    """
+    Objetos de um arquivo JSON (array de objetos) ou JSONL, um por vez, sem
+    carregar o arquivo inteiro: '[', ',', ']' e espaços entre objetos são ignorados.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = ''
+        pos = 0
+        eof = False
+        while True:
+            pos = SEPARADORES.match(buffer, pos).end()
+            if pos >= len(buffer) and eof:
+                return
+            try:
+                if pos >= len(buffer):
+                    raise ValueError('buffer vazio')
+                obj, end = decoder.raw_decode(buffer, pos)
+            except ValueError:
+                # Objeto incompleto no fim do bloco: lê mais (ou o arquivo é inválido)
+                if eof:
+                    raise
+                chunk = f.read(block_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            yield obj
+            pos = end
+
+def _reduzir(valores):
+    """int32 (ou menor) quando todos os valores são inteiros; senão float32."""
+    serie = pd.Series(np.frombuffer(valores, dtype=np.float64))
+    if not serie.isna().any() and (serie % 1 == 0).all():
+        return pd.to_numeric(serie.astype(np.int64), downcast='integer')
+    return serie.astype(np.float32)
+
+def carregar_repositorios(path, columns=REPO_COLUMNS):
+    """
+    Lê repo.json/JSONL em streaming. Cada coluna numérica é acumulada em um
+    array de doubles (8 bytes por valor, sem objetos Python) e reduzida ao final.
+
+    Returns:
+        DataFrame: 'name' (categórico) e as colunas pedidas
+    """
+    names = []
+    values = {column: array('d') for column in columns}
+    for repo in iterar_json(path):
+        names.append(repo['name'])
+        for column in columns:
+            value = repo.get(column)
+            values[column].append(float('nan') if value is None else value)
+    df = pd.DataFrame({column: _reduzir(values[column]) for column in columns})
+    df.insert(0, 'name', pd.Categorical(names))
+    return df
+
+def reduzir_tipos(df):
+    """Reduz as colunas numéricas de um DataFrame já carregado (ex.: catálogo SQLite)."""
+    for column in df.columns:
+        if pd.api.types.is_float_dtype(df[column]):
+            df[column] = df[column].astype(np.float32)
+        elif pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    return df
+
+def carregar_metricas(path):
+    """Lê resultados_metricas.csv com médias em float32, totais reduzidos e nomes categóricos."""
+    df = pd.read_csv(path, dtype={'repo_name': 'category'})
+    return reduzir_tipos(df)
+
+def combinar(df_metricas, df_repos):
+    """
+    Junção interna métricas x repositórios pelo nome (ambos categóricos).
+    Só os nomes distintos (categorias) são comparados como texto; as linhas
+    são ligadas pelos códigos: categoria das métricas -> categoria dos
+    repositórios -> primeira linha com esse nome (como no repo.json acumulado).
+    """
+    nomes = df_repos['name'].cat
+    codigos = nomes.codes.to_numpy()
+    # Primeira linha de cada categoria: atribuição em ordem reversa deixa a menor posição
+    primeira_linha = np.full(len(nomes.categories), -1, dtype=np.int64)
+    primeira_linha[codigos[::-1]] = np.arange(len(codigos) - 1, -1, -1)
+    categoria_repo = nomes.categories.get_indexer(df_metricas['repo_name'].cat.categories)
+    codigos_metricas = df_metricas['repo_name'].cat.codes.to_numpy()
+    posicoes = categoria_repo[codigos_metricas]
+    encontrados = (posicoes >= 0) & (codigos_metricas >= 0)
+    repos = df_repos.iloc[primeira_linha[posicoes[encontrados]]].drop(columns=['name']).reset_index(drop=True)
+    metricas = df_metricas[encontrados].reset_index(drop=True)
+    metricas['repo_name'] = metricas['repo_name'].cat.remove_unused_categories()
+    return pd.concat([metricas, repos], axis=1)
+
+def _chave_entradas(paths):
+    """Identifica a versão das entradas pelo caminho, tamanho e data de modificação."""
+    hasher = hashlib.sha256()
+    # O catálogo SQLite em modo WAL pode mudar só no arquivo -wal
+    paths = [*paths, *(f"{path}-wal" for path in paths if os.path.exists(f"{path}-wal"))]
+    for path in paths:
+        stat = os.stat(path)
+        hasher.update(json.dumps([os.path.abspath(path), stat.st_size, stat.st_mtime_ns]).encode('utf-8'))
+    return hasher.hexdigest()
+
+def ler_cache(cache_path, key):
+    """Tabela do cache Arrow (por memory map), ou None se ausente, desatualizado ou sem pyarrow."""
+    pa = _pyarrow() if os.path.exists(cache_path) else None
+    if pa is None:
+        return None
+    try:
+        with pa.memory_map(cache_path, 'r') as source:
+            table = pa.ipc.open_file(source).read_all()
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if (table.schema.metadata or {}).get(b'chave') != key.encode('utf-8'):
+        return None
+    return table.to_pandas()
+
+def gravar_cache(df, cache_path, key):
+    pa = _pyarrow()
+    if pa is None:
+        return False
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b'chave': key.encode('utf-8')})
+    tmp_path = f"{cache_path}.tmp"
+    with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, cache_path)
+    return True
+
+def carregar_tabela(metricas_path, repos_path=None, catalogo=None, cache_path=CACHE_FILE):
+    """
+    Tabela combinada métricas + repositórios, compacta em memória.
+
+    Args:
+        metricas_path: resultados_metricas.csv
+        repos_path: repo.json ou JSONL (usado se catalogo for None)
+        catalogo: RepositoryCatalog, se houver catálogo SQLite
+        cache_path: Cópia em Arrow IPC da tabela combinada (None desativa)
+
+    Returns:
+        tuple: (DataFrame, origem: 'cache' ou 'entradas')
+    """
+    entradas = [metricas_path, catalogo.path if catalogo is not None else repos_path]
+    key = _chave_entradas(entradas) if cache_path else None
+    if cache_path:
+        df = ler_cache(cache_path, key)
+        if df is not None:
+            return df, 'cache'
+
+    df_metricas = carregar_metricas(metricas_path)
+    if catalogo is not None:
+        df_repos = reduzir_tipos(catalogo.load_dataframe(['name', *REPO_COLUMNS]))
+        df_repos['name'] = df_repos['name'].astype('category')
+    else:
+        df_repos = carregar_repositorios(repos_path)
+    df = combinar(df_metricas, df_repos)
+
+    if cache_path:
+        gravar_cache(df, cache_path, key)
+    return df, 'entradas'
@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import logging
+import statistics
+import threading
+
+# Ordenação das tarefas por custo estimado (LPT: as mais longas primeiro),
+# para que um repositório grande não fique para o fim do lote com os demais
+# workers ociosos. O custo vem do histórico de execuções anteriores ou, sem
+# histórico, do tamanho informado pela API do GitHub (catálogo SQLite).
+#
+# Uso:
+#   history = CostHistory('historico_custos.json')
+#   tasks = ordenar_tarefas(tasks, sizes, history)
+#   ...
+#   history.record(repo_name, segundos, java_files=..., disk_usage_kb=...)
+
+COST_HISTORY_FILE = 'historico_custos.json'
+EWMA_ALPHA = 0.5  # Peso da medição mais recente no custo de um repositório
+MIN_SAMPLES_FOR_RATE = 5  # Medições necessárias para aprender o custo por MB de um campo de tamanho
+# Campos de tamanho em ordem de preferência e custo inicial (s/MB) antes de haver histórico
+SIZE_RATE_DEFAULTS = {
+    'java_bytes': 2.0,
+    'disk_usage_kb': 0.2,
+}
+BASE_COST_S = 5.0  # Custo fixo por repositório (clonagem, JVM, escrita)
+
+def _size_mb(field, value):
+    if value is None or value != value or value <= 0:  # None, NaN ou zero
+        return None
+    return value / 1024 if field == 'disk_usage_kb' else value / 1024 ** 2
+
+class CostHistory:
+    """
+    Custo observado por repositório (média móvel exponencial, em segundos),
+    acompanhado dos tamanhos conhecidos na medição. Persistido em JSON com
+    gravação atômica para ser aprendido ao longo das execuções.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._repos = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self._repos = json.load(f).get('repos', {})
+            except (OSError, ValueError) as e:
+                logging.warning(f"Histórico de custos '{path}' ignorado: {e}")
+
+    def __len__(self):
+        with self._lock:
+            return len(self._repos)
+
+    def cost(self, repo_name):
+        with self._lock:
+            entry = self._repos.get(repo_name)
+            return entry['custo_s'] if entry else None
+
+    def record(self, repo_name, seconds, **sizes):
+        """Atualiza o custo do repositório com uma nova medição e grava o histórico."""
+        with self._lock:
+            entry = self._repos.get(repo_name)
+            if entry is None:
+                entry = self._repos[repo_name] = {'custo_s': seconds, 'amostras': 0}
+            else:
+                entry['custo_s'] = EWMA_ALPHA * seconds + (1 - EWMA_ALPHA) * entry['custo_s']
+            entry['custo_s'] = round(entry['custo_s'], 3)
+            entry['amostras'] += 1
+            entry['atualizado_em'] = time.time()
+            entry.update({field: value for field, value in sizes.items() if value is not None})
+            self._save()
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'repos': self._repos}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def rates(self):
+        """
+        Custo por MB de cada campo de tamanho (razão entre as somas de custo e
+        de tamanho nas medições), com o valor inicial enquanto houver poucas medições.
+        """
+        with self._lock:
+            entries = list(self._repos.values())
+        rates = {}
+        for field, default in SIZE_RATE_DEFAULTS.items():
+            pairs = [(entry['custo_s'], _size_mb(field, entry.get(field))) for entry in entries]
+            pairs = [(cost, size) for cost, size in pairs if size]
+            if len(pairs) >= MIN_SAMPLES_FOR_RATE:
+                variable_cost = sum(max(cost - BASE_COST_S, 0.0) for cost, _ in pairs)
+                rates[field] = variable_cost / sum(size for _, size in pairs)
+            else:
+                rates[field] = default
+        return rates
+
+def estimar_custos(repo_names, sizes, history):
+    """
+    Custo estimado (s) de cada repositório: o histórico, se houver; senão o
+    tamanho conhecido vezes o custo por MB aprendido; senão a mediana das
+    demais estimativas.
+
+    Args:
+        repo_names: Nomes dos repositórios
+        sizes: Dicionário nome -> {campo de tamanho: valor} (ex.: do catálogo)
+        history: CostHistory ou None
+    """
+    rates = history.rates() if history is not None else dict(SIZE_RATE_DEFAULTS)
+    costs = {}
+    for repo_name in repo_names:
+        cost = history.cost(repo_name) if history is not None else None
+        if cost is None:
+            repo_sizes = sizes.get(repo_name, {})
+            for field in SIZE_RATE_DEFAULTS:
+                size = _size_mb(field, repo_sizes.get(field))
+                if size:
+                    cost = BASE_COST_S + rates[field] * size
+                    break
+        costs[repo_name] = cost
+    known = [cost for cost in costs.values() if cost is not None]
+    fallback = statistics.median(known) if known else BASE_COST_S
+    return {repo_name: fallback if cost is None else cost for repo_name, cost in costs.items()}
+
+def ordenar_tarefas(repo_tasks, sizes, history, policy='maior_primeiro'):
+    """
+    Ordena as tarefas (index, repo_name, total_repos) segundo a política:
+    'maior_primeiro' (LPT, custo estimado decrescente) ou 'original'.
+
+    Returns:
+        tuple: (tarefas ordenadas, dicionário de custos estimados)
+    """
+    if policy == 'original':
+        return list(repo_tasks), {}
+    if policy != 'maior_primeiro':
+        raise ValueError(f"Política de escalonamento desconhecida: {policy}")
+    costs = estimar_custos([task[1] for task in repo_tasks], sizes, history)
+    # sorted é estável: empates mantêm a ordem original (por estrelas)
+    return sorted(repo_tasks, key=lambda task: -costs[task[1]]), costs
@@ -0,0 +1,86 @@
+import re
+import json
+import subprocess
+
+# Classificação das falhas do pipeline e parâmetros das novas tentativas.
+# Falhas transitórias (timeouts, rede, falta de heap, JVM encerrada) são tentadas
+# novamente depois da passada principal, com espera e limites crescentes; as demais
+# são definitivas. Os repositórios que continuam falhando são listados em
+# FAILED_REPOS_FILE, no formato de repo.json (pode ser usado como entrada de main.py).
+FAILED_REPOS_FILE = 'repositorios_com_falha.json'
+MAX_RETRIES = 2
+RETRY_BACKOFF_S = 30  # Espera antes da 1ª rodada de novas tentativas; dobra a cada rodada
+TIMEOUT_FACTOR = 2  # Multiplicador do timeout (clonagem ou CK) a cada nova tentativa
+HEAP_FACTOR = 2  # Multiplicador do heap do CK a cada nova tentativa após falta de memória
+
+# Categoria -> pode ser tentada novamente
+FAILURE_CLASSES = {
+    'clone_timeout': True,
+    'rede': True,
+    'clone_falha': False,  # Ex.: repositório removido ou privado
+    'ck_timeout': True,
+    'ck_oom': True,
+    'ck_falha': True,  # JVM encerrada por outro motivo
+    'sem_java': False,
+    'sem_class_csv': False,
+    'class_csv_vazio': False,
+    'outro': False,
+}
+
+NETWORK_ERROR_PATTERN = re.compile(
+    r"could not resolve host|connection (timed out|reset|refused)|early eof|rpc failed|unexpected disconnect|"
+    r"the remote end hung up|unable to access|gnutls|ssl_read|http\s?5\d\d|operation timed out|network is unreachable",
+    re.IGNORECASE)
+OOM_PATTERN = re.compile(r"OutOfMemoryError|Java heap space|GC overhead limit exceeded")
+OOM_KILL_CODES = (-9, 137)  # SIGKILL, em geral do OOM killer do sistema
+
+def _program(e):
+    cmd = getattr(e, 'cmd', None)
+    if isinstance(cmd, (list, tuple)) and cmd:
+        return str(cmd[0])
+    return str(cmd or '')
+
+def classificar_falha(e):
+    """Categoria (chave de FAILURE_CLASSES) de uma exceção de clonagem ou do CK."""
+    is_git = _program(e).endswith('git')
+    if isinstance(e, subprocess.TimeoutExpired):
+        return 'clone_timeout' if is_git else 'ck_timeout'
+    if isinstance(e, subprocess.CalledProcessError):
+        stderr = e.stderr if isinstance(e.stderr, str) else (e.stderr or b'').decode('utf-8', 'replace')
+        if is_git:
+            return 'rede' if NETWORK_ERROR_PATTERN.search(stderr) else 'clone_falha'
+        if OOM_PATTERN.search(stderr) or e.returncode in OOM_KILL_CODES:
+            return 'ck_oom'
+        return 'ck_falha'
+    return 'outro'
+
+def pode_tentar_novamente(categoria):
+    return FAILURE_CLASSES.get(categoria, False)
+
+def parametros_tentativa(categoria, tentativa, clone_timeout, ck_timeout, heap_mb, max_heap_mb):
+    """
+    Limites da tentativa de número 'tentativa' (1 = primeira nova tentativa):
+    o timeout da etapa que falhou cresce por TIMEOUT_FACTOR e, após falta de
+    memória, o heap cresce por HEAP_FACTOR (até max_heap_mb).
+
+    Returns:
+        dict: 'clone_timeout', 'ck_timeout' e 'heap_mb'
+    """
+    params = {'clone_timeout': clone_timeout, 'ck_timeout': ck_timeout, 'heap_mb': heap_mb}
+    if categoria in ('clone_timeout', 'rede'):
+        params['clone_timeout'] = clone_timeout * TIMEOUT_FACTOR ** tentativa
+    elif categoria == 'ck_timeout':
+        params['ck_timeout'] = ck_timeout * TIMEOUT_FACTOR ** tentativa
+    elif categoria == 'ck_oom' and heap_mb:
+        params['heap_mb'] = min(heap_mb * HEAP_FACTOR ** tentativa, max_heap_mb)
+    return params
+
+def gravar_falhas(path, falhas):
+    """
+    Grava a lista de repositórios que continuam falhando.
+
+    Args:
+        falhas: Lista de dicionários com 'name', 'falha', 'erro' e 'tentativas'
+    """
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(falhas, f, ensure_ascii=False, indent=2)
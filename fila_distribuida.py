@@ -0,0 +1,363 @@
+import os
+import time
+import uuid
+import socket
+import logging
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+
+import falhas
+
+# Fila de trabalho compartilhada (SQLite) para distribuir a análise entre várias máquinas.
+# Cada worker reivindica repositórios com um lease renovado por heartbeat; se o worker
+# cair, o lease expira e o repositório volta a ser reivindicável por outro worker.
+# Os resultados ficam na própria fila (um por repositório) e são exportados em um CSV único.
+#   python fila_distribuida.py popular /mnt/compartilhado/fila_ck.db repo.json
+#   python fila_distribuida.py trabalhar /mnt/compartilhado/fila_ck.db     (em cada máquina)
+#   python fila_distribuida.py status /mnt/compartilhado/fila_ck.db
+#   python fila_distribuida.py exportar /mnt/compartilhado/fila_ck.db --saida resultados_metricas.csv
+# Em armazenamento de rede (NFS/SMB) o SQLite não pode usar WAL: a fila usa o journal
+# padrão (DELETE), que depende apenas de locks de arquivo do sistema compartilhado.
+# As novas tentativas de falhas transitórias também passam pela fila (main.py não faz
+# rodadas locais nesse modo): o repositório volta como pendente após uma espera
+# crescente, e quem o reivindicar escalona os limites pelo número de tentativas e
+# pela categoria da última falha, gravados na própria fila.
+LEASE_SECONDS = 300
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 5
+MAX_ATTEMPTS = falhas.MAX_RETRIES + 1  # Reivindicações (inclusive por leases expirados) antes de marcar como falha
+IDLE_POLL_INTERVAL = 30  # Espera do worker enquanto outros ainda processam repositórios
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pendente',
+    worker TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    finished_at REAL,
+    error TEXT,
+    falha TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_claim ON tasks(status, position);
+CREATE TABLE IF NOT EXISTS results (
+    name TEXT PRIMARY KEY,
+    row TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    finished_at REAL NOT NULL
+);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+class WorkQueue:
+    """
+    Fila de repositórios em um arquivo SQLite compartilhado.
+
+    Estados: 'pendente' -> 'em_andamento' (com worker e lease) ->
+    'concluido' | 'sem_resultado' | 'falhou'. Um repositório em andamento
+    com lease vencido pode ser reivindicado de novo. Resultados são gravados
+    com chave no nome do repositório: uma conclusão atrasada de um worker
+    que perdeu o lease não duplica a linha.
+    """
+    FINISHED_STATUSES = ('concluido', 'sem_resultado', 'falhou')
+
+    def __init__(self, path, worker_id=None, lease_seconds=LEASE_SECONDS, max_attempts=MAX_ATTEMPTS):
+        self.path = path
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = None
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+            # Filas criadas antes da coluna com a categoria da falha
+            if 'falha' not in {row['name'] for row in conn.execute("PRAGMA table_info(tasks)")}:
+                conn.execute("ALTER TABLE tasks ADD COLUMN falha TEXT")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Transação com lock de escrita desde o início, para reivindicações atômicas entre máquinas."""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def populate(self, repo_names):
+        """
+        Acrescenta repositórios na ordem dada (posição = prioridade).
+        Repositórios já presentes mantêm o estado e a posição.
+
+        Returns:
+            int: Quantidade de repositórios novos
+        """
+        with self._transaction() as conn:
+            start = conn.execute("SELECT COALESCE(MAX(position) + 1, 0) FROM tasks").fetchone()[0]
+            before = conn.total_changes
+            conn.executemany("INSERT OR IGNORE INTO tasks (name, position) VALUES (?, ?)",
+                             [(name, start + i) for i, name in enumerate(repo_names)])
+            return conn.total_changes - before
+
+    def claim(self):
+        """
+        Reivindica o próximo repositório pendente (ou com lease vencido).
+        Repositórios devolvidos após uma falha transitória só voltam a ser
+        reivindicáveis depois da espera definida em complete.
+
+        Returns:
+            tuple: (posição, nome, tentativas incluindo esta, categoria da
+            última falha) ou None se não houver nada a reivindicar
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            # Leases vencidos que já esgotaram as tentativas não voltam para a fila
+            conn.execute(
+                "UPDATE tasks SET status = 'falhou', worker = NULL, finished_at = ?, "
+                "error = COALESCE(error, 'lease expirado') "
+                "WHERE status = 'em_andamento' AND lease_expires < ? AND attempts >= ?",
+                (now, now, self.max_attempts))
+            row = conn.execute(
+                "SELECT name, position, status, worker, attempts, falha FROM tasks "
+                "WHERE (status = 'pendente' AND COALESCE(lease_expires, 0) <= ?) "
+                "OR (status = 'em_andamento' AND lease_expires < ?) "
+                "ORDER BY position LIMIT 1", (now, now)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE tasks SET status = 'em_andamento', worker = ?, lease_expires = ?, "
+                "attempts = attempts + 1 WHERE name = ?",
+                (self.worker_id, now + self.lease_seconds, row['name']))
+        if row['status'] == 'em_andamento':
+            logging.warning(f"Lease de {row['name']} expirado (worker {row['worker']}): reivindicado novamente")
+        with self._held_lock:
+            self._held.add(row['name'])
+        return row['position'], row['name'], row['attempts'] + 1, row['falha']
+
+    def claims(self):
+        """Gerador de reivindicações sob demanda, até a fila não ter mais nada disponível."""
+        while True:
+            claimed = self.claim()
+            if claimed is None:
+                return
+            yield claimed
+
+    def complete(self, repo_name, status, row=None, error=None, falha=None):
+        """
+        Finaliza um repositório reivindicado por este worker. 'concluido' e
+        'sem_resultado' são definitivos, assim como as falhas cuja categoria
+        (falhas.FAILURE_CLASSES) não admite nova tentativa; outros status
+        devolvem o repositório à fila até esgotar as tentativas, reivindicável
+        de novo só após falhas.RETRY_BACKOFF_S (dobrando a cada tentativa).
+        """
+        now = time.time()
+        if falha is not None and status not in ('concluido', 'sem_resultado') \
+                and not falhas.pode_tentar_novamente(falha):
+            status = 'falhou'
+        with self._transaction() as conn:
+            if row is not None:
+                conn.execute("INSERT OR IGNORE INTO results (name, row, worker, finished_at) VALUES (?, ?, ?, ?)",
+                             (repo_name, row, self.worker_id, now))
+            if status in ('concluido', 'sem_resultado'):
+                conn.execute("UPDATE tasks SET status = ?, worker = NULL, lease_expires = NULL, finished_at = ?, "
+                             "error = ?, falha = ? WHERE name = ?", (status, now, error, falha, repo_name))
+            elif status == 'falhou':
+                conn.execute("UPDATE tasks SET status = 'falhou', worker = NULL, lease_expires = NULL, "
+                             "finished_at = ?, error = ?, falha = ? "
+                             "WHERE name = ? AND worker = ? AND status = 'em_andamento'",
+                             (now, error, falha, repo_name, self.worker_id))
+            else:
+                # Só devolve se o lease ainda for deste worker (outro pode ter reivindicado);
+                # no estado pendente, lease_expires marca quando a nova tentativa pode começar
+                conn.execute(
+                    "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'falhou' ELSE 'pendente' END, "
+                    "worker = NULL, lease_expires = CASE WHEN attempts >= ? THEN NULL "
+                    "ELSE ? + ? * (1 << (attempts - 1)) END, finished_at = ?, error = ?, falha = ? "
+                    "WHERE name = ? AND worker = ? AND status = 'em_andamento'",
+                    (self.max_attempts, self.max_attempts, now, falhas.RETRY_BACKOFF_S, now, error, falha,
+                     repo_name, self.worker_id))
+        with self._held_lock:
+            self._held.discard(repo_name)
+
+    def renew_leases(self):
+        """Renova os leases de todos os repositórios em posse deste worker."""
+        with self._held_lock:
+            held = list(self._held)
+        if not held:
+            return 0
+        with self._transaction() as conn:
+            conn.executemany("UPDATE tasks SET lease_expires = ? WHERE name = ? AND worker = ? AND status = 'em_andamento'",
+                             [(time.time() + self.lease_seconds, name, self.worker_id) for name in held])
+        return len(held)
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        self._stop.clear()
+        self._heartbeat = threading.Thread(target=self._run_heartbeat, args=(interval,),
+                                           name="Queue-Heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def stop_heartbeat(self):
+        self._stop.set()
+        if self._heartbeat is not None:
+            self._heartbeat.join()
+            self._heartbeat = None
+
+    def _run_heartbeat(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                self.renew_leases()
+            except sqlite3.Error as e:
+                logging.error(f"Falha ao renovar leases da fila: {e}")
+
+    def counts(self):
+        """Quantidade de repositórios por status."""
+        with self._connect() as conn:
+            return {row['status']: row['total'] for row in conn.execute(
+                "SELECT status, COUNT(*) AS total FROM tasks GROUP BY status")}
+
+    def remaining(self):
+        """Repositórios ainda não finalizados (pendentes ou em andamento em qualquer worker)."""
+        counts = self.counts()
+        return sum(total for status, total in counts.items() if status not in self.FINISHED_STATUSES)
+
+    def workers(self):
+        """Workers com leases ativos e quantos repositórios cada um mantém."""
+        with self._connect() as conn:
+            return {row['worker']: row['total'] for row in conn.execute(
+                "SELECT worker, COUNT(*) AS total FROM tasks WHERE status = 'em_andamento' AND lease_expires >= ? "
+                "GROUP BY worker", (time.time(),))}
+
+    def export(self, output_file, header):
+        """Grava os resultados (um por repositório, na ordem da fila) em um CSV único."""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT r.row FROM results r JOIN tasks t ON t.name = r.name ORDER BY t.position")
+            count = 0
+            with open(output_file, 'w', newline='', encoding='utf-8') as f:
+                f.write(header)
+                for (row,) in rows:
+                    f.write(row + '\n')
+                    count += 1
+        return count
+
+    def failures(self):
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                "SELECT name, attempts, error, falha FROM tasks WHERE status = 'falhou' ORDER BY position")]
+
+    def write_failures(self, path):
+        """Lista em path os repositórios que falharam na fila, no formato de main.gravar_repositorios_com_falha."""
+        failed = [{'name': failure['name'], 'falha': failure['falha'], 'erro': failure['error'],
+                   'tentativas': failure['attempts'], 'definitiva': not falhas.pode_tentar_novamente(failure['falha'])}
+                  for failure in self.failures()]
+        falhas.gravar_falhas(path, failed)
+        return failed
+
+def trabalhar(queue_path, max_workers=None):
+    """
+    Executa o pipeline de main.py como worker da fila até ela se esgotar,
+    aguardando enquanto outros workers ainda mantêm repositórios (um lease
+    que vencer devolve o repositório para a fila).
+    """
+    import main  # Importado aqui: configura o logging do pipeline
+    work_queue = WorkQueue(queue_path)
+    # Mesmo dimensionamento da execução local (main.py)
+    default_workers, clone_workers = main.dimensionar_workers()
+    if max_workers:
+        clone_workers = main.CLONE_WORKERS or 2 * min(max_workers, main.INITIAL_CK_WORKERS)
+    else:
+        max_workers = default_workers
+    os.makedirs(main.CLONE_DIR_BASE, exist_ok=True)
+    os.makedirs(main.CK_OUTPUT_DIR_BASE, exist_ok=True)
+    logging.info(f"Worker {work_queue.worker_id} usando a fila '{queue_path}'")
+    work_queue.start_heartbeat()
+    try:
+        while True:
+            main.process_repositories_multithread(None, max_workers, clone_workers, main.MAX_PENDING_CLONES,
+                                                  work_queue=work_queue)
+            remaining = work_queue.remaining()
+            if remaining == 0:
+                break
+            logging.info(f"Fila sem repositórios disponíveis; {remaining} ainda em andamento em outros workers")
+            time.sleep(IDLE_POLL_INTERVAL)
+    finally:
+        work_queue.stop_heartbeat()
+    # Uma vez, a partir da fila: cada passada do pipeline só conhece os repositórios dela
+    failed = work_queue.write_failures(main.FAILED_REPOS_FILE)
+    if failed:
+        logging.warning(f"{len(failed)} repositórios falharam na fila; lista em '{main.FAILED_REPOS_FILE}'")
+    logging.info(f"Fila esgotada: {work_queue.counts()}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Fila distribuída de repositórios para análise com o CK')
+    subparsers = parser.add_subparsers(dest='comando', required=True)
+
+    popular = subparsers.add_parser('popular', help='Acrescenta repositórios à fila (JSON ou catálogo .db)')
+    popular.add_argument('fila')
+    popular.add_argument('entrada')
+    popular.add_argument('--limite', type=int, default=1000)
+
+    trabalhar_parser = subparsers.add_parser('trabalhar', help='Processa repositórios da fila nesta máquina')
+    trabalhar_parser.add_argument('fila')
+    trabalhar_parser.add_argument('--workers', type=int, default=None, help='Workers de CK nesta máquina')
+
+    status = subparsers.add_parser('status', help='Resumo da fila')
+    status.add_argument('fila')
+
+    exportar = subparsers.add_parser('exportar', help='Grava os resultados em um CSV único')
+    exportar.add_argument('fila')
+    exportar.add_argument('--saida', default='resultados_metricas.csv')
+
+    args = parser.parse_args()
+
+    if args.comando != 'popular' and not os.path.exists(args.fila):
+        print(f"ERRO: Fila '{args.fila}' não encontrada.")
+        return
+
+    if args.comando == 'popular':
+        import main as pipeline
+        import escalonamento
+        try:
+            repos_df = pipeline.load_repositories(args.entrada).head(args.limite)
+        except FileNotFoundError:
+            print(f"ERRO: Arquivo de entrada '{args.entrada}' não encontrado.")
+            return
+        # Ordem da fila = escalonamento local (custo estimado decrescente)
+        tasks = [(i, name, len(repos_df)) for i, name in enumerate(repos_df['name'])]
+        sizes = pipeline.tamanhos_repositorios(repos_df)
+        tasks, _ = escalonamento.ordenar_tarefas(tasks, sizes, pipeline.cost_history, pipeline.SCHEDULING_POLICY)
+        added = WorkQueue(args.fila).populate([name for _, name, _ in tasks])
+        print(f"{added} repositórios acrescentados à fila '{args.fila}' ({len(tasks) - added} já presentes)")
+    elif args.comando == 'trabalhar':
+        trabalhar(args.fila, args.workers)
+    elif args.comando == 'status':
+        work_queue = WorkQueue(args.fila)
+        print(f"Status: {work_queue.counts()}")
+        for worker, total in work_queue.workers().items():
+            print(f"  {worker}: {total} repositórios em andamento")
+        for failure in work_queue.failures():
+            print(f"  falhou: {failure['name']} ({failure['falha']}, {failure['attempts']} tentativas): "
+                  f"{failure['error']}")
+    elif args.comando == 'exportar':
+        from main import CSV_HEADER
+        count = WorkQueue(args.fila).export(args.saida, CSV_HEADER)
+        print(f"{count} resultados exportados para '{args.saida}'")
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,45 @@
 import requests
 import json
+import os
+import sys
 from datetime import datetime
 import time # Importamos a biblioteca time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from agendador_requisicoes import RequestScheduler
+from catalogo import RepositoryCatalog, CATALOG_FILE
 
 # Substitua pelo seu Token de Acesso Pessoal do GitHub
 GITHUB_TOKEN = ""
 
-# Endpoint da API GraphQL do GitHub
+# Endpoint da API GraphQL do GitHub (pode apontar para um servidor GraphQL falso em testes)
 URL = "https://api.github.com/graphql"
 
-# A query GraphQL (sem alteração)
+# Filtro da busca e faixa de estrelas coletada
+SEARCH_QUALIFIERS = "language:Java"
+MIN_STARS = 2000
+MAX_STARS = 1_000_000
+# A busca do GitHub retorna no máximo 1000 resultados por consulta
+SEARCH_RESULT_LIMIT = 1000
+PAGE_SIZE = 100
+COLLECTOR_WORKERS = 8
+
+# Quantidade de resultados de uma faixa de estrelas (usada para dividir em fragmentos)
+COUNT_QUERY = """
+query RepositoryCount($q: String!) {
+  search(query: $q, type: REPOSITORY, first: 1) {
+    repositoryCount
+  }
+}
+"""
+
+# A query GraphQL paginada de um fragmento da busca
 QUERY = """
-query TopJavaRepositories($cursor: String) {
-  search(query: "language:Java sort:stars stars:2000..2115", type: REPOSITORY, first: 76, after: $cursor) {
+query TopJavaRepositories($q: String!, $first: Int!, $cursor: String) {
+  search(query: $q, type: REPOSITORY, first: $first, after: $cursor) {
     pageInfo {
       endCursor
       hasNextPage
@@ -33,96 +60,324 @@ query TopJavaRepositories($cursor: String) {
 }
 """
 
-def run_query(query, variables):
-    """
-    Função para executar a query GraphQL, agora com retentativas e timeout.
-    """
-    headers = {"Authorization": f"Bearer {GITHUB_TOKEN}"}
-    max_retries = 5
-    base_wait_time = 5 # segundos
+_scheduler_lock = threading.Lock()
+_schedulers = {}
 
-    for attempt in range(max_retries):
-        try:
-            # Adicionado um timeout de 30 segundos na requisição
-            request = requests.post(URL, json={'query': query, 'variables': variables}, headers=headers, timeout=30)
-            
-            # Se o status for 502, tentamos novamente
-            if request.status_code == 502:
-                print(f"  -> Tentativa {attempt + 1}/{max_retries}: Recebido erro 502 (Bad Gateway). Tentando novamente em {base_wait_time * (attempt + 1)}s...")
-                time.sleep(base_wait_time * (attempt + 1)) # Espera aumenta a cada tentativa
-                continue
+class ColetaIncompleta(Exception):
+    """Fragmentos da busca que falharam: a coleta não cobre toda a faixa de estrelas."""
+    def __init__(self, failed_shards, repos):
+        self.failed_shards = failed_shards  # Lista de (min_stars, max_stars)
+        self.repos = repos  # O que foi coletado dos demais fragmentos
+        ranges = ", ".join(f"stars:{low}..{high}" for low, high in failed_shards)
+        super().__init__(f"{len(failed_shards)} fragmentos falharam ({ranges})")
 
-            request.raise_for_status() # Lança um erro para outros status HTTP ruins (4xx, 5xx)
-            
-            return request.json()
+def get_tokens():
+    """Tokens disponíveis: GITHUB_TOKEN e, opcionalmente, GITHUB_TOKENS (separados por vírgula) para rotação."""
+    tokens = [GITHUB_TOKEN] + [token.strip() for token in os.environ.get("GITHUB_TOKENS", "").split(",")]
+    return list(dict.fromkeys(token for token in tokens if token))
 
-        except requests.exceptions.RequestException as e:
-            print(f"  -> Tentativa {attempt + 1}/{max_retries}: Ocorreu um erro de requisição: {e}. Tentando novamente em {base_wait_time * (attempt + 1)}s...")
-            time.sleep(base_wait_time * (attempt + 1))
-    
-    # Se todas as tentativas falharem
-    raise Exception(f"Query falhou após {max_retries} tentativas.")
+def get_scheduler(url=None):
+    """Agendador compartilhado por endpoint (uma sessão HTTP com pool de conexões)."""
+    url = url or URL
+    with _scheduler_lock:
+        if url not in _schedulers:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=COLLECTOR_WORKERS * 2)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _schedulers[url] = RequestScheduler(get_tokens(), url, session)
+        return _schedulers[url]
+
+def run_query(query, variables, url=None):
+    """
+    Executa a query GraphQL pelo agendador: ritmo por balde de fichas a partir
+    do custo informado em rateLimit, rotação de tokens, Retry-After/limites
+    secundários e backoff exponencial com jitter.
+    """
+    return get_scheduler(url).execute(query, variables)
 
 
-# O resto do script (calculate_age, get_top_1000_java_repos, etc.) permanece o mesmo
 def calculate_age(created_at_str):
     created_at_date = datetime.strptime(created_at_str, "%Y-%m-%dT%H:%M:%SZ")
     today = datetime.now()
     age = today.year - created_at_date.year - ((today.month, today.day) < (created_at_date.month, created_at_date.day))
     return age
 
-def get_top_1000_java_repos():
-    all_repos = []
+def parse_repo_node(repo_node):
+    """Converte um nó 'Repository' da API no formato salvo em repo.json."""
+    repo_data = {
+        "name": repo_node["nameWithOwner"],
+        "stars": repo_node["stargazerCount"],
+        "releases": repo_node["releases"]["totalCount"],
+        "age_years": calculate_age(repo_node["createdAt"]),
+        "created_at": repo_node["createdAt"]
+    }
+    # Campos de tamanho (RQ04 e agendamento), presentes apenas na busca em lote
+    if "diskUsage" in repo_node:
+        repo_data["disk_usage_kb"] = repo_node["diskUsage"]
+    if "languages" in repo_node:
+        languages = repo_node["languages"]
+        repo_data["language_bytes"] = languages["totalSize"]
+        repo_data["java_bytes"] = sum(edge["size"] for edge in languages["edges"] if edge["node"]["name"] == "Java")
+    return repo_data
+
+def star_query(min_stars, max_stars):
+    return f"{SEARCH_QUALIFIERS} sort:stars stars:{min_stars}..{max_stars}"
+
+def count_repositories(min_stars, max_stars, url=None):
+    result = run_query(COUNT_QUERY, {"q": star_query(min_stars, max_stars)}, url)
+    if "errors" in result:
+        raise Exception(f"Erro na API: {result['errors']}")
+    return result["data"]["search"]["repositoryCount"]
+
+def split_star_range(min_stars, max_stars, url=None, executor=None):
+    """
+    Divide [min_stars, max_stars] em fragmentos com menos de SEARCH_RESULT_LIMIT
+    resultados cada, bissectando as faixas cheias. As contagens de cada nível
+    da bissecção são feitas em paralelo.
+
+    Returns:
+        list: Tuplas (min_stars, max_stars, quantidade) ordenadas pela faixa
+    """
+    shards = []
+    frontier = [(min_stars, max_stars)]
+    while frontier:
+        if executor is not None:
+            counts = list(executor.map(lambda r: count_repositories(r[0], r[1], url), frontier))
+        else:
+            counts = [count_repositories(low, high, url) for low, high in frontier]
+
+        next_frontier = []
+        for (low, high), count in zip(frontier, counts):
+            if count == 0:
+                continue
+            if count < SEARCH_RESULT_LIMIT or low == high:
+                if count >= SEARCH_RESULT_LIMIT:
+                    logging.warning(f"Faixa stars:{low}..{high} tem {count} repositórios e não pode ser dividida; "
+                                    f"apenas {SEARCH_RESULT_LIMIT} serão coletados.")
+                shards.append((low, high, count))
+            else:
+                middle = (low + high) // 2
+                next_frontier.extend([(low, middle), (middle + 1, high)])
+        frontier = next_frontier
+
+    return sorted(shards)
+
+def fetch_shard(min_stars, max_stars, url=None):
+    """Percorre todas as páginas de um fragmento da busca."""
+    repos = []
     cursor = None
-    
-    print("Iniciando a coleta de dados do GitHub...")
-    
-    for i in range(1):
-        print(f"Buscando página {i + 1}/10...")
-        variables = {"cursor": cursor}
-        
-        try:
-            result = run_query(QUERY, variables)
-        except Exception as e:
-            print(f"Erro fatal ao buscar a página {i + 1}: {e}")
-            print("O script será interrompido. Os dados coletados até agora estão na variável 'all_repos'.")
-            break
-        
+    while True:
+        result = run_query(QUERY, {"q": star_query(min_stars, max_stars), "first": PAGE_SIZE, "cursor": cursor}, url)
         if "errors" in result:
-            print("Erro na API:", result["errors"])
-            break
+            raise Exception(f"Erro na API: {result['errors']}")
 
         data = result["data"]["search"]
-        
-        for edge in data["edges"]:
-            repo_node = edge["node"]
-            age_in_years = calculate_age(repo_node["createdAt"])
-            
-            repo_data = {
-                "name": repo_node["nameWithOwner"],
-                "stars": repo_node["stargazerCount"],
-                "releases": repo_node["releases"]["totalCount"],
-                "age_years": age_in_years,
-                "created_at": repo_node["createdAt"]
-            }
-            all_repos.append(repo_data)
-
-        if data["pageInfo"]["hasNextPage"]:
-            cursor = data["pageInfo"]["endCursor"]
-        else:
-            break
-            
+        repos.extend(parse_repo_node(edge["node"]) for edge in data["edges"] if edge["node"])
+
+        if not data["pageInfo"]["hasNextPage"]:
+            return repos
+        cursor = data["pageInfo"]["endCursor"]
+
+def collect_java_repos(min_stars=MIN_STARS, max_stars=MAX_STARS, limit=None, max_workers=COLLECTOR_WORKERS, url=None):
+    """
+    Coleta concorrente: divide a faixa de estrelas em fragmentos abaixo do
+    limite de 1000 resultados da busca, pagina os fragmentos em paralelo
+    sobre uma única sessão HTTP e junta os resultados sem duplicatas
+    (por nameWithOwner), ordenados por estrelas.
+
+    Raises:
+        ColetaIncompleta: se algum fragmento falhar (com os repositórios dos
+            demais em 'repos'), para que uma coleta parcial não seja gravada
+            como se fosse completa
+    """
+    print("Iniciando a coleta de dados do GitHub...")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="GraphQL-Worker") as executor:
+        shards = split_star_range(min_stars, max_stars, url, executor)
+        print(f"Faixa stars:{min_stars}..{max_stars} dividida em {len(shards)} fragmentos "
+              f"({sum(count for _, _, count in shards)} repositórios)")
+
+        futures = {executor.submit(fetch_shard, low, high, url): (low, high) for low, high, _ in shards}
+        unique_repos = {}
+        failed_shards = []
+        for future, (low, high) in futures.items():
+            try:
+                shard_repos = future.result()
+            except Exception as e:
+                print(f"Erro ao buscar o fragmento stars:{low}..{high}: {e}")
+                failed_shards.append((low, high))
+                continue
+            for repo in shard_repos:
+                unique_repos[repo["name"]] = repo
+
+    all_repos = sorted(unique_repos.values(), key=lambda repo: repo["stars"], reverse=True)
+    if limit is not None:
+        all_repos = all_repos[:limit]
+
+    stats = get_scheduler(url).stats
     print(f"\nColeta finalizada. Total de {len(all_repos)} repositórios encontrados.")
+    print(f"{stats['requests']} requisições em {stats['elapsed']:.1f}s, {stats['points']} pontos, "
+          f"{stats['wait_time']:.1f}s de espera por limites/backoff")
+    if failed_shards:
+        raise ColetaIncompleta(failed_shards, all_repos)
     return all_repos
 
+# Campos buscados por repositório na consulta em lote (um alias por repositório)
+REPOSITORY_FIELDS_FRAGMENT = """
+fragment RepositoryFields on Repository {
+  nameWithOwner
+  stargazerCount
+  createdAt
+  diskUsage
+  releases {
+    totalCount
+  }
+  languages(first: 20, orderBy: {field: SIZE, direction: DESC}) {
+    totalSize
+    edges {
+      size
+      node {
+        name
+      }
+    }
+  }
+}
+"""
+
+# Tamanho do lote: ajustado conforme o custo reportado em rateLimit
+BATCH_SIZE_INITIAL = 25
+BATCH_SIZE_MIN = 1
+BATCH_SIZE_MAX = 100
+BATCH_TARGET_COST = 1  # Pontos por requisição que consideramos aceitáveis
+
+def build_batch_query(names):
+    """
+    Monta uma única query com um alias 'rN: repository(...)' por repositório.
+
+    Returns:
+        tuple: (query, variáveis)
+    """
+    definitions = []
+    selections = []
+    variables = {}
+    for i, name_with_owner in enumerate(names):
+        owner, name = name_with_owner.split("/", 1)
+        definitions.append(f"$o{i}: String!, $n{i}: String!")
+        selections.append(f"  r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...RepositoryFields }}")
+        variables[f"o{i}"] = owner
+        variables[f"n{i}"] = name
+    query = (f"query BatchRepositories({', '.join(definitions)}) {{\n" + "\n".join(selections) + "\n}\n"
+             + REPOSITORY_FIELDS_FRAGMENT)
+    return query, variables
+
+def fetch_batch(names, url=None):
+    """
+    Busca um lote de repositórios em uma única requisição.
+
+    Returns:
+        tuple: (repositórios encontrados, custo reportado pela API)
+    """
+    query, variables = build_batch_query(names)
+    result = run_query(query, variables, url)
+    data = result.get("data") or {}
+
+    errors = [error for error in result.get("errors") or [] if error.get("type") != "NOT_FOUND"]
+    if errors and not any(data.get(f"r{i}") for i in range(len(names))):
+        raise Exception(f"Erro na API: {errors}")
+    for error in result.get("errors") or []:
+        if error.get("type") == "NOT_FOUND":
+            print(f"Repositório não encontrado: {error.get('message')}")
+
+    repos = [parse_repo_node(data[f"r{i}"]) for i in range(len(names)) if data.get(f"r{i}")]
+    cost = (data.get("rateLimit") or {}).get("cost", BATCH_TARGET_COST)
+    return repos, cost
+
+def fetch_repositories(names, url=None):
+    """
+    Busca os metadados atuais (incluindo diskUsage e bytes por linguagem) de
+    uma lista de repositórios, empacotando dezenas de consultas por requisição.
+
+    O lote cresce enquanto o custo reportado fica dentro de BATCH_TARGET_COST
+    e é reduzido à metade quando o custo passa do alvo ou a requisição falha.
+    """
+    names = list(dict.fromkeys(names))
+    repos = []
+    batch_size = BATCH_SIZE_INITIAL
+    position = 0
+    while position < len(names):
+        batch = names[position:position + batch_size]
+        try:
+            batch_repos, cost = fetch_batch(batch, url)
+        except Exception as e:
+            if batch_size == BATCH_SIZE_MIN:
+                print(f"Falha ao buscar {batch[0]}: {e}")
+                position += len(batch)
+                continue
+            batch_size = max(BATCH_SIZE_MIN, batch_size // 2)
+            print(f"Lote de {len(batch)} falhou ({e}); reduzindo para {batch_size}")
+            continue
+
+        repos.extend(batch_repos)
+        position += len(batch)
+        if cost > BATCH_TARGET_COST:
+            batch_size = max(BATCH_SIZE_MIN, batch_size // 2)
+        else:
+            batch_size = min(BATCH_SIZE_MAX, int(batch_size * 1.5) + 1)
+        print(f"{position}/{len(names)} repositórios consultados (custo do lote: {cost}, próximo lote: {batch_size})")
+    return repos
+
+def load_name_list(json_path):
+    """Lê uma lista explícita de repositórios (ex.: repositorios_faltantes.json)."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    return [entry["name"] if isinstance(entry, dict) else entry for entry in entries]
+
+def refresh_catalog(catalog, ttl_hours, url=None):
+    """Busca novamente apenas as entradas do catálogo mais antigas que o TTL."""
+    stale = catalog.stale_names(ttl_hours * 3600)
+    print(f"{len(stale)} repositórios com dados mais antigos que {ttl_hours}h serão atualizados.")
+    if stale:
+        catalog.upsert(fetch_repositories(stale, url=url))
+    return len(stale)
+
+def get_top_1000_java_repos():
+    return collect_java_repos(limit=1000)
+
 # --- Execução Principal ---
 if __name__ == "__main__":
-    if GITHUB_TOKEN == "SEU_TOKEN_AQUI":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(threadName)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Coleta de repositórios Java do GitHub para o catálogo incremental")
+    parser.add_argument("--catalogo", default=CATALOG_FILE, help="Arquivo SQLite do catálogo")
+    parser.add_argument("--atualizar", action="store_true",
+                        help="Apenas busca novamente as entradas mais antigas que o TTL")
+    parser.add_argument("--ttl-horas", type=float, default=24.0)
+    parser.add_argument("--importar", metavar="JSON", help="Importa um repo.json legado para o catálogo")
+    parser.add_argument("--lista", metavar="JSON",
+                        help="Busca em lote os metadados de uma lista explícita (ex.: repositorios_faltantes.json)")
+    parser.add_argument("--min-stars", type=int, default=MIN_STARS)
+    args = parser.parse_args()
+
+    catalog = RepositoryCatalog(args.catalogo)
+
+    if args.importar:
+        print(f"{catalog.import_json(args.importar)} registros importados de '{args.importar}'.")
+    elif GITHUB_TOKEN == "SEU_TOKEN_AQUI":
         print("ERRO: Por favor, defina seu GITHUB_TOKEN no script.")
+    elif args.lista:
+        repositories = fetch_repositories(load_name_list(args.lista))
+        catalog.upsert(repositories)
+        print(f"{len(repositories)} repositórios de '{args.lista}' atualizados em '{args.catalogo}'.")
+    elif args.atualizar:
+        refresh_catalog(catalog, args.ttl_horas)
     else:
-        repositories = get_top_1000_java_repos()
-        with open("repo.json", "a", encoding="utf-8") as f:
-            json.dump(repositories, f, ensure_ascii=False, indent=2)
+        try:
+            repositories = collect_java_repos(min_stars=args.min_stars)
+        except ColetaIncompleta as e:
+            print(f"ERRO: coleta incompleta: {e}. Nada foi gravado em '{args.catalogo}'; execute novamente.")
+            sys.exit(1)
+        catalog.upsert(repositories)
+        print(f"{len(repositories)} repositórios gravados em '{args.catalogo}' ({catalog.count()} no total).")
         print(f"\n--- Exemplo dos primeiros {len(repositories[:5])} resultados ---")
         for repo in repositories[:5]:
-            print(json.dumps(repo, indent=2))
\ No newline at end of file
+            print(json.dumps(repo, indent=2))
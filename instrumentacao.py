@@ -0,0 +1,287 @@
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+import subprocess
+from contextlib import contextmanager
+
+# Instrumentação estruturada do pipeline de main.py:
+#   - eventos JSONL (um objeto por linha), com spans por repositório e etapa:
+#       {"ts": ..., "evento": "span", "repo": "owner/name", "etapa": "ck", "duracao_s": 12.3,
+#        "status": "ok", "cpu_s": 40.1, "pico_rss_kb": 812345, ...}
+#   - arquivo de métricas no formato texto do Prometheus (textfile collector), opcional
+#   - resumo periódico de vazão e ETA no log
+# Exemplo de consulta: tempo total por etapa
+#   jq -s 'map(select(.evento=="span")) | group_by(.etapa) | map({etapa: .[0].etapa, s: (map(.duracao_s) | add)})' eventos_pipeline.jsonl
+METRIC_PREFIX = 'ck_pipeline'
+POLL_INTERVAL = 0.05
+
+try:
+    CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    CLOCK_TICKS = 100
+
+def _json_default(value):
+    # Escalares do numpy e demais tipos não serializáveis
+    return value.item() if hasattr(value, 'item') else str(value)
+
+def read_proc_usage(pid):
+    """
+    Tempo de CPU (s) e pico de RSS (KB, VmHWM) de um processo vivo, lidos de
+    /proc. Retorna (None, None) fora do Linux.
+    """
+    try:
+        with open(f"/proc/{pid}/stat", 'r') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        cpu_s = (int(fields[11]) + int(fields[12])) / CLOCK_TICKS  # utime + stime
+        peak_rss_kb = None
+        with open(f"/proc/{pid}/status", 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    peak_rss_kb = int(line.split()[1])
+                    break
+        return cpu_s, peak_rss_kb
+    except (OSError, IndexError, ValueError):
+        return None, None
+
+def reset_peak_rss(pid):
+    """Zera o VmHWM do processo (Linux >= 4.0), para medir o pico de uma única requisição."""
+    try:
+        with open(f"/proc/{pid}/clear_refs", 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def run_with_usage(command, timeout):
+    """
+    Equivalente a subprocess.run(command, check=True, capture_output=True,
+    text=True, timeout=timeout) que também retorna o uso de recursos do
+    processo filho, obtido com os.wait4.
+
+    O pico de RSS vem do VmHWM do filho, amostrado durante a espera: o
+    ru_maxrss do wait4 herda o pico do processo pai anterior ao exec e só é
+    usado para processos curtos demais para serem amostrados.
+
+    Returns:
+        dict: {'cpu_s': ..., 'pico_rss_kb': ...} (vazio se os.wait4 não existir)
+    """
+    if not hasattr(os, 'wait4'):
+        subprocess.run(command, check=True, capture_output=True, text=True, timeout=timeout)
+        return {}
+
+    # Saídas em arquivos temporários: não há pipes a drenar enquanto se espera o processo
+    with tempfile.TemporaryFile() as stdout, tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdout=stdout, stderr=stderr)
+        deadline = time.monotonic() + timeout
+        sampled_peak_kb = None
+        while True:
+            pid, status, usage = os.wait4(process.pid, os.WNOHANG)
+            if pid:
+                break
+            _, peak_kb = read_proc_usage(process.pid)
+            if peak_kb is not None:
+                sampled_peak_kb = max(sampled_peak_kb or 0, peak_kb)
+            if time.monotonic() > deadline:
+                process.kill()
+                _, status, usage = os.wait4(process.pid, 0)
+                process.returncode = os.waitstatus_to_exitcode(status)
+                raise subprocess.TimeoutExpired(command, timeout)
+            time.sleep(POLL_INTERVAL)
+        # O processo já foi coletado: evita que o Popen tente esperá-lo de novo
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        if process.returncode != 0:
+            stdout.seek(0)
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(
+                process.returncode, command,
+                output=stdout.read().decode('utf-8', 'replace'), stderr=stderr.read().decode('utf-8', 'replace'))
+
+    return {'cpu_s': usage.ru_utime + usage.ru_stime, 'pico_rss_kb': sampled_peak_kb or usage.ru_maxrss}
+
+class PipelineInstrumentation:
+    """
+    Coleta spans por repositório e etapa, grava-os como eventos JSONL e
+    mantém agregados (tempo por etapa, bytes clonados, arquivos Java, CPU e
+    pico de RSS do CK) para o arquivo de métricas do Prometheus e para o
+    resumo periódico de vazão/ETA.
+    """
+    def __init__(self, event_log_file, metrics_file=None, progress_interval=30.0):
+        self.event_log_file = event_log_file
+        self.metrics_file = metrics_file
+        self.progress_interval = progress_interval
+        self._lock = threading.Lock()
+        self._file = None
+        self._reset()
+
+    def _reset(self):
+        self._stage_seconds = {}
+        self._stage_count = {}
+        self._status_count = {}
+        self._git_dir_bytes = 0
+        self._java_files = 0
+        self._ck_cpu_s = 0.0
+        self._ck_peak_rss_kb = 0
+        self._total = 0
+        self._finished = 0
+        self._run_started = None
+        self._last_progress = 0.0
+
+    def emit(self, event, **fields):
+        """Grava um evento no log JSONL (thread-safe)."""
+        record = {'ts': round(time.time(), 3), 'evento': event, 'thread': threading.current_thread().name, **fields}
+        line = json.dumps(record, ensure_ascii=False, default=_json_default)
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.event_log_file, 'a', encoding='utf-8', buffering=1)
+            self._file.write(line + '\n')
+
+    @contextmanager
+    def span(self, repo_name, stage, **fields):
+        """
+        Mede uma etapa de um repositório. O dicionário retornado pode receber
+        campos adicionais (ex.: bytes clonados), gravados junto com o span.
+        """
+        started_at = time.time()
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield fields
+        except BaseException as e:
+            status = 'erro'
+            fields['erro'] = type(e).__name__
+            raise
+        finally:
+            duration = time.perf_counter() - start
+            self._record(stage, duration, fields)
+            self.emit('span', repo=repo_name, etapa=stage, inicio=round(started_at, 3),
+                      duracao_s=round(duration, 4), status=status, **fields)
+
+    def _record(self, stage, duration, fields):
+        with self._lock:
+            self._stage_seconds[stage] = self._stage_seconds.get(stage, 0.0) + duration
+            self._stage_count[stage] = self._stage_count.get(stage, 0) + 1
+            self._git_dir_bytes += fields.get('git_dir_size') or 0
+            self._java_files += fields.get('java_files') or 0
+            self._ck_cpu_s += fields.get('cpu_s') or 0.0
+            self._ck_peak_rss_kb = max(self._ck_peak_rss_kb, fields.get('pico_rss_kb') or 0)
+
+    def start_run(self, total):
+        with self._lock:
+            self._reset()
+            self._total = total
+            self._run_started = time.monotonic()
+            self._last_progress = self._run_started
+        self.emit('inicio', total=total)
+        self.write_metrics()
+
+    def repo_finished(self, repo_name, status):
+        """Registra o fim de um repositório e, periodicamente, a vazão e o ETA."""
+        with self._lock:
+            self._status_count[status] = self._status_count.get(status, 0) + 1
+            self._finished += 1
+            now = time.monotonic()
+            report = now - self._last_progress >= self.progress_interval or self._finished == self._total
+            if report:
+                self._last_progress = now
+        self.emit('repositorio', repo=repo_name, status=status)
+        if report:
+            summary = self.progress()
+            logging.info(f"Vazão: {summary['concluidos']}/{summary['total']} repositórios, "
+                         f"{summary['repos_por_minuto']:.1f} repos/min, ETA {format_duration(summary['eta_s'])}")
+            self.write_metrics()
+
+    def progress(self):
+        with self._lock:
+            elapsed = time.monotonic() - self._run_started if self._run_started else 0.0
+            rate = self._finished / elapsed if elapsed > 0 else 0.0
+            remaining = max(self._total - self._finished, 0)
+            return {
+                'total': self._total,
+                'concluidos': self._finished,
+                'decorrido_s': elapsed,
+                'repos_por_minuto': rate * 60,
+                'eta_s': remaining / rate if rate > 0 else None,
+            }
+
+    def stage_summary(self):
+        """Tempo acumulado por etapa, do maior para o menor."""
+        with self._lock:
+            return sorted(((stage, self._stage_seconds[stage], self._stage_count[stage])
+                           for stage in self._stage_seconds), key=lambda item: -item[1])
+
+    def finish_run(self):
+        """Grava o evento de resumo e o arquivo de métricas final; registra no log onde o tempo foi gasto."""
+        progress = self.progress()
+        stages = self.stage_summary()
+        with self._lock:
+            totals = {'bytes_git': self._git_dir_bytes, 'arquivos_java': self._java_files,
+                      'ck_cpu_s': self._ck_cpu_s, 'ck_pico_rss_kb': self._ck_peak_rss_kb,
+                      'status': dict(self._status_count)}
+        self.emit('resumo', **progress, **totals,
+                  etapas={stage: {'total_s': round(seconds, 3), 'n': count} for stage, seconds, count in stages})
+        self.write_metrics()
+
+        logging.info(f"Tempo acumulado por etapa (soma entre threads) em {progress['decorrido_s']:.1f}s:")
+        for stage, seconds, count in stages:
+            logging.info(f"  {stage:<8} {seconds:10.1f}s  ({count} spans, média {seconds / count:.2f}s)")
+        logging.info(f"Clonados {totals['bytes_git'] / 1024 ** 2:.1f} MB em .git, {totals['arquivos_java']} arquivos .java; "
+                     f"CPU do CK {totals['ck_cpu_s']:.1f}s, pico de RSS do CK {totals['ck_pico_rss_kb'] / 1024:.0f} MB")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def write_metrics(self):
+        """Grava as métricas no formato texto do Prometheus (de forma atômica), se configurado."""
+        if not self.metrics_file:
+            return
+        progress = self.progress()
+        with self._lock:
+            lines = [
+                f"# HELP {METRIC_PREFIX}_repos_total Repositórios finalizados por status",
+                f"# TYPE {METRIC_PREFIX}_repos_total counter",
+                *[f'{METRIC_PREFIX}_repos_total{{status="{status}"}} {count}'
+                  for status, count in sorted(self._status_count.items())],
+                f"# HELP {METRIC_PREFIX}_stage_seconds Tempo gasto por etapa",
+                f"# TYPE {METRIC_PREFIX}_stage_seconds summary",
+                *[f'{METRIC_PREFIX}_stage_seconds_sum{{stage="{stage}"}} {self._stage_seconds[stage]:.6f}\n'
+                  f'{METRIC_PREFIX}_stage_seconds_count{{stage="{stage}"}} {self._stage_count[stage]}'
+                  for stage in sorted(self._stage_seconds)],
+                f"# HELP {METRIC_PREFIX}_git_dir_bytes_total Tamanho somado dos diretórios .git dos clones",
+                f"# TYPE {METRIC_PREFIX}_git_dir_bytes_total counter",
+                f"{METRIC_PREFIX}_git_dir_bytes_total {self._git_dir_bytes}",
+                f"# TYPE {METRIC_PREFIX}_java_files_total counter",
+                f"{METRIC_PREFIX}_java_files_total {self._java_files}",
+                f"# TYPE {METRIC_PREFIX}_ck_cpu_seconds_total counter",
+                f"{METRIC_PREFIX}_ck_cpu_seconds_total {self._ck_cpu_s:.3f}",
+                f"# TYPE {METRIC_PREFIX}_ck_peak_rss_bytes gauge",
+                f"{METRIC_PREFIX}_ck_peak_rss_bytes {self._ck_peak_rss_kb * 1024}",
+            ]
+        lines += [
+            f"# TYPE {METRIC_PREFIX}_repos_remaining gauge",
+            f"{METRIC_PREFIX}_repos_remaining {progress['total'] - progress['concluidos']}",
+            f"# TYPE {METRIC_PREFIX}_throughput_repos_per_minute gauge",
+            f"{METRIC_PREFIX}_throughput_repos_per_minute {progress['repos_por_minuto']:.3f}",
+        ]
+        if progress['eta_s'] is not None:
+            lines += [f"# TYPE {METRIC_PREFIX}_eta_seconds gauge", f"{METRIC_PREFIX}_eta_seconds {progress['eta_s']:.0f}"]
+
+        tmp_path = f"{self.metrics_file}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write('\n'.join(lines) + '\n')
+            os.replace(tmp_path, self.metrics_file)
+        except OSError as e:
+            logging.error(f"Erro ao gravar métricas em {self.metrics_file}: {str(e)}")
+
+def format_duration(seconds):
+    if seconds is None:
+        return '--:--:--'
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
@@ -5,9 +5,25 @@ import pandas as pd
 import stat
 import time 
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 from threading import Lock
 import logging
+import json
+import uuid
+import csv
+import ck_residente
+import controle_concorrencia
+import cache_resultados
+import clonagem
+import agregacao_ck
+import ck_incremental
+import arquivo_ck
+import instrumentacao
+import escalonamento
+import falhas
+from catalogo import RepositoryCatalog, SIZE_FIELDS
 
 # Configuração de logging para monitorar threads
 logging.basicConfig(
@@ -20,15 +36,47 @@ logging.basicConfig(
 )
 
 CK_JAR_PATH = 'ck-0.7.1-SNAPSHOT-jar-with-dependencies.jar'; 
-INPUT_JSON_FILE = 'repositorios_faltantes.json'
+INPUT_JSON_FILE = 'repositorios_faltantes.json'  # JSON ou catálogo SQLite (ex.: 'catalogo_repos.db')
 OUTPUT_CSV_FILE = 'resultados_metricas_faltante.csv'
 CLONE_DIR_BASE = 'clones'
 CK_OUTPUT_DIR_BASE = 'ck_output'
+OUTPUT_STATS_CSV_FILE = 'estatisticas_ck_detalhadas.csv'
+MANIFEST_FILE = 'manifesto_progresso.json'
+CLONE_WORKERS = None  # None = 2x o número de workers de CK
+MAX_PENDING_CLONES = None  # None = número de workers de CK
+TRASH_DIR = os.path.join(CLONE_DIR_BASE, '.lixeira')
+MAX_PENDING_DELETIONS = 4  # Remoções pendentes a partir das quais novas clonagens são pausadas
+USE_RESIDENT_CK = True  # Mantém JVMs do CK vivas entre repositórios (requer javac para compilar ck_servidor/)
+CLONE_MODE = 'esparso'  # 'esparso' (--filter=blob:none + sparse-checkout) ou 'completo'
+SPARSE_INCLUDE_PATTERNS = ['*.java']
+SPARSE_EXCLUDE_PATTERNS = []  # Ex.: ['**/src/test/'] para ignorar testes
+ARCHIVE_RAW_OUTPUT = True  # Guarda class.csv/method.csv em Parquet (requer pyarrow), ver arquivo_ck.py
+ARCHIVE_DIR = arquivo_ck.ARCHIVE_DIR
+CLONE_URL_TEMPLATE = 'https://github.com/{repo_name}.git'  # Ex.: 'file:///caminho/bare/{repo_name}.git' para testes locais
+CK_FLAGS = ['false', '0', 'false']  # useJars, maxAtOnce, variablesAndFields
+USE_RESULT_CACHE = True
+RESULT_CACHE_DIR = 'cache_ck'
+RESULT_CACHE_MAX_BYTES = 2 * 1024 ** 3  # 2 GB, remoção LRU acima disso
+INCREMENTAL_CK = True  # Reanalisa só os .java alterados (e dependentes) desde o último commit no cache; requer o CK residente
+EVENT_LOG_FILE = 'eventos_pipeline.jsonl'  # Spans por repositório/etapa em JSONL
+METRICS_TEXTFILE = None  # Ex.: 'ck_pipeline.prom' para o textfile collector do node_exporter
+PROGRESS_LOG_INTERVAL = 30  # Segundos entre resumos de vazão/ETA no log
+ADAPTIVE_CONCURRENCY = True  # Ajusta o número de análises simultâneas do CK por CPU, memória e disco
+MAX_CK_WORKERS = None  # Teto do controlador adaptativo (None = número de CPUs)
+INITIAL_CK_WORKERS = 6  # Concorrência inicial do CK (limite fixo quando ADAPTIVE_CONCURRENCY = False)
+SIZE_CK_HEAP = True  # -Xmx de cada JVM do CK estimado pelo tamanho do repositório
+RESIDENT_CK_HEAP_MB = 2048  # Heap das JVMs residentes; repositórios que precisam de mais usam uma JVM própria
+SCHEDULING_POLICY = 'maior_primeiro'  # 'maior_primeiro' (custo estimado decrescente) ou 'original' (ordem da entrada)
+COST_HISTORY_FILE = escalonamento.COST_HISTORY_FILE  # Custos medidos por repositório, aprendidos entre execuções
+CLONE_TIMEOUT = 300  # 5 minutos (cresce nas novas tentativas após timeout ou erro de rede)
+CK_TIMEOUT = 600  # 10 minutos (cresce nas novas tentativas após timeout do CK)
+MAX_RETRIES = falhas.MAX_RETRIES  # Rodadas de novas tentativas para falhas transitórias, após a passada principal
+FAILED_REPOS_FILE = falhas.FAILED_REPOS_FILE  # Repositórios que continuam falhando (formato de repo.json)
+CSV_HEADER = 'repo_name,cbo_mean,dit_mean,lcom_mean,cbo_total,dit_total,lcom_total\n'
 
 # Locks para thread-safety
 file_write_lock = Lock()
 directory_creation_lock = Lock()
-cleanup_lock = Lock()
 
 # Contador thread-safe para progresso
 class ThreadSafeCounter:
@@ -48,193 +96,1259 @@ class ThreadSafeCounter:
 
 progress_counter = ThreadSafeCounter()
 
-def analisar_repositorio(repo_info):
+# Manifesto persistente de progresso por repositório
+class ProgressManifest:
     """
-    Função thread-safe para analisar um repositório usando CK.
-    
+    Manifesto durável com o estado de cada repositório (status, tentativas,
+    tempos e offset no CSV de saída), usado para retomar execuções interrompidas.
+    Cada atualização é gravada atomicamente (arquivo temporário + os.replace).
+    """
+    FINISHED_STATUSES = ('concluido', 'sem_resultado')
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = Lock()
+        self._data = {'output_file': None, 'output_offset': 0, 'repos': {}}
+
+    def load(self):
+        """Carrega o manifesto do disco, se existir."""
+        with self._lock:
+            if os.path.exists(self.path):
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._data = json.load(f)
+            return self._data
+
+    @property
+    def exists(self):
+        return os.path.exists(self.path)
+
+    @property
+    def output_offset(self):
+        with self._lock:
+            return self._data.get('output_offset', 0)
+
+    @property
+    def stats_offset(self):
+        """Offset confirmado de OUTPUT_STATS_CSV_FILE (None em manifestos antigos)."""
+        with self._lock:
+            return self._data.get('stats_offset')
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def _entry(self, repo_name):
+        return self._data['repos'].setdefault(repo_name, {
+            'status': 'pendente',
+            'attempts': 0,
+            'started_at': None,
+            'finished_at': None,
+            'duration_s': None,
+            'output_offset': None,
+            'error': None
+        })
+
+    def is_finished(self, repo_name):
+        with self._lock:
+            entry = self._data['repos'].get(repo_name)
+            return entry is not None and entry['status'] in self.FINISHED_STATUSES
+
+    def reset_output(self, output_file, output_offset):
+        """Registra um novo arquivo de saída (ex.: após escrever o cabeçalho)."""
+        with self._lock:
+            self._data['output_file'] = output_file
+            self._data['output_offset'] = output_offset
+            self._save()
+
+    def reset_stats_offset(self, stats_offset):
+        with self._lock:
+            self._data['stats_offset'] = stats_offset
+            self._save()
+
+    def completed(self):
+        """Nomes dos repositórios com linha confirmada no CSV de saída."""
+        with self._lock:
+            return {name for name, entry in self._data['repos'].items() if entry['status'] == 'concluido'}
+
+    def status(self, repo_name):
+        with self._lock:
+            entry = self._data['repos'].get(repo_name)
+            return entry['status'] if entry else None
+
+    def entry(self, repo_name):
+        """Cópia da entrada do repositório (ou {} se ainda não existir)."""
+        with self._lock:
+            return dict(self._data['repos'].get(repo_name, {}))
+
+    def mark_started(self, repo_name):
+        with self._lock:
+            entry = self._entry(repo_name)
+            entry['status'] = 'em_andamento'
+            entry['attempts'] += 1
+            entry['started_at'] = time.time()
+            entry['finished_at'] = None
+            entry['duration_s'] = None
+            entry['error'] = None
+            entry.pop('falha', None)
+            self._save()
+
+    def mark_finished(self, repo_name, status, output_offset=None, error=None, stats_offset=None, **extra):
+        """
+        Marca o repositório como finalizado com o status informado.
+        Se output_offset (stats_offset) for passado, ele passa a ser o offset
+        confirmado do CSV de saída (de estatísticas detalhadas).
+        """
+        with self._lock:
+            entry = self._entry(repo_name)
+            entry['status'] = status
+            entry['finished_at'] = time.time()
+            if entry['started_at'] is not None:
+                entry['duration_s'] = round(entry['finished_at'] - entry['started_at'], 3)
+            entry['error'] = error
+            entry.update(extra)
+            if output_offset is not None:
+                entry['output_offset'] = output_offset
+                self._data['output_offset'] = max(self._data.get('output_offset', 0), output_offset)
+            if stats_offset is not None:
+                self._data['stats_offset'] = max(self._data.get('stats_offset') or 0, stats_offset)
+            self._save()
+
+    def update(self, repo_name, **fields):
+        """Acrescenta campos informativos à entrada do repositório (ex.: estatísticas do clone)."""
+        with self._lock:
+            self._entry(repo_name).update(fields)
+            self._save()
+
+    @staticmethod
+    def _scan_csv(output_file):
+        """
+        Linhas completas de um CSV de resultados.
+
+        Returns:
+            tuple: (dicionário repositório -> offset do fim da sua linha, offset do fim da última linha completa)
+        """
+        rows = {}
+        with open(output_file, 'rb') as f:
+            end = len(f.readline())  # cabeçalho
+            while True:
+                line = f.readline()
+                # Linha incompleta no fim do arquivo (execução interrompida no meio da escrita)
+                if not line or not line.endswith(b'\n'):
+                    break
+                end = f.tell()
+                rows[line.decode('utf-8').split(',', 1)[0]] = end
+        return rows, end
+
+    def bootstrap_from_csv(self, output_file):
+        """
+        Cria o manifesto a partir de um CSV de resultados já existente,
+        marcando como concluídos os repositórios que já possuem linha no arquivo.
+        """
+        rows, end = self._scan_csv(output_file)
+        with self._lock:
+            self._data = {'output_file': output_file, 'output_offset': end, 'repos': {}}
+            for repo_name, offset in rows.items():
+                entry = self._entry(repo_name)
+                entry['status'] = 'concluido'
+                entry['output_offset'] = offset
+            self._save()
+
+    def reconcile_with_csv(self, output_file):
+        """
+        Alinha o manifesto a um CSV de saída que não corresponde ao offset
+        confirmado (apagado, recriado ou mais curto): os repositórios marcados
+        como concluídos sem linha no arquivo voltam a 'pendente'.
+
+        Returns:
+            list: Repositórios que voltaram a 'pendente'
+        """
+        rows, end = self._scan_csv(output_file)
+        with self._lock:
+            reset = []
+            for repo_name, entry in self._data['repos'].items():
+                if entry['status'] == 'concluido' and repo_name not in rows:
+                    entry['status'] = 'pendente'
+                    entry['output_offset'] = None
+                    reset.append(repo_name)
+                elif repo_name in rows:
+                    entry['output_offset'] = rows[repo_name]
+            self._data['output_file'] = output_file
+            self._data['output_offset'] = end
+            self._save()
+            return reset
+
+progress_manifest = ProgressManifest(MANIFEST_FILE)
+
+# Remoção de clones em segundo plano
+class BackgroundDeleter:
+    """
+    Remove diretórios em uma thread dedicada. Os diretórios são primeiro
+    renomeados para a lixeira (no mesmo sistema de arquivos, logo os.replace é
+    atômico), liberando imediatamente o caminho original para o worker.
+
+    Funciona também como proteção contra pressão de disco: enquanto houver
+    max_pending ou mais remoções pendentes, wait_for_capacity() bloqueia,
+    pausando novas clonagens.
+    """
+    def __init__(self, trash_dir, max_pending):
+        self.trash_dir = trash_dir
+        self.max_pending = max_pending
+        self._queue = queue.Queue()
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._total_time = 0.0
+        self._deleted = 0
+        self._failed = 0
+        self._queued = set()  # Caminhos na lixeira já enfileirados (schedule e a varredura de sobras podem coincidir)
+        self._thread = None
+
+    def start(self):
+        """Inicia a thread de remoção (idempotente) e reagenda sobras da lixeira."""
+        with self._condition:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            os.makedirs(self.trash_dir, exist_ok=True)
+            self._thread = threading.Thread(target=self._run, name="Cleanup-Deleter", daemon=True)
+            self._thread.start()
+
+        # Restos de execuções anteriores interrompidas
+        for leftover in os.listdir(self.trash_dir):
+            self._enqueue(os.path.join(self.trash_dir, leftover), 'lixeira', 'Cleanup-Deleter')
+
+    def schedule(self, path, thread_name):
+        """Move o diretório para a lixeira e agenda sua remoção."""
+        self.start()
+        trash_path = os.path.join(self.trash_dir, f"{os.path.basename(path)}-{uuid.uuid4().hex}")
+        os.replace(path, trash_path)
+        self._enqueue(trash_path, path, thread_name)
+
+    def _enqueue(self, trash_path, original_path, thread_name):
+        with self._condition:
+            if trash_path in self._queued:
+                return
+            self._queued.add(trash_path)
+            self._pending += 1
+        self._queue.put((trash_path, original_path, thread_name))
+
+    @property
+    def pending(self):
+        with self._condition:
+            return self._pending
+
+    def wait_for_capacity(self):
+        """Bloqueia enquanto houver remoções pendentes demais."""
+        with self._condition:
+            if self._pending >= self.max_pending:
+                logging.info(f"Pausando novas clonagens: {self._pending} remoções pendentes")
+                self._condition.wait_for(lambda: self._pending < self.max_pending)
+
+    def drain(self):
+        """Aguarda todas as remoções pendentes e retorna (removidos, falhas, tempo total das remoções em segundos)."""
+        if self._thread is not None:
+            self._queue.join()
+        with self._condition:
+            return self._deleted, self._failed, self._total_time
+
+    def _run(self):
+        while True:
+            trash_path, original_path, thread_name = self._queue.get()
+            start = time.perf_counter()
+            removed = failed = False
+            try:
+                # A varredura de sobras pode listar um caminho que já foi removido
+                if os.path.lexists(trash_path):
+                    shutil.rmtree(trash_path, onexc=remove_readonly)
+                    removed = True
+                    logging.info(f"[{thread_name}] Repositório clonado removido: {original_path} "
+                                 f"({time.perf_counter() - start:.2f}s)")
+            except Exception as e:
+                failed = True
+                logging.error(f"Erro ao remover {trash_path}: {str(e)}")
+            finally:
+                with self._condition:
+                    self._pending -= 1
+                    self._queued.discard(trash_path)
+                    if removed:
+                        self._deleted += 1
+                        self._total_time += time.perf_counter() - start
+                    elif failed:
+                        self._failed += 1
+                    self._condition.notify_all()
+                self._queue.task_done()
+
+repository_deleter = BackgroundDeleter(TRASH_DIR, MAX_PENDING_DELETIONS)
+
+# Pool de JVMs residentes do CK (None = uma JVM nova por repositório)
+ck_pool = None
+
+# Controle adaptativo de concorrência e admissão por memória (None = limite fixo)
+concurrency_controller = None
+
+# Histórico de custos para o escalonamento e tamanhos informados pela entrada (catálogo)
+cost_history = escalonamento.CostHistory(COST_HISTORY_FILE)
+repo_sizes = {}
+
+# Limites escalonados (clone_timeout, ck_timeout, heap_mb) dos repositórios em nova tentativa
+retry_params = {}
+
+# Spans por etapa, métricas do Prometheus e vazão/ETA
+instrumentation = instrumentacao.PipelineInstrumentation(EVENT_LOG_FILE, METRICS_TEXTFILE, PROGRESS_LOG_INTERVAL)
+
+# Cache de resultados por commit (None = desativado)
+result_cache = cache_resultados.ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_BYTES) if USE_RESULT_CACHE else None
+
+def clonar_repositorio(repo_info):
+    """
+    Estágio de clonagem (limitado por rede/disco).
+
     Args:
         repo_info: Tupla contendo (index, repo_name, total_repos)
-    
+
     Returns:
-        dict: Métricas calculadas ou None em caso de erro
+        dict: Dados do clone para o estágio de CK
     """
     index, repo_name, total_repos = repo_info
     thread_name = threading.current_thread().name
-    
-    try:
-        logging.info(f"[{thread_name}] Iniciando análise do repositório {index + 1}/{total_repos}: {repo_name}")
-        
-        clone_url = f'https://github.com/{repo_name}.git'
-        repo_safe_name = repo_name.replace('/', '_')
-        repo_clone_path = os.path.join(CLONE_DIR_BASE, repo_safe_name)
-        ck_output_path = os.path.join(CK_OUTPUT_DIR_BASE, repo_safe_name)
-
-        # Thread-safe directory creation
-        with directory_creation_lock:
-            os.makedirs(ck_output_path, exist_ok=True)
-            os.makedirs(CLONE_DIR_BASE, exist_ok=True)
-
-        # Clonagem do repositório
-        logging.info(f"[{thread_name}] Clonando {repo_name}...")
-        clone_result = subprocess.run(
-            ['git', 'clone', '--depth', '1', clone_url, repo_clone_path],
-            check=True, capture_output=True, text=True, timeout=300  # 5 minutos timeout
+
+    logging.info(f"[{thread_name}] Iniciando análise do repositório {index + 1}/{total_repos}: {repo_name}")
+    progress_manifest.mark_started(repo_name)
+
+    clone_url = CLONE_URL_TEMPLATE.format(repo_name=repo_name)
+    repo_safe_name = repo_name.replace('/', '_')
+    clone_job = {
+        'repo_info': repo_info,
+        'repo_name': repo_name,
+        'repo_safe_name': repo_safe_name,
+        'repo_clone_path': os.path.join(CLONE_DIR_BASE, repo_safe_name),
+        'ck_output_path': os.path.join(CK_OUTPUT_DIR_BASE, repo_safe_name)
+    }
+
+    # Thread-safe directory creation
+    with directory_creation_lock:
+        os.makedirs(clone_job['ck_output_path'], exist_ok=True)
+        os.makedirs(CLONE_DIR_BASE, exist_ok=True)
+
+    # Clonagem do repositório
+    logging.info(f"[{thread_name}] Clonando {repo_name}...")
+    clone_start = time.perf_counter()
+    with instrumentation.span(repo_name, 'clone') as span:
+        clone_stats = clonagem.clonar(
+            clone_url, clone_job['repo_clone_path'], CLONE_MODE,
+            SPARSE_INCLUDE_PATTERNS, SPARSE_EXCLUDE_PATTERNS,
+            timeout=retry_params.get(repo_name, {}).get('clone_timeout', CLONE_TIMEOUT)
         )
+        span.update(clone_stats)
+    clone_job.update(clone_stats)
+    clone_job['clone_s'] = time.perf_counter() - clone_start
+    progress_manifest.update(repo_name, **clone_stats)
+    logging.info(f"[{thread_name}] Clone de {repo_name} ({clone_stats['clone_mode']}): "
+                 f"{clone_stats['git_dir_size'] / 1024 ** 2:.1f} MB em .git, "
+                 f"{clone_stats['disk_size'] / 1024 ** 2:.1f} MB em disco, {clone_stats['java_files']} arquivos .java")
+
+    if result_cache is not None:
+        clone_job['commit_sha'] = cache_resultados.resolve_local_head(clone_job['repo_clone_path'])
+
+    return clone_job
+
+def clone_file_set(clone_mode=None):
+    """
+    Descrição dos arquivos que o CK enxerga no clone: o modo completo traz a
+    árvore inteira; os modos esparsos, só os padrões do sparse-checkout.
+    """
+    clone_mode = clone_mode or CLONE_MODE
+    if clone_mode == 'completo':
+        return ['completo']
+    # 'esparso_sem_filtro' transfere todos os blobs, mas o checkout é o mesmo do 'esparso'
+    return ['esparso', *clonagem.sparse_patterns(SPARSE_INCLUDE_PATTERNS, SPARSE_EXCLUDE_PATTERNS)]
 
-        # Execução do CK
-        logging.info(f"[{thread_name}] Executando CK em {repo_name}...")
-        ck_result = subprocess.run(
-            ['java', '-jar', CK_JAR_PATH, repo_clone_path, 'false', '0', 'false', ck_output_path],
-            check=True, capture_output=True, text=True, timeout=600  # 10 minutos timeout
+def cache_key(repo_name, commit_sha, clone_mode=None):
+    """
+    Chave do cache: (repositório, HEAD, versão do jar do CK, flags do CK,
+    arquivos clonados). clone_mode é o modo efetivo do clone (ao gravar) ou o
+    configurado (ao consultar antes de clonar).
+    """
+    return cache_resultados.ResultCache.make_key(
+        repo_name, commit_sha, cache_resultados.ck_jar_version(CK_JAR_PATH), CK_FLAGS, clone_file_set(clone_mode))
+
+def consultar_cache(repo_info):
+    """
+    Consulta o cache de resultados antes de clonar, resolvendo o HEAD remoto
+    com 'git ls-remote'. Em caso de acerto, clone e CK são pulados.
+
+    Returns:
+        dict: Métricas do cache ou None
+    """
+    if result_cache is None:
+        return None
+
+    repo_name = repo_info[1]
+    thread_name = threading.current_thread().name
+    with instrumentation.span(repo_name, 'cache') as span:
+        commit_sha = cache_resultados.resolve_remote_head(CLONE_URL_TEMPLATE.format(repo_name=repo_name))
+        metrics = result_cache.get(cache_key(repo_name, commit_sha)) if commit_sha else None
+        span['acerto'] = metrics is not None
+    if metrics is None:
+        return None
+
+    progress_manifest.mark_started(repo_name)
+    metrics['thread_name'] = thread_name
+    current_progress = progress_counter.increment()
+    logging.info(f"[{thread_name}] Cache: {repo_name}@{commit_sha[:10]} sem mudanças, clone e CK ignorados "
+                 f"(progresso: {current_progress}/{repo_info[2]})")
+    return metrics
+
+def armazenar_no_cache(clone_job, metrics):
+    """Guarda métricas agregadas e saídas brutas do CK no cache (falhas não interrompem a análise)."""
+    repo_name = clone_job['repo_name']
+    try:
+        repo_safe_name = clone_job['repo_safe_name']
+        result_cache.put(
+            cache_key(repo_name, clone_job['commit_sha'], clone_job.get('clone_mode')),
+            {key: value for key, value in metrics.items() if key != 'thread_name'},
+            {
+                'class.csv': os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}class.csv"),
+                'method.csv': os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}method.csv")
+            },
+            repo_name=repo_name, commit_sha=clone_job['commit_sha']
         )
+    except Exception as e:
+        logging.error(f"Erro ao gravar {repo_name} no cache: {str(e)}")
 
-        # Processamento dos resultados
-        class_metrics_file = os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}class.csv")
-        logging.info(f"[{thread_name}] Verificando arquivo de métricas: {class_metrics_file}")
+def heap_estimado_mb(clone_job):
+    """Heap estimado (MB) pelo tamanho do clone, ou None se o dimensionamento estiver desativado."""
+    if not SIZE_CK_HEAP:
+        return None
+    return controle_concorrencia.estimate_heap_mb(clone_job.get('java_files'), clone_job.get('disk_size'))
 
-        if not os.path.exists(class_metrics_file):
-            logging.warning(f"[{thread_name}] Arquivo 'class.csv' não encontrado para {repo_name}. Pode não ser um projeto Java válido.")
-            return None
+def ck_heap_mb(clone_job):
+    """Heap (MB) para o CK analisar o clone: o da nova tentativa, se houver, ou o estimado."""
+    if not SIZE_CK_HEAP:
+        return None
+    if retry_params.get(clone_job['repo_name'], {}).get('heap_mb'):
+        return retry_params[clone_job['repo_name']]['heap_mb']
+    return heap_estimado_mb(clone_job)
+
+def usa_jvm_residente(heap_mb):
+    """Indica se a análise roda numa JVM residente do pool (ver run_ck)."""
+    return ck_pool is not None and (heap_mb is None or heap_mb <= RESIDENT_CK_HEAP_MB)
+
+def heap_reservado_mb(heap_mb):
+    """
+    Heap que a análise reserva na admissão: o das JVMs residentes, que ficam
+    com RESIDENT_CK_HEAP_MB independentemente do repositório, ou o estimado
+    para a JVM própria.
+    """
+    if usa_jvm_residente(heap_mb):
+        return RESIDENT_CK_HEAP_MB
+    return heap_mb or controle_concorrencia.HEAP_BASE_MB
+
+def run_ck(repo_clone_path, ck_output_path, thread_name, timeout=CK_TIMEOUT, heap_mb=None):
+    """
+    Executa o CK em uma JVM residente do pool, se disponível, ou em uma
+    JVM nova por repositório (modo original). Repositórios cujo heap
+    estimado excede o das JVMs residentes usam uma JVM própria com -Xmx
+    dimensionado.
 
-        df_class = pd.read_csv(class_metrics_file)
+    Returns:
+        dict: Uso de recursos do CK ('cpu_s', 'pico_rss_kb'), quando disponível
+    """
+    if usa_jvm_residente(heap_mb):
+        elapsed_ms, class_count, usage = ck_pool.analyze(repo_clone_path, ck_output_path, timeout=timeout)
+        logging.info(f"[{thread_name}] CK residente concluído em {elapsed_ms} ms ({class_count} classes)")
+        return dict(usage, classes=class_count)
+
+    if ck_pool is not None:
+        logging.info(f"[{thread_name}] Heap estimado de {heap_mb} MB excede o das JVMs residentes: usando uma JVM própria")
+    java_options = [f'-Xmx{heap_mb}m'] if heap_mb else []
+    return instrumentacao.run_with_usage(
+        ['java', *java_options, '-jar', CK_JAR_PATH, repo_clone_path, *CK_FLAGS, ck_output_path],
+        timeout=timeout
+    )
+
+def executar_ck_incremental(clone_job, thread_name, timeout=CK_TIMEOUT):
+    """
+    Reanálise incremental (ver ck_incremental.py) a partir da saída bruta do
+    último commit do repositório no cache: o CK residente analisa só os
+    arquivos alterados e dependentes, e o class.csv/method.csv mesclado é
+    gravado no lugar da saída normal do CK.
+
+    Returns:
+        dict: Resumo para o span do CK, ou None se a análise completa deve ser feita
+    """
+    repo_name = clone_job['repo_name']
+    heap_mb = clone_job.get('heap_mb')
+    # A lista de arquivos só é aceita pelo servidor residente
+    if result_cache is None or not clone_job.get('commit_sha') or not usa_jvm_residente(heap_mb):
+        return None
+    previous = result_cache.latest_commit(
+        repo_name, lambda commit_sha: cache_key(repo_name, commit_sha, clone_job.get('clone_mode')))
+    if previous is None or previous[0] == clone_job['commit_sha']:
+        return None
 
-        if df_class.empty:
-            logging.warning(f"[{thread_name}] Arquivo 'class.csv' está vazio para {repo_name}. Pulando.")
+    previous_sha, previous_key = previous
+    repo_safe_name = clone_job['repo_safe_name']
+    repo_clone_path = clone_job['repo_clone_path']
+    marker = f"/{repo_safe_name}/"
+    partial_prefix = os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}parcial_")
+    previous_raw = {name: result_cache.raw_path(previous_key, name) for name in ('class.csv', 'method.csv')}
+    try:
+        if not all(previous_raw.values()):
+            return None
+        ck_incremental.buscar_commit(repo_clone_path, previous_sha,
+                                     timeout=retry_params.get(repo_name, {}).get('clone_timeout', CLONE_TIMEOUT))
+        plan = ck_incremental.planejar(
+            repo_clone_path, previous_sha,
+            ck_incremental.classes_por_arquivo(previous_raw['class.csv'], marker), clone_job.get('java_files'))
+        if plan['completa']:
+            logging.info(f"[{thread_name}] {repo_name}: {len(plan['arquivos'])} de {clone_job.get('java_files')} "
+                         f"arquivos a reanalisar desde {previous_sha[:10]}; usando análise completa")
             return None
-            
-        metrics = {
-            'repo_name': repo_name,
-            'cbo_mean': df_class['cbo'].mean(),
-            'dit_mean': df_class['dit'].mean(),
-            'lcom_mean': df_class['lcom'].mean(),
-            'cbo_total': df_class['cbo'].sum(),
-            'dit_total': df_class['dit'].sum(),
-            'lcom_total': df_class['lcom'].sum(),
-            'thread_name': thread_name
-        }
-        
-        logging.info(f"[{thread_name}] Métricas calculadas para {repo_name}: "
-                    f"CBO_mean={metrics['cbo_mean']:.2f}, DIT_mean={metrics['dit_mean']:.2f}, "
-                    f"LCOM_mean={metrics['lcom_mean']:.2f}")
-        
-        # Atualizar contador de progresso
-        current_progress = progress_counter.increment()
-        logging.info(f"[{thread_name}] Progresso: {current_progress}/{total_repos} repositórios processados")
-        
-        return metrics
-
-    except subprocess.TimeoutExpired as e:
-        logging.error(f"[{thread_name}] Timeout ao processar {repo_name}: {str(e)}")
+
+        summary = {'incremental': True, 'commit_anterior': previous_sha, 'alterados': plan['alterados'],
+                   'removidos': plan['removidos'], 'dependentes': plan['dependentes'],
+                   'referenciados': plan['referenciados'], 'analisados': len(plan['arquivos'])}
+        if plan['arquivos']:
+            files = [os.path.join(repo_clone_path, path) for path in plan['arquivos']]
+            elapsed_ms, class_count, usage = ck_pool.analyze(repo_clone_path, partial_prefix, timeout=timeout,
+                                                             files=files)
+            summary.update(usage, classes=class_count)
+        for name, previous_file in previous_raw.items():
+            rows = ck_incremental.mesclar_saida(
+                previous_file, f"{partial_prefix}{name}", os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}{name}"),
+                plan['substituidos'], repo_clone_path, marker)
+            summary[f"linhas_{name.split('.')[0]}"] = rows
+        logging.info(f"[{thread_name}] CK incremental de {repo_name} desde {previous_sha[:10]}: "
+                     f"{plan['alterados']} alterados, {plan['removidos']} removidos, {plan['dependentes']} dependentes, "
+                     f"{plan['referenciados']} referenciados; "
+                     f"{len(plan['arquivos'])} de {clone_job.get('java_files')} arquivos reanalisados")
+        return summary
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError) as e:
+        logging.warning(f"[{thread_name}] Análise incremental de {repo_name} indisponível "
+                        f"({getattr(e, 'stderr', None) or e}); usando análise completa")
         return None
-    except subprocess.CalledProcessError as e:
-        logging.error(f"[{thread_name}] Erro de processo ao processar {repo_name}: {e.stderr}")
+    finally:
+        for name in ('class.csv', 'method.csv', 'arquivos.txt'):
+            if os.path.exists(f"{partial_prefix}{name}"):
+                os.remove(f"{partial_prefix}{name}")
+
+def executar_ck(clone_job):
+    """
+    Estágio de CK (limitado por CPU/heap): executa o CK sobre um clone já
+    existente e sumariza o 'class.csv'.
+
+    Returns:
+        dict: Métricas calculadas ou None se não houver resultado
+    """
+    _, repo_name, total_repos = clone_job['repo_info']
+    thread_name = threading.current_thread().name
+    repo_safe_name = clone_job['repo_safe_name']
+
+    if clone_job.get('java_files') == 0:
+        logging.warning(f"[{thread_name}] Nenhum arquivo .java em {repo_name}. Pulando o CK.")
+        progress_manifest.mark_finished(repo_name, 'sem_resultado', error='nenhum arquivo .java', falha='sem_java')
         return None
+
+    # Execução do CK
+    logging.info(f"[{thread_name}] Executando CK em {repo_name}...")
+    ck_timeout = retry_params.get(repo_name, {}).get('ck_timeout', CK_TIMEOUT)
+    with instrumentation.span(repo_name, 'ck') as span:
+        span.update(heap_mb=clone_job.get('heap_mb'), espera_admissao_s=clone_job.get('admission_wait'))
+        incremental = executar_ck_incremental(clone_job, thread_name, ck_timeout) if INCREMENTAL_CK else None
+        if incremental is not None:
+            span.update(incremental)
+        else:
+            span.update(run_ck(clone_job['repo_clone_path'], clone_job['ck_output_path'], thread_name,
+                               timeout=ck_timeout, heap_mb=clone_job.get('heap_mb')) or {})
+
+    # Processamento dos resultados
+    class_metrics_file = os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}class.csv")
+    logging.info(f"[{thread_name}] Verificando arquivo de métricas: {class_metrics_file}")
+
+    if not os.path.exists(class_metrics_file):
+        logging.warning(f"[{thread_name}] Arquivo 'class.csv' não encontrado para {repo_name}. Pode não ser um projeto Java válido.")
+        progress_manifest.mark_finished(repo_name, 'sem_resultado', error='class.csv não encontrado',
+                                        falha='sem_class_csv')
+        return None
+
+    # Agregação em streaming: memória constante independente do tamanho do repositório
+    method_metrics_file = os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}method.csv")
+    with instrumentation.span(repo_name, 'parse') as span:
+        class_stats = agregacao_ck.aggregate_csv(class_metrics_file, agregacao_ck.CLASS_METRIC_COLUMNS)
+        if class_stats and class_stats['cbo']['count'] > 0:
+            method_stats = agregacao_ck.aggregate_csv(method_metrics_file, agregacao_ck.METHOD_METRIC_COLUMNS)
+            span['classes'] = class_stats['cbo']['count']
+            span['metodos'] = method_stats['cbo']['count'] if method_stats else 0
+
+    if not class_stats or class_stats['cbo']['count'] == 0:
+        logging.warning(f"[{thread_name}] Arquivo 'class.csv' está vazio para {repo_name}. Pulando.")
+        progress_manifest.mark_finished(repo_name, 'sem_resultado', error='class.csv vazio', falha='class_csv_vazio')
+        return None
+
+    metrics = {
+        'repo_name': repo_name,
+        'cbo_mean': class_stats['cbo']['mean'],
+        'dit_mean': class_stats['dit']['mean'],
+        'lcom_mean': class_stats['lcom']['mean'],
+        'cbo_total': class_stats['cbo']['sum'],
+        'dit_total': class_stats['dit']['sum'],
+        'lcom_total': class_stats['lcom']['sum'],
+        'detailed': {
+            **agregacao_ck.flatten('class', class_stats, agregacao_ck.CLASS_METRIC_COLUMNS),
+            **agregacao_ck.flatten('method', method_stats, agregacao_ck.METHOD_METRIC_COLUMNS)
+        },
+        'thread_name': thread_name
+    }
+
+    if result_cache is not None and clone_job.get('commit_sha'):
+        armazenar_no_cache(clone_job, metrics)
+
+    if ARCHIVE_RAW_OUTPUT and arquivo_ck.is_available():
+        with instrumentation.span(repo_name, 'archive'):
+            arquivar_saida_bruta(repo_name, class_metrics_file, method_metrics_file, thread_name)
+
+    logging.info(f"[{thread_name}] Métricas calculadas para {repo_name}: "
+                f"CBO_mean={metrics['cbo_mean']:.2f}, DIT_mean={metrics['dit_mean']:.2f}, "
+                f"LCOM_mean={metrics['lcom_mean']:.2f}")
+
+    # Atualizar contador de progresso
+    current_progress = progress_counter.increment()
+    logging.info(f"[{thread_name}] Progresso: {current_progress}/{total_repos} repositórios processados")
+
+    return metrics
+
+def arquivar_saida_bruta(repo_name, class_metrics_file, method_metrics_file, thread_name):
+    """Acrescenta class.csv e method.csv ao arquivo colunar antes do cleanup (falhas não interrompem a análise)."""
+    if not arquivo_ck.is_available():
+        return
+    try:
+        archived = arquivo_ck.archive_repository(
+            repo_name, {'class': class_metrics_file, 'method': method_metrics_file}, ARCHIVE_DIR)
+        logging.info(f"[{thread_name}] Saída bruta de {repo_name} arquivada: {archived}")
     except Exception as e:
+        logging.error(f"[{thread_name}] Erro ao arquivar a saída bruta de {repo_name}: {str(e)}")
+
+def registrar_falha(repo_name, thread_name, e):
+    """Registra no log e no manifesto a falha de qualquer estágio, com a categoria (ver falhas.py)."""
+    categoria = falhas.classificar_falha(e)
+    if isinstance(e, subprocess.TimeoutExpired):
+        logging.error(f"[{thread_name}] Timeout ao processar {repo_name} ({categoria}): {str(e)}")
+        progress_manifest.mark_finished(repo_name, 'erro', error=f"timeout: {e}", falha=categoria)
+    elif isinstance(e, subprocess.CalledProcessError):
+        logging.error(f"[{thread_name}] Erro de processo ao processar {repo_name} ({categoria}): {e.stderr}")
+        progress_manifest.mark_finished(repo_name, 'erro', error=f"processo: {e.stderr}", falha=categoria)
+    else:
         logging.error(f"[{thread_name}] Erro inesperado ao processar {repo_name}: {str(e)}")
+        progress_manifest.mark_finished(repo_name, 'erro', error=str(e), falha=categoria)
+
+def preparar_nova_tentativa(repo_name, tentativa, categoria=None):
+    """
+    Define os limites escalonados da nova tentativa conforme a categoria da
+    última falha (a do manifesto local, se não for informada: no modo
+    distribuído ela vem da fila, pois a falha pode ter sido em outro worker).
+    """
+    entry = progress_manifest.entry(repo_name)
+    categoria = categoria or entry.get('falha')
+    # Heap da primeira tentativa (o das JVMs residentes, se o repositório coube nelas): como os
+    # timeouts, o heap de cada nova tentativa é calculado a partir dele, não do já escalonado
+    heap_mb = entry.get('heap_base_mb') or controle_concorrencia.HEAP_BASE_MB
+    if usa_jvm_residente(heap_mb):
+        heap_mb = RESIDENT_CK_HEAP_MB
+    params = falhas.parametros_tentativa(categoria, tentativa, CLONE_TIMEOUT, CK_TIMEOUT, heap_mb,
+                                        controle_concorrencia.HEAP_MAX_MB)
+    if categoria != 'ck_oom':
+        params['heap_mb'] = None
+    retry_params[repo_name] = params
+    logging.info(f"Nova tentativa {tentativa} de {repo_name} ({categoria}): clone {params['clone_timeout']}s, "
+                 f"CK {params['ck_timeout']}s, heap {params['heap_mb'] or 'estimado'}")
+
+def gravar_repositorios_com_falha(repo_names):
+    """Lista em FAILED_REPOS_FILE os repositórios da execução sem resultado, com a categoria da falha."""
+    failed = []
+    for repo_name in repo_names:
+        entry = progress_manifest.entry(repo_name)
+        if entry.get('status') == 'concluido':
+            continue
+        failed.append({'name': repo_name, 'falha': entry.get('falha'), 'erro': entry.get('error'),
+                       'tentativas': entry.get('attempts'),
+                       'definitiva': not falhas.pode_tentar_novamente(entry.get('falha'))})
+    falhas.gravar_falhas(FAILED_REPOS_FILE, failed)
+    if failed:
+        logging.warning(f"{len(failed)} repositórios continuam sem resultado; lista em '{FAILED_REPOS_FILE}'")
+    return failed
+
+def analisar_repositorio(repo_info):
+    """
+    Função thread-safe para analisar um repositório usando CK
+    (clonagem e CK em sequência, na mesma thread).
+    
+    Args:
+        repo_info: Tupla contendo (index, repo_name, total_repos)
+    
+    Returns:
+        dict: Métricas calculadas ou None em caso de erro
+    """
+    repo_name = repo_info[1]
+    thread_name = threading.current_thread().name
+    repo_clone_path = os.path.join(CLONE_DIR_BASE, repo_name.replace('/', '_'))
+
+    try:
+        cached = consultar_cache(repo_info)
+        if cached is not None:
+            return cached
+        return executar_ck(clonar_repositorio(repo_info))
+    except Exception as e:
+        registrar_falha(repo_name, thread_name, e)
         return None
     finally:
         # Cleanup thread-safe
         cleanup_repository_files(repo_name, repo_clone_path, thread_name)
 
-def cleanup_repository_files(repo_name, repo_clone_path, thread_name):
+def estagio_clone(repo_info, clone_queue, results_queue, disk_slots):
     """
-    Função thread-safe para limpeza de arquivos temporários.
+    Tarefa do pool de clonagem: aguarda uma vaga em disco, clona e enfileira
+    o clone para o estágio de CK. Em caso de falha, o resultado vai direto
+    para a fila de resultados.
     """
-    with cleanup_lock:
+    repo_name = repo_info[1]
+    thread_name = threading.current_thread().name
+
+    # Resultado já conhecido para o HEAD atual: não precisa clonar
+    try:
+        cached = consultar_cache(repo_info)
+    except Exception as e:
+        logging.error(f"[{thread_name}] Erro ao consultar o cache para {repo_name}: {str(e)}")
+        cached = None
+    if cached is not None:
+        results_queue.put((repo_info, cached))
+        return
+
+    # Backpressure: pausa enquanto houver muitas remoções pendentes e
+    # limita o número de clones presentes em disco
+    repository_deleter.wait_for_capacity()
+    if concurrency_controller is not None:
+        concurrency_controller.wait_for_disk()
+    disk_slots.acquire()
+    try:
+        clone_job = clonar_repositorio(repo_info)
+    except Exception as e:
+        registrar_falha(repo_name, thread_name, e)
+        cleanup_repository_files(repo_name, os.path.join(CLONE_DIR_BASE, repo_name.replace('/', '_')), thread_name)
+        disk_slots.release()
+        results_queue.put((repo_info, None))
+        return
+
+    # Bloqueia enquanto a fila entre os estágios estiver cheia
+    clone_queue.put(clone_job)
+
+def estagio_ck(clone_queue, results_queue, disk_slots):
+    """
+    Laço de uma thread do pool de CK: consome clones da fila até receber None.
+    Com o controlador adaptativo, cada análise aguarda admissão (limite de
+    concorrência e memória para o heap estimado) antes de iniciar a JVM.
+    """
+    thread_name = threading.current_thread().name
+    while True:
+        clone_job = clone_queue.get()
+        if clone_job is None:
+            break
+
+        repo_name = clone_job['repo_name']
+        metrics = None
+        heap_mb = clone_job['heap_mb'] = ck_heap_mb(clone_job)
+        if heap_mb:
+            # heap_base_mb: ponto de partida das novas tentativas após falta de memória
+            progress_manifest.update(repo_name, heap_mb=heap_mb, heap_base_mb=heap_estimado_mb(clone_job))
+        reserved_mb = heap_reservado_mb(heap_mb)
         try:
-            # Pequeno delay para evitar conflitos de I/O
-            time.sleep(1)
-            
-            # Remove o repositório clonado
-            if os.path.exists(repo_clone_path):
-                shutil.rmtree(repo_clone_path, onexc=remove_readonly)
-                logging.info(f"[{thread_name}] Repositório clonado removido: {repo_clone_path}")
-            
-            # Remove os arquivos CSV criados no diretório de saída do CK
-            repo_safe_name = repo_name.replace('/', '_')
-            csv_files = [
-                os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}class.csv"),
-                os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}method.csv")
-            ]
-            
-            for csv_file in csv_files:
-                if os.path.exists(csv_file):
-                    os.remove(csv_file)
-                    logging.debug(f"[{thread_name}] Arquivo CSV removido: {csv_file}")
-            
-            # Remove o diretório específico do repositório se estiver vazio
-            ck_output_path = os.path.join(CK_OUTPUT_DIR_BASE, repo_safe_name)
-            if os.path.exists(ck_output_path) and not os.listdir(ck_output_path):
-                os.rmdir(ck_output_path)
-                logging.debug(f"[{thread_name}] Diretório vazio removido: {ck_output_path}")
-                
+            if concurrency_controller is not None:
+                clone_job['admission_wait'] = concurrency_controller.acquire(repo_name, reserved_mb)
+            try:
+                ck_start = time.perf_counter()
+                metrics = executar_ck(clone_job)
+                registrar_custo(clone_job, time.perf_counter() - ck_start)
+            finally:
+                if concurrency_controller is not None:
+                    concurrency_controller.release(reserved_mb)
         except Exception as e:
-            logging.error(f"[{thread_name}] Erro durante cleanup de {repo_name}: {str(e)}")
+            registrar_falha(repo_name, thread_name, e)
+        finally:
+            cleanup_repository_files(repo_name, clone_job['repo_clone_path'], thread_name)
+            disk_slots.release()
+            results_queue.put((clone_job['repo_info'], metrics))
+
+def registrar_custo(clone_job, ck_seconds):
+    """Grava no histórico o custo do repositório (clonagem + CK), usado para ordenar as próximas execuções."""
+    if cost_history is None:
+        return
+    repo_name = clone_job['repo_name']
+    try:
+        cost_history.record(
+            repo_name, clone_job.get('clone_s', 0.0) + ck_seconds,
+            java_files=clone_job.get('java_files'), disk_size=clone_job.get('disk_size'),
+            **repo_sizes.get(repo_name, {})
+        )
+    except Exception as e:
+        logging.error(f"Erro ao gravar o custo de {repo_name} no histórico: {str(e)}")
+
+def cleanup_repository_files(repo_name, repo_clone_path, thread_name):
+    """
+    Limpeza de arquivos temporários sem lock global: o clone é renomeado para
+    a lixeira (operação atômica e rápida) e removido em segundo plano pelo
+    repository_deleter. Cada repositório usa apenas os próprios caminhos.
+    """
+    try:
+        with instrumentation.span(repo_name, 'cleanup'):
+            _remover_arquivos_repositorio(repo_name, repo_clone_path, thread_name)
+    except Exception as e:
+        logging.error(f"[{thread_name}] Erro durante cleanup de {repo_name}: {str(e)}")
+
+def _remover_arquivos_repositorio(repo_name, repo_clone_path, thread_name):
+    # Move o repositório clonado para a lixeira
+    if os.path.exists(repo_clone_path):
+        repository_deleter.schedule(repo_clone_path, thread_name)
+    
+    # Remove os arquivos CSV criados no diretório de saída do CK
+    repo_safe_name = repo_name.replace('/', '_')
+    csv_files = [
+        os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}class.csv"),
+        os.path.join(CK_OUTPUT_DIR_BASE, f"{repo_safe_name}method.csv")
+    ]
+    
+    for csv_file in csv_files:
+        if os.path.exists(csv_file):
+            os.remove(csv_file)
+            logging.debug(f"[{thread_name}] Arquivo CSV removido: {csv_file}")
+    
+    # Remove o diretório específico do repositório se estiver vazio
+    ck_output_path = os.path.join(CK_OUTPUT_DIR_BASE, repo_safe_name)
+    if os.path.exists(ck_output_path) and not os.listdir(ck_output_path):
+        os.rmdir(ck_output_path)
+        logging.debug(f"[{thread_name}] Diretório vazio removido: {ck_output_path}")
+
+def formatar_linha_csv(metrics_result):
+    """Linha de OUTPUT_CSV_FILE (sem quebra de linha) para as métricas de um repositório."""
+    return (f"{metrics_result['repo_name']},{metrics_result['cbo_mean']:.6f},"
+            f"{metrics_result['dit_mean']:.6f},{metrics_result['lcom_mean']:.6f},"
+            f"{metrics_result['cbo_total']:.0f},{metrics_result['dit_total']:.0f},"
+            f"{metrics_result['lcom_total']:.0f}")
 
 def write_metrics_to_file(metrics_result):
     """
     Função thread-safe para escrever métricas no arquivo CSV.
+
+    Returns:
+        int: Offset (em bytes) do fim da linha escrita, ou None se nada foi escrito
     """
     if metrics_result:
         with file_write_lock:
             try:
                 with open(OUTPUT_CSV_FILE, 'a', newline='', encoding='utf-8') as f:
-                    f.write(f"{metrics_result['repo_name']},{metrics_result['cbo_mean']:.6f},"
-                           f"{metrics_result['dit_mean']:.6f},{metrics_result['lcom_mean']:.6f},"
-                           f"{metrics_result['cbo_total']:.0f},{metrics_result['dit_total']:.0f},"
-                           f"{metrics_result['lcom_total']:.0f}\n")
+                    f.write(formatar_linha_csv(metrics_result) + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                    offset = f.tell()
                 logging.info(f"Métricas salvas para {metrics_result['repo_name']} por {metrics_result['thread_name']}")
+                return offset
             except Exception as e:
                 logging.error(f"Erro ao escrever métricas para {metrics_result['repo_name']}: {str(e)}")
+    return None
+
+def write_detailed_stats_to_file(metrics_result):
+    """
+    Escreve as estatísticas detalhadas (soma, média, desvio, mín., máx.,
+    mediana e p90 de class.csv e method.csv) em OUTPUT_STATS_CSV_FILE.
+
+    Returns:
+        int: Offset (em bytes) do fim da linha escrita, ou None se nada foi escrito
+    """
+    if not metrics_result or 'detailed' not in metrics_result:
+        return None
+    with file_write_lock:
+        try:
+            columns = agregacao_ck.detailed_columns()
+            write_header = not os.path.exists(OUTPUT_STATS_CSV_FILE) or os.path.getsize(OUTPUT_STATS_CSV_FILE) == 0
+            with open(OUTPUT_STATS_CSV_FILE, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                if write_header:
+                    writer.writeheader()
+                writer.writerow({'repo_name': metrics_result['repo_name'], **metrics_result['detailed']})
+                f.flush()
+                os.fsync(f.fileno())
+                return f.tell()
+        except Exception as e:
+            logging.error(f"Erro ao escrever estatísticas detalhadas de {metrics_result['repo_name']}: {str(e)}")
+    return None
+
+def prepare_output_file():
+    """
+    Prepara o arquivo de saída para uma execução retomável.
+
+    Se já houver um manifesto, o CSV é truncado no último offset confirmado
+    (descartando linhas escritas após a última atualização do manifesto) e
+    novas linhas são acrescentadas. Se houver apenas o CSV, o manifesto é
+    reconstruído a partir dele. Caso contrário, o CSV é criado com cabeçalho.
+    """
+    csv_size = os.path.getsize(OUTPUT_CSV_FILE) if os.path.exists(OUTPUT_CSV_FILE) else 0
+
+    if progress_manifest.exists:
+        progress_manifest.load()
+        offset = progress_manifest.output_offset
+        if 0 < offset <= csv_size:
+            with open(OUTPUT_CSV_FILE, 'r+b') as f:
+                f.truncate(offset)
+            logging.info(f"Retomando execução a partir do manifesto '{MANIFEST_FILE}' "
+                         f"(offset {offset} em '{OUTPUT_CSV_FILE}')")
+            prepare_stats_file()
+            return
+        # CSV apagado, vazio ou mais curto que o confirmado: os concluídos sem linha voltam à fila
+        if csv_size == 0:
+            _write_csv_header()
+        reset = progress_manifest.reconcile_with_csv(OUTPUT_CSV_FILE)
+        with open(OUTPUT_CSV_FILE, 'r+b') as f:
+            f.truncate(progress_manifest.output_offset)
+        if reset:
+            logging.warning(f"'{OUTPUT_CSV_FILE}' não corresponde ao manifesto: {len(reset)} repositórios "
+                            f"concluídos sem linha no arquivo serão analisados novamente")
+        prepare_stats_file(reconcile=True)
+        return
+    elif csv_size > 0:
+        progress_manifest.bootstrap_from_csv(OUTPUT_CSV_FILE)
+        with open(OUTPUT_CSV_FILE, 'r+b') as f:
+            f.truncate(progress_manifest.output_offset)
+        logging.info(f"Manifesto reconstruído a partir de '{OUTPUT_CSV_FILE}'")
+        prepare_stats_file(reconcile=True)
+        return
+
+    progress_manifest.reset_output(OUTPUT_CSV_FILE, _write_csv_header())
+    if os.path.exists(OUTPUT_STATS_CSV_FILE):
+        os.remove(OUTPUT_STATS_CSV_FILE)
+    progress_manifest.reset_stats_offset(0)
+
+def _write_csv_header():
+    with open(OUTPUT_CSV_FILE, 'w', newline='', encoding='utf-8') as f:
+        f.write(CSV_HEADER)
+        return f.tell()
+
+def prepare_stats_file(reconcile=False):
+    """
+    Alinha OUTPUT_STATS_CSV_FILE ao manifesto ao retomar: truncado no offset
+    confirmado ou, sem offset confiável (manifesto antigo ou reconstruído),
+    reescrito só com a última linha de cada repositório concluído.
+    """
+    if not os.path.exists(OUTPUT_STATS_CSV_FILE):
+        progress_manifest.reset_stats_offset(0)
+        return
+    stats_offset = progress_manifest.stats_offset
+    size = os.path.getsize(OUTPUT_STATS_CSV_FILE)
+    if not reconcile and stats_offset is not None and stats_offset <= size:
+        with open(OUTPUT_STATS_CSV_FILE, 'r+b') as f:
+            f.truncate(stats_offset)
+        return
+
+    completed = progress_manifest.completed()
+    with open(OUTPUT_STATS_CSV_FILE, 'r', newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, None)
+        rows = {row[0]: row for row in reader if row and row[0] in completed and len(row) == len(header)}
+    tmp_path = f"{OUTPUT_STATS_CSV_FILE}.tmp"
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if header:
+            writer.writerow(header)
+            writer.writerows(rows.values())
+        offset = f.tell()
+    os.replace(tmp_path, OUTPUT_STATS_CSV_FILE)
+    progress_manifest.reset_stats_offset(offset)
+    logging.info(f"'{OUTPUT_STATS_CSV_FILE}' alinhado ao manifesto: {len(rows)} repositórios")
 
 def remove_readonly(func, path, excinfo):
     """Função auxiliar para remover arquivos readonly no Windows."""
     os.chmod(path, stat.S_IWRITE)
     func(path)
 
-def process_repositories_multithread(repos_df, max_workers=4):
+def tamanhos_repositorios(repos_df):
+    """Tamanhos do GitHub (catálogo) por repositório, quando a entrada os tiver."""
+    size_columns = [column for column in SIZE_FIELDS if column in repos_df.columns]
+    sizes_by_repo = {}
+    for row in repos_df[['name', *size_columns]].itertuples(index=False):
+        sizes = {column: int(value) for column, value in zip(size_columns, row[1:]) if pd.notna(value)}
+        if sizes:
+            sizes_by_repo[row[0]] = sizes
+    return sizes_by_repo
+
+def iniciar_pool_ck(max_workers):
+    """Inicia o pool de JVMs residentes do CK (se USE_RESIDENT_CK e ainda não iniciado)."""
+    global ck_pool
+    if not USE_RESIDENT_CK or ck_pool is not None:
+        return
+    if ck_residente.is_available(CK_JAR_PATH):
+        java_options = [f'-Xmx{RESIDENT_CK_HEAP_MB}m'] if SIZE_CK_HEAP else []
+        ck_pool = ck_residente.ResidentCKPool(CK_JAR_PATH, max_workers, java_options)
+        logging.info(f"Modo CK residente ativado com até {max_workers} JVMs")
+    else:
+        logging.warning("Modo CK residente indisponível (java/javac ou jar ausente). Usando uma JVM por repositório.")
+
+def encerrar_pool_ck():
+    global ck_pool
+    if ck_pool is not None:
+        ck_pool.close()
+        ck_pool = None
+
+def iniciar_controle_concorrencia(max_workers, disk_path=None):
+    """Inicia o controlador adaptativo da concorrência do CK (se ADAPTIVE_CONCURRENCY)."""
+    global concurrency_controller
+    if not ADAPTIVE_CONCURRENCY or concurrency_controller is not None:
+        return
+    concurrency_controller = controle_concorrencia.AdaptiveController(
+        1, max_workers, INITIAL_CK_WORKERS, disk_path=disk_path or CLONE_DIR_BASE,
+        on_change=lambda **fields: instrumentation.emit('concorrencia', **fields)
+    )
+    concurrency_controller.start()
+    logging.info(f"Concorrência adaptativa do CK: inicial {concurrency_controller.limit}, máximo {max_workers}")
+
+def encerrar_controle_concorrencia():
+    global concurrency_controller
+    if concurrency_controller is not None:
+        concurrency_controller.stop()
+        concurrency_controller = None
+
+def teto_ck(max_workers):
+    """
+    Máximo de análises simultâneas do CK: max_workers limitado pelo orçamento
+    de memória do controlador adaptativo, contando o heap que cada análise
+    reserva na admissão (o das JVMs residentes, se o pool for usado). Define
+    o tamanho do pool residente e o número de clones em disco.
+    """
+    _, available_mb = controle_concorrencia.read_meminfo()
+    if available_mb is None:
+        return max_workers
+    heap_mb = RESIDENT_CK_HEAP_MB if USE_RESIDENT_CK else controle_concorrencia.HEAP_MIN_MB
+    budget_mb = available_mb - controle_concorrencia.MEMORY_RESERVE_MB
+    return max(1, min(max_workers, int(budget_mb // heap_mb)))
+
+def dimensionar_workers():
+    """
+    Número de workers de CK (teto do controlador adaptativo, ou limite fixo)
+    e de clonagem para esta máquina.
+
+    Returns:
+        tuple: (max_workers, clone_workers)
+    """
+    import multiprocessing
+    if ADAPTIVE_CONCURRENCY:
+        # O controlador começa em INITIAL_CK_WORKERS e ajusta até o teto conforme CPU, memória e disco
+        max_workers = MAX_CK_WORKERS or multiprocessing.cpu_count()
+    else:
+        max_workers = min(multiprocessing.cpu_count(), INITIAL_CK_WORKERS)  # Evita sobrecarga com JVMs demais
+    clone_workers = CLONE_WORKERS or 2 * min(max_workers, INITIAL_CK_WORKERS)  # Clonagem é limitada por rede, não por CPU
+    return max_workers, clone_workers
+
+def process_repositories_multithread(repos_df, max_workers=4, clone_workers=None, max_pending_clones=None,
+                                     work_queue=None):
     """
-    Processa repositórios usando múltiplas threads.
+    Processa repositórios em um pipeline de dois estágios: um pool de clonagem
+    (rede/disco) e um pool de CK (CPU/heap), ligados por uma fila limitada.
     
     Args:
         repos_df: DataFrame com os repositórios
-        max_workers: Número máximo de threads trabalhadoras
+        max_workers: Número de threads do estágio de CK (teto do controlador adaptativo,
+            limitado pela memória com ADAPTIVE_CONCURRENCY; ver teto_ck)
+        clone_workers: Número de threads do estágio de clonagem (padrão: 2 * max_workers)
+        max_pending_clones: Número máximo de clones aguardando o CK (padrão: max_workers)
+        work_queue: fila_distribuida.WorkQueue; se informada, os repositórios são
+            reivindicados da fila sob demanda (repos_df é ignorado) e os
+            resultados também são gravados nela. As novas tentativas e a
+            lista de falhas ficam a cargo da fila (sem rodadas locais)
     """
-    total_repos = min(len(repos_df), 1000)  # Limita a 1000 como no código original
-    
-    # Preparar dados para processamento
-    repo_tasks = []
-    for index, row in repos_df.iterrows():
-        if index < 1000:  # Mantém o limite original
-            repo_name = row['name']
-            repo_tasks.append((index, repo_name, total_repos))
-    
-    logging.info(f"Iniciando análise multithread de {len(repo_tasks)} repositórios com {max_workers} workers...")
-    
-    # Inicializar arquivo de saída
-    with open(OUTPUT_CSV_FILE, 'w', newline='', encoding='utf-8') as f:
-        f.write('repo_name,cbo_mean,dit_mean,lcom_mean,cbo_total,dit_total,lcom_total\n')
+    if ADAPTIVE_CONCURRENCY:
+        # Pool residente e clones em disco acompanham o que o controlador consegue admitir, não o número de CPUs
+        ceiling = teto_ck(max_workers)
+        if ceiling < max_workers:
+            logging.info(f"Teto do CK reduzido de {max_workers} para {ceiling} pela memória disponível")
+        max_workers = ceiling
+    clone_workers = clone_workers or 2 * max_workers
+    max_pending_clones = max_pending_clones or max_workers
     
-    # Executar processamento multithread
-    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="CK-Worker") as executor:
-        # Submeter todas as tarefas
-        future_to_repo = {executor.submit(analisar_repositorio, repo_info): repo_info 
-                         for repo_info in repo_tasks}
-        
-        # Processar resultados conforme completam
-        for future in as_completed(future_to_repo):
-            repo_info = future_to_repo[future]
+    # Inicializar (ou retomar) arquivo de saída e manifesto
+    prepare_output_file()
+
+    if work_queue is not None:
+        # Modo distribuído: a ordem e a deduplicação são responsabilidade da fila
+        total_repos = work_queue.remaining()
+
+        def tarefas_da_fila():
+            for position, repo_name, attempts, categoria in work_queue.claims():
+                if attempts > 1 and categoria:
+                    # Nova tentativa pela fila: limites escalonados pelo número de reivindicações
+                    preparar_nova_tentativa(repo_name, attempts - 1, categoria)
+                yield position, repo_name, total_repos
+
+        repo_tasks = tarefas_da_fila()
+        logging.info(f"Modo distribuído: {total_repos} repositórios restantes na fila")
+    else:
+        total_repos = min(len(repos_df), 1000)  # Limita a 1000 como no código original
+
+        # Preparar dados para processamento
+        repo_tasks = []
+        skipped = 0
+        for index, row in repos_df.iterrows():
+            if index < 1000:  # Mantém o limite original
+                repo_name = row['name']
+                if progress_manifest.is_finished(repo_name):
+                    skipped += 1
+                    continue
+                repo_tasks.append((index, repo_name, total_repos))
+
+        if skipped:
+            logging.info(f"{skipped} repositórios já finalizados em execuções anteriores serão ignorados.")
+
+        repo_sizes.clear()
+        repo_sizes.update(tamanhos_repositorios(repos_df))
+
+        # Escalonamento: os repositórios mais caros primeiro, para não ficarem no fim do lote
+        repo_tasks, costs = escalonamento.ordenar_tarefas(repo_tasks, repo_sizes, cost_history, SCHEDULING_POLICY)
+        if costs:
+            logging.info(f"Tarefas ordenadas por custo estimado ({len(cost_history)} repositórios no histórico, "
+                         f"{len(repo_sizes)} com tamanho do GitHub); maiores: "
+                         + ", ".join(f"{task[1]} ({costs[task[1]]:.1f}s)" for task in repo_tasks[:3]))
+        total_repos = len(repo_tasks)
+    logging.info(f"Iniciando análise de {total_repos} repositórios com {clone_workers} workers de clonagem "
+                 f"e {max_workers} workers de CK (até {max_pending_clones} clones em espera)...")
+
+    iniciar_pool_ck(max_workers)
+
+    if ARCHIVE_RAW_OUTPUT and not arquivo_ck.is_available():
+        logging.warning("pyarrow não instalado: saídas brutas do CK não serão arquivadas.")
+
+    iniciar_controle_concorrencia(max_workers)
+
+    repository_deleter.start()
+    instrumentation.start_run(total_repos)
+    clone_queue = queue.Queue(maxsize=max_pending_clones)
+    results_queue = queue.Queue()
+    # Clones em disco: os que aguardam na fila mais os que estão no CK
+    disk_slots = threading.BoundedSemaphore(max_pending_clones + max_workers)
+
+    ck_threads = [
+        threading.Thread(target=estagio_ck, args=(clone_queue, results_queue, disk_slots),
+                         name=f"CK-Worker_{i}", daemon=True)
+        for i in range(max_workers)
+    ]
+    for thread in ck_threads:
+        thread.start()
+
+    processed = []
+
+    def executar_lote(repo_tasks, tentativa):
+        """
+        Passa as tarefas pelos dois estágios. Retorna as que falharam por
+        motivo transitório, para a próxima rodada de novas tentativas.
+        """
+        retry_tasks = []
+        # Tarefas em andamento limitadas ao que os estágios conseguem absorver:
+        # no modo distribuído, cada nova tarefa é reivindicada só quando outra termina
+        tasks = iter(repo_tasks)
+        in_flight = 0
+        for repo_info in itertools.islice(tasks, clone_workers + max_pending_clones + max_workers):
+            clone_executor.submit(estagio_clone, repo_info, clone_queue, results_queue, disk_slots)
+            in_flight += 1
+
+        # Processar resultados conforme completam (cada tarefa gera exatamente um resultado)
+        while in_flight:
+            repo_info, metrics_result = results_queue.get()
+            in_flight -= 1
+            repo_name = repo_info[1]
+            if tentativa == 0:
+                processed.append(repo_name)
+            row = None
             try:
-                metrics_result = future.result(timeout=900)  # 15 minutos timeout por tarefa
-                write_metrics_to_file(metrics_result)
+                if metrics_result:
+                    with instrumentation.span(repo_name, 'write'):
+                        offset = write_metrics_to_file(metrics_result)
+                        stats_offset = write_detailed_stats_to_file(metrics_result)
+                    if offset is not None:
+                        progress_manifest.mark_finished(repo_name, 'concluido', output_offset=offset,
+                                                        stats_offset=stats_offset)
+                        row = formatar_linha_csv(metrics_result)
             except Exception as e:
-                repo_name = repo_info[1]
                 logging.error(f"Erro ao processar {repo_name}: {str(e)}")
+                progress_manifest.mark_finished(repo_name, 'erro', error=str(e))
+            entry = progress_manifest.entry(repo_name)
+            status = entry.get('status')
+
+            if status == 'erro' and falhas.pode_tentar_novamente(entry.get('falha')) and tentativa < MAX_RETRIES \
+                    and work_queue is None:
+                # Fica com o repositório (e o lease, no modo distribuído) até a próxima rodada
+                retry_tasks.append(repo_info)
+            else:
+                instrumentation.repo_finished(repo_name, status)
+                if work_queue is not None:
+                    try:
+                        work_queue.complete(repo_name, status, row=row, error=entry.get('error'),
+                                            falha=entry.get('falha'))
+                    except Exception as e:
+                        logging.error(f"Erro ao finalizar {repo_name} na fila distribuída: {str(e)}")
+
+            repo_info = next(tasks, None)
+            if repo_info is not None:
+                clone_executor.submit(estagio_clone, repo_info, clone_queue, results_queue, disk_slots)
+                in_flight += 1
+        return retry_tasks
+
+    with ThreadPoolExecutor(max_workers=clone_workers, thread_name_prefix="Clone-Worker") as clone_executor:
+        retry_tasks = executar_lote(repo_tasks, 0)
+
+        # Novas tentativas depois da passada principal, com espera e limites crescentes
+        for tentativa in range(1, MAX_RETRIES + 1):
+            if not retry_tasks:
+                break
+            backoff = falhas.RETRY_BACKOFF_S * 2 ** (tentativa - 1)
+            logging.info(f"Rodada {tentativa} de novas tentativas: {len(retry_tasks)} repositórios em {backoff}s")
+            time.sleep(backoff)
+            for repo_info in retry_tasks:
+                preparar_nova_tentativa(repo_info[1], tentativa)
+            retry_tasks = executar_lote(retry_tasks, tentativa)
+
+    for repo_name in processed:
+        retry_params.pop(repo_name, None)
+    if work_queue is None:
+        # No modo distribuído, fila_distribuida.trabalhar grava a lista a partir da fila
+        gravar_repositorios_com_falha(processed)
+
+    # Encerrar o estágio de CK
+    for _ in ck_threads:
+        clone_queue.put(None)
+    for thread in ck_threads:
+        thread.join()
+
+    encerrar_pool_ck()
+    encerrar_controle_concorrencia()
+
+    deleted, failed, deletion_time = repository_deleter.drain()
+    logging.info(f"Remoção em segundo plano: {deleted} clones removidos em {deletion_time:.2f}s")
+    if failed:
+        logging.warning(f"Remoção em segundo plano: {failed} clones não puderam ser removidos de '{TRASH_DIR}'")
+    instrumentation.finish_run()
+
+def load_repositories(input_file):
+    """
+    Carrega a lista de repositórios a analisar: do catálogo SQLite (.db,
+    já ordenado por estrelas, sem ler o histórico inteiro) ou de um JSON.
+    """
+    if input_file.endswith('.db'):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(input_file)
+        return RepositoryCatalog(input_file).load_dataframe(['name', *SIZE_FIELDS], limit=1000)
+    return pd.read_json(input_file, encoding='utf-8')
 
 if __name__ == '__main__':
     try:
         # Carregar dados dos repositórios
-        repos_df = pd.read_json(INPUT_JSON_FILE, encoding='utf-8')
+        repos_df = load_repositories(INPUT_JSON_FILE)
     except FileNotFoundError:
         print(f"ERRO: Arquivo de entrada json não encontrado!")
         exit()
@@ -249,14 +1363,15 @@ if __name__ == '__main__':
     
     # Determinar número de workers baseado no número de CPUs
     import multiprocessing
-    max_workers = min(multiprocessing.cpu_count(), 6)  # Máximo de 6 threads para evitar sobrecarga
+    max_workers, clone_workers = dimensionar_workers()
     
-    logging.info(f"Sistema detectou {multiprocessing.cpu_count()} CPUs. Usando {max_workers} workers.")
+    logging.info(f"Sistema detectou {multiprocessing.cpu_count()} CPUs. Usando até {max_workers} workers de CK "
+                 f"e {clone_workers} workers de clonagem.")
     
     start_time = time.time()
     
     # Processar repositórios com multithread
-    process_repositories_multithread(repos_df, max_workers)
+    process_repositories_multithread(repos_df, max_workers, clone_workers, MAX_PENDING_CLONES)
     
     end_time = time.time()
     execution_time = end_time - start_time
@@ -0,0 +1,552 @@
+import os
+import csv
+import json
+import time
+import shutil
+import logging
+import argparse
+import threading
+import subprocess
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import main as pipeline
+import agregacao_ck
+import clonagem
+import controle_concorrencia
+import falhas
+from catalogo import RepositoryCatalog
+
+# Modo histórico (RQ02, maturidade): várias versões de cada repositório em vez
+# de apenas o HEAD. Cada repositório é clonado uma única vez com o histórico
+# completo, mas sem blobs (--filter=blob:none); cada versão escolhida ganha um
+# 'git worktree' leve com sparse-checkout dos fontes Java, de modo que só os
+# blobs .java daquela versão são buscados. As versões de todos os repositórios
+# compartilham o mesmo pool de CK e são analisadas em paralelo.
+#
+# Uso:
+#   python serie_historica.py repo.json --politica anual --max-versoes 8
+#   python serie_historica.py catalogo_repos.db --politica tags --workers 6
+#
+# As versões passam pelos mesmos estágios da análise do HEAD em main.py: cache de
+# resultados (métricas por commit), admissão do controlador adaptativo e novas
+# tentativas com limites crescentes para falhas transitórias.
+#
+# Saída: uma linha por (repositório, versão) em HISTORY_OUTPUT_CSV. Versões já
+# presentes no arquivo são ignoradas ao retomar uma execução interrompida; as
+# versões escolhidas de cada repositório ficam em <saída>.versoes.json, para que
+# repositórios já completos não sejam clonados de novo.
+HISTORY_OUTPUT_CSV = 'serie_historica_metricas.csv'
+HISTORY_CSV_HEADER = ['repo_name', 'versao', 'commit', 'data', 'cbo_mean', 'dit_mean', 'lcom_mean',
+                      'cbo_total', 'dit_total', 'lcom_total', 'classes']
+HISTORY_CLONE_DIR = 'clones_historico'
+SNAPSHOTS_SUFFIX = '.versoes.json'
+SNAPSHOT_POLICY = 'anual'  # 'anual' (último commit de cada ano desde created_at) ou 'tags' (uma versão por tag)
+MAX_SNAPSHOTS = 10  # Versões por repositório; acima disso, amostragem uniforme (a primeira e o HEAD sempre ficam)
+HISTORY_CLONE_TIMEOUT = 1800  # O clone traz o histórico inteiro (sem blobs): mais lento que o --depth 1
+GIT_TIMEOUT = 300
+
+def _git(repo_path, *args, timeout=GIT_TIMEOUT):
+    return subprocess.run(
+        ['git', '-C', repo_path, *args], check=True, capture_output=True, text=True, timeout=timeout
+    ).stdout
+
+def clonar_historico(clone_url, clone_path, timeout=HISTORY_CLONE_TIMEOUT):
+    """
+    Clone com todo o histórico de commits e árvores, mas sem blobs e sem
+    checkout: os arquivos são buscados depois, por worktree.
+
+    Returns:
+        dict: tamanho de .git
+    """
+    subprocess.run(
+        ['git', 'clone', '--filter=blob:none', '--no-checkout', clone_url, clone_path],
+        check=True, capture_output=True, text=True, timeout=timeout
+    )
+    return {'git_dir_size': clonagem.directory_size(os.path.join(clone_path, '.git'))}
+
+def listar_commits(repo_path):
+    """Commits do ramo principal (first-parent), do mais antigo ao HEAD: lista de (sha, data unix)."""
+    commits = []
+    for line in _git(repo_path, 'log', '--first-parent', '--format=%H %ct', 'HEAD').splitlines():
+        sha, timestamp = line.split()
+        commits.append((sha, int(timestamp)))
+    commits.reverse()
+    return commits
+
+def _ano(created_at):
+    if created_at is None or (not isinstance(created_at, str) and pd.isna(created_at)):
+        return None
+    return pd.Timestamp(created_at).year
+
+def versoes_anuais(commits, created_at=None):
+    """
+    Último commit de cada ano, de created_at (ou do primeiro commit) até o
+    HEAD; anos sem commits repetiriam a versão anterior e são omitidos.
+    """
+    first_year = datetime.fromtimestamp(commits[0][1], timezone.utc).year
+    last_year = datetime.fromtimestamp(commits[-1][1], timezone.utc).year
+    start_year = max(_ano(created_at) or first_year, first_year)
+    snapshots = []
+    position = 0
+    for year in range(start_year, last_year + 1):
+        year_end = datetime(year + 1, 1, 1, tzinfo=timezone.utc).timestamp()
+        while position + 1 < len(commits) and commits[position + 1][1] < year_end:
+            position += 1
+        sha, timestamp = commits[position]
+        if timestamp < year_end and (not snapshots or snapshots[-1]['commit'] != sha):
+            snapshots.append({'versao': str(year), 'commit': sha, 'data': timestamp})
+    return snapshots
+
+def versoes_por_tag(repo_path, commits):
+    """Uma versão por tag (commit apontado, em ordem cronológica), mais o HEAD."""
+    output = _git(repo_path, 'for-each-ref', '--sort=creatordate',
+                  '--format=%(refname:short)\t%(objectname)\t%(*objectname)\t%(committerdate:unix)\t%(*committerdate:unix)',
+                  'refs/tags')
+    snapshots = {}
+    for line in output.splitlines():
+        tag, sha, peeled_sha, timestamp, peeled_timestamp = line.split('\t')
+        # Tags anotadas apontam para o objeto da tag; o commit é o alvo desreferenciado
+        sha, timestamp = (peeled_sha, peeled_timestamp) if peeled_sha else (sha, timestamp)
+        if timestamp and sha not in snapshots:
+            snapshots[sha] = {'versao': tag, 'commit': sha, 'data': int(timestamp)}
+    head_sha, head_timestamp = commits[-1]
+    snapshots.setdefault(head_sha, {'versao': 'HEAD', 'commit': head_sha, 'data': head_timestamp})
+    return sorted(snapshots.values(), key=lambda snapshot: snapshot['data'])
+
+def amostrar(snapshots, max_snapshots):
+    """No máximo max_snapshots versões uniformemente espaçadas, mantendo a primeira e a última."""
+    if max_snapshots is None or len(snapshots) <= max_snapshots:
+        return snapshots
+    if max_snapshots == 1:
+        return snapshots[-1:]
+    step = (len(snapshots) - 1) / (max_snapshots - 1)
+    return [snapshots[round(i * step)] for i in range(max_snapshots)]
+
+def selecionar_versoes(repo_path, policy=SNAPSHOT_POLICY, created_at=None, max_snapshots=MAX_SNAPSHOTS):
+    """
+    Versões a analisar de um clone histórico.
+
+    Returns:
+        list: dicionários com 'versao' (ano ou tag), 'commit' e 'data' (unix)
+    """
+    commits = listar_commits(repo_path)
+    if not commits:
+        return []
+    if policy == 'anual':
+        snapshots = versoes_anuais(commits, created_at)
+    elif policy == 'tags':
+        snapshots = versoes_por_tag(repo_path, commits)
+    else:
+        raise ValueError(f"Política de versões desconhecida: {policy}")
+    return amostrar(snapshots, max_snapshots)
+
+class SerieHistoricaCSV:
+    """
+    Escrita thread-safe das linhas da série histórica, com as versões já
+    gravadas (para retomar). Ao lado do CSV, um JSON guarda as versões
+    escolhidas de cada repositório e as que terminaram sem resultado
+    definitivamente (ex.: sem arquivos .java).
+    """
+    def __init__(self, path):
+        self.path = path
+        self.snapshots_path = f"{path}{SNAPSHOTS_SUFFIX}"
+        self._lock = threading.Lock()
+        self._done = set()
+        self._snapshots = {}
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                self._done = {(row['repo_name'], row['commit']) for row in csv.DictReader(f)}
+            if os.path.exists(self.snapshots_path):
+                with open(self.snapshots_path, 'r', encoding='utf-8') as f:
+                    self._snapshots = json.load(f)
+        else:
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(HISTORY_CSV_HEADER)
+            # As versões escolhidas para uma série anterior não valem para um arquivo novo
+            if os.path.exists(self.snapshots_path):
+                os.remove(self.snapshots_path)
+
+    def done(self, repo_name, commit):
+        with self._lock:
+            return (repo_name, commit) in self._done \
+                or commit in self._snapshots.get(repo_name, {}).get('sem_resultado', ())
+
+    def snapshots(self, repo_name, selection):
+        """Versões escolhidas numa execução anterior com a mesma seleção (política, máximo), ou None."""
+        with self._lock:
+            saved = self._snapshots.get(repo_name)
+        if saved is None or saved['selecao'] != list(selection):
+            return None
+        return saved['versoes']
+
+    def save_snapshots(self, repo_name, selection, snapshots):
+        with self._lock:
+            previous = self._snapshots.get(repo_name, {})
+            self._snapshots[repo_name] = {'selecao': list(selection), 'versoes': snapshots,
+                                          'sem_resultado': previous.get('sem_resultado', [])}
+            self._save_snapshots()
+
+    def mark_no_result(self, repo_name, commit):
+        """Versão que não gera linha (falha definitiva): não é reanalisada ao retomar."""
+        with self._lock:
+            entry = self._snapshots.setdefault(repo_name, {'selecao': None, 'versoes': [], 'sem_resultado': []})
+            entry['sem_resultado'].append(commit)
+            self._save_snapshots()
+
+    def _save_snapshots(self):
+        tmp_path = f"{self.snapshots_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._snapshots, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshots_path)
+
+    def write(self, row):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow([row[column] for column in HISTORY_CSV_HEADER])
+                f.flush()
+                os.fsync(f.fileno())
+            self._done.add((row['repo_name'], row['commit']))
+
+def clone_mode_versao():
+    """Modo equivalente do checkout de uma versão (worktree), para a chave do cache."""
+    return 'esparso' if pipeline.CLONE_MODE == 'esparso' else 'completo'
+
+def linha_da_versao(repo_name, snapshot, metrics):
+    """Linha da série histórica a partir das métricas no formato de main.py (inclusive as do cache)."""
+    return {
+        'repo_name': repo_name,
+        'versao': snapshot['versao'],
+        'commit': snapshot['commit'],
+        'data': datetime.fromtimestamp(snapshot['data'], timezone.utc).strftime('%Y-%m-%d'),
+        'cbo_mean': f"{metrics['cbo_mean']:.6f}",
+        'dit_mean': f"{metrics['dit_mean']:.6f}",
+        'lcom_mean': f"{metrics['lcom_mean']:.6f}",
+        'cbo_total': f"{metrics['cbo_total']:.0f}",
+        'dit_total': f"{metrics['dit_total']:.0f}",
+        'lcom_total': f"{metrics['lcom_total']:.0f}",
+        'classes': int(metrics['detailed']['class_cbo_count']),
+    }
+
+class AnaliseHistorica:
+    """
+    Clona cada repositório uma vez (pool de clonagem) e envia cada versão
+    escolhida ao pool de CK compartilhado. Um clone é removido quando todas as
+    suas versões terminam; o número de clones em disco é limitado pelo pool de
+    clonagem.
+    """
+    def __init__(self, output_csv=HISTORY_OUTPUT_CSV, policy=SNAPSHOT_POLICY, max_snapshots=MAX_SNAPSHOTS,
+                 clone_dir=HISTORY_CLONE_DIR):
+        self.policy = policy
+        self.max_snapshots = max_snapshots
+        self.clone_dir = clone_dir
+        self.output = SerieHistoricaCSV(output_csv)
+        self._worktree_locks = {}
+        self._locks_lock = threading.Lock()
+        self.analyzed = pipeline.ThreadSafeCounter()
+        self.failed = pipeline.ThreadSafeCounter()
+
+    def _worktree_lock(self, repo_path):
+        # 'git worktree add/remove' alteram .git/worktrees do clone compartilhado
+        with self._locks_lock:
+            return self._worktree_locks.setdefault(repo_path, threading.Lock())
+
+    def criar_worktree(self, repo_path, worktree_path, commit, timeout=None):
+        """Worktree destacado no commit, com checkout apenas dos fontes Java no modo esparso."""
+        with self._worktree_lock(repo_path):
+            _git(repo_path, 'worktree', 'add', '--detach', '--no-checkout', os.path.abspath(worktree_path), commit)
+        if pipeline.CLONE_MODE == 'esparso':
+            # Configuração por worktree (extensions.worktreeConfig): o clone e os demais worktrees não mudam
+            _git(worktree_path, 'sparse-checkout', 'set', '--no-cone',
+                 *clonagem.sparse_patterns(pipeline.SPARSE_INCLUDE_PATTERNS, pipeline.SPARSE_EXCLUDE_PATTERNS))
+        _git(worktree_path, 'checkout', timeout=timeout or pipeline.CLONE_TIMEOUT)
+
+    def remover_worktree(self, repo_path, worktree_path):
+        with self._worktree_lock(repo_path):
+            try:
+                _git(repo_path, 'worktree', 'remove', '--force', os.path.abspath(worktree_path))
+            except subprocess.CalledProcessError:
+                shutil.rmtree(worktree_path, ignore_errors=True)
+                _git(repo_path, 'worktree', 'prune')
+
+    def consultar_cache(self, repo_name, snapshot):
+        """Grava a linha da versão a partir do cache de resultados, se o commit já foi analisado."""
+        if pipeline.result_cache is None:
+            return None
+        label = f"{repo_name}@{snapshot['versao']}"
+        with pipeline.instrumentation.span(label, 'cache') as span:
+            metrics = pipeline.result_cache.get(
+                pipeline.cache_key(repo_name, snapshot['commit'], clone_mode_versao()))
+            span['acerto'] = metrics is not None
+        if metrics is None:
+            return None
+        row = linha_da_versao(repo_name, snapshot, metrics)
+        self.output.write(row)
+        self.analyzed.increment()
+        logging.info(f"Cache: {label} já analisado, worktree e CK ignorados")
+        return row
+
+    def armazenar_no_cache(self, repo_name, snapshot, metrics):
+        """
+        Guarda só as métricas agregadas: sem saídas brutas, a versão não serve
+        de base para a análise incremental do HEAD (os caminhos são do worktree).
+        """
+        try:
+            pipeline.result_cache.put(
+                pipeline.cache_key(repo_name, snapshot['commit'], clone_mode_versao()), metrics, {},
+                repo_name=repo_name, commit_sha=snapshot['commit'])
+        except Exception as e:
+            logging.error(f"Erro ao gravar {repo_name}@{snapshot['versao']} no cache: {str(e)}")
+
+    def analisar_versao(self, repo_name, repo_path, snapshot, tentativa=0, falha_anterior=None):
+        """
+        Estágio de CK de uma versão: worktree, CK (com admissão do controlador
+        adaptativo) e agregação das saídas. Numa nova tentativa, os limites da
+        etapa que falhou crescem como em main.py (falhas.parametros_tentativa).
+
+        Returns:
+            tuple: (linha da série histórica ou None, categoria da falha se puder ser tentada novamente)
+        """
+        thread_name = threading.current_thread().name
+        label = f"{repo_name}@{snapshot['versao']}"
+        snapshot_name = f"{repo_name.replace('/', '_')}@{snapshot['commit'][:12]}"
+        worktree_path = os.path.join(self.clone_dir, snapshot_name)
+        ck_output_path = os.path.join(pipeline.CK_OUTPUT_DIR_BASE, snapshot_name)
+        csv_files = [f"{ck_output_path}class.csv", f"{ck_output_path}method.csv"]
+        limits = falhas.parametros_tentativa(falha_anterior, tentativa, pipeline.CLONE_TIMEOUT,
+                                             pipeline.CK_TIMEOUT, None, controle_concorrencia.HEAP_MAX_MB)
+        try:
+            with pipeline.instrumentation.span(label, 'worktree'):
+                self.criar_worktree(repo_path, worktree_path, snapshot['commit'], limits['clone_timeout'])
+            java_files = clonagem.count_java_files(worktree_path)
+            if java_files == 0:
+                logging.warning(f"[{thread_name}] Nenhum arquivo .java em {label}. Pulando o CK.")
+                self.output.mark_no_result(repo_name, snapshot['commit'])
+                return None, None
+
+            heap_mb = controle_concorrencia.estimate_heap_mb(java_files) if pipeline.SIZE_CK_HEAP else None
+            if heap_mb and falha_anterior == 'ck_oom':
+                # A partir do heap da primeira tentativa (o das JVMs residentes, se a versão coube nelas)
+                base_mb = pipeline.RESIDENT_CK_HEAP_MB if pipeline.usa_jvm_residente(heap_mb) else heap_mb
+                heap_mb = falhas.parametros_tentativa(falha_anterior, tentativa, pipeline.CLONE_TIMEOUT,
+                                                      pipeline.CK_TIMEOUT, base_mb,
+                                                      controle_concorrencia.HEAP_MAX_MB)['heap_mb']
+            reserved_mb = pipeline.heap_reservado_mb(heap_mb)
+            controller = pipeline.concurrency_controller
+            logging.info(f"[{thread_name}] Executando CK em {label} ({java_files} arquivos .java)...")
+            with pipeline.instrumentation.span(label, 'ck') as span:
+                if controller is not None:
+                    span['espera_admissao_s'] = controller.acquire(label, reserved_mb)
+                try:
+                    span.update(pipeline.run_ck(worktree_path, ck_output_path, thread_name,
+                                                timeout=limits['ck_timeout'], heap_mb=heap_mb) or {})
+                finally:
+                    if controller is not None:
+                        controller.release(reserved_mb)
+
+            class_stats = None
+            if os.path.exists(csv_files[0]):
+                class_stats = agregacao_ck.aggregate_csv(csv_files[0], agregacao_ck.CLASS_METRIC_COLUMNS)
+            if not class_stats or class_stats['cbo']['count'] == 0:
+                logging.warning(f"[{thread_name}] 'class.csv' ausente ou vazio para {label}. Pulando.")
+                self.output.mark_no_result(repo_name, snapshot['commit'])
+                return None, None
+            method_stats = agregacao_ck.aggregate_csv(csv_files[1], agregacao_ck.METHOD_METRIC_COLUMNS)
+
+            # Mesmo formato das métricas de main.py: o cache serve às duas análises
+            metrics = {
+                'repo_name': repo_name,
+                'cbo_mean': class_stats['cbo']['mean'],
+                'dit_mean': class_stats['dit']['mean'],
+                'lcom_mean': class_stats['lcom']['mean'],
+                'cbo_total': class_stats['cbo']['sum'],
+                'dit_total': class_stats['dit']['sum'],
+                'lcom_total': class_stats['lcom']['sum'],
+                'detailed': {
+                    **agregacao_ck.flatten('class', class_stats, agregacao_ck.CLASS_METRIC_COLUMNS),
+                    **agregacao_ck.flatten('method', method_stats, agregacao_ck.METHOD_METRIC_COLUMNS)
+                },
+            }
+            if pipeline.result_cache is not None:
+                self.armazenar_no_cache(repo_name, snapshot, metrics)
+
+            row = linha_da_versao(repo_name, snapshot, metrics)
+            self.output.write(row)
+            self.analyzed.increment()
+            logging.info(f"[{thread_name}] Métricas de {label}: CBO_mean={class_stats['cbo']['mean']:.2f}, "
+                         f"DIT_mean={class_stats['dit']['mean']:.2f}, LCOM_mean={class_stats['lcom']['mean']:.2f}")
+            return row, None
+        except Exception as e:
+            categoria = falhas.classificar_falha(e)
+            detail = getattr(e, 'stderr', None) or e
+            logging.error(f"[{thread_name}] Falha em {label} ({categoria}): {detail}")
+            if falhas.pode_tentar_novamente(categoria) and tentativa < pipeline.MAX_RETRIES:
+                return None, categoria
+            self.failed.increment()
+            if not falhas.pode_tentar_novamente(categoria):
+                self.output.mark_no_result(repo_name, snapshot['commit'])
+            return None, None
+        finally:
+            for csv_file in csv_files:
+                if os.path.exists(csv_file):
+                    os.remove(csv_file)
+            if os.path.isdir(ck_output_path) and not os.listdir(ck_output_path):
+                os.rmdir(ck_output_path)
+            if os.path.exists(worktree_path):
+                try:
+                    self.remover_worktree(repo_path, worktree_path)
+                except Exception as e:
+                    logging.error(f"[{thread_name}] Erro ao remover o worktree de {label}: {str(e)}")
+
+    def clonar(self, repo_name, repo_path):
+        """Clone histórico, com novas tentativas (timeout crescente) após timeout ou erro de rede."""
+        timeout = HISTORY_CLONE_TIMEOUT
+        for tentativa in range(pipeline.MAX_RETRIES + 1):
+            try:
+                with pipeline.instrumentation.span(repo_name, 'clone') as span:
+                    span.update(clonar_historico(pipeline.CLONE_URL_TEMPLATE.format(repo_name=repo_name),
+                                                 repo_path, timeout))
+                return
+            except Exception as e:
+                categoria = falhas.classificar_falha(e)
+                if tentativa == pipeline.MAX_RETRIES or not falhas.pode_tentar_novamente(categoria):
+                    raise
+                backoff = falhas.RETRY_BACKOFF_S * 2 ** tentativa
+                timeout = falhas.parametros_tentativa(categoria, tentativa + 1, HISTORY_CLONE_TIMEOUT,
+                                                      pipeline.CK_TIMEOUT, None, None)['clone_timeout']
+                logging.warning(f"Clone histórico de {repo_name} falhou ({categoria}); "
+                                f"nova tentativa em {backoff}s com timeout de {timeout}s")
+                if os.path.exists(repo_path):
+                    shutil.rmtree(repo_path, onexc=pipeline.remove_readonly)
+                time.sleep(backoff)
+
+    def analisar_versoes(self, repo_name, repo_path, snapshots, ck_executor):
+        """
+        Envia as versões ao pool de CK e, como main.py, tenta novamente as
+        falhas transitórias em rodadas com espera e limites crescentes.
+        """
+        futures = [(snapshot, ck_executor.submit(self.analisar_versao, repo_name, repo_path, snapshot))
+                   for snapshot in snapshots]
+        for tentativa in range(1, pipeline.MAX_RETRIES + 1):
+            retry = [(snapshot, future.result()[1]) for snapshot, future in futures if future.result()[1]]
+            if not retry:
+                return
+            backoff = falhas.RETRY_BACKOFF_S * 2 ** (tentativa - 1)
+            logging.info(f"{repo_name}: nova tentativa {tentativa} de {len(retry)} versões em {backoff}s")
+            time.sleep(backoff)
+            futures = [(snapshot, ck_executor.submit(self.analisar_versao, repo_name, repo_path, snapshot,
+                                                     tentativa, categoria))
+                       for snapshot, categoria in retry]
+        for _, future in futures:
+            future.result()
+
+    def processar_repositorio(self, repo_name, created_at, ck_executor):
+        """
+        Estágio de clonagem: clona uma vez, escolhe as versões, envia cada uma
+        ao pool de CK e aguarda todas antes de remover o clone. Ao retomar, as
+        versões escolhidas antes são consultadas primeiro: se todas já estão
+        no CSV (ou no cache de resultados), o repositório não é clonado.
+        """
+        thread_name = threading.current_thread().name
+        repo_path = os.path.join(self.clone_dir, repo_name.replace('/', '_'))
+        selection = (self.policy, self.max_snapshots)
+        try:
+            saved = self.output.snapshots(repo_name, selection)
+            if saved is not None:
+                pending = [snapshot for snapshot in saved if not self.output.done(repo_name, snapshot['commit'])
+                           and self.consultar_cache(repo_name, snapshot) is None]
+                if not pending:
+                    logging.info(f"[{thread_name}] {repo_name}: {len(saved)} versões já analisadas, clone ignorado")
+                    return
+
+            self.clonar(repo_name, repo_path)
+            if saved is None:
+                snapshots = selecionar_versoes(repo_path, self.policy, created_at, self.max_snapshots)
+                self.output.save_snapshots(repo_name, selection, snapshots)
+                pending = [snapshot for snapshot in snapshots if not self.output.done(repo_name, snapshot['commit'])
+                           and self.consultar_cache(repo_name, snapshot) is None]
+            else:
+                snapshots = saved
+            logging.info(f"[{thread_name}] {repo_name}: {len(snapshots)} versões ({self.policy}), "
+                         f"{len(snapshots) - len(pending)} já analisadas: "
+                         + ", ".join(snapshot['versao'] for snapshot in pending))
+            self.analisar_versoes(repo_name, repo_path, pending, ck_executor)
+        except Exception as e:
+            self.failed.increment()
+            detail = getattr(e, 'stderr', None) or e
+            logging.error(f"[{thread_name}] Falha ao preparar {repo_name} ({falhas.classificar_falha(e)}): {detail}")
+        finally:
+            if os.path.exists(repo_path):
+                shutil.rmtree(repo_path, onexc=pipeline.remove_readonly)
+
+    def executar(self, repos, max_workers, clone_workers):
+        """
+        Args:
+            repos: Lista de (nome, created_at)
+            max_workers: Análises do CK simultâneas (somando todas as versões)
+            clone_workers: Clones históricos simultâneos (e presentes em disco)
+        """
+        os.makedirs(self.clone_dir, exist_ok=True)
+        os.makedirs(pipeline.CK_OUTPUT_DIR_BASE, exist_ok=True)
+        if pipeline.ADAPTIVE_CONCURRENCY:
+            max_workers = pipeline.teto_ck(max_workers)
+        pipeline.iniciar_pool_ck(max_workers)
+        pipeline.iniciar_controle_concorrencia(max_workers, self.clone_dir)
+        try:
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="CK-Versao") as ck_executor, \
+                    ThreadPoolExecutor(max_workers=clone_workers, thread_name_prefix="Clone-Historico") as clone_executor:
+                for repo_name, created_at in repos:
+                    clone_executor.submit(self.processar_repositorio, repo_name, created_at, ck_executor)
+        finally:
+            pipeline.encerrar_pool_ck()
+            pipeline.encerrar_controle_concorrencia()
+
+def carregar_entrada(input_file, limit):
+    """Lista de (nome, created_at) do catálogo SQLite ou de um repo.json."""
+    if input_file.endswith('.db'):
+        if not os.path.exists(input_file):
+            raise FileNotFoundError(input_file)
+        repos_df = RepositoryCatalog(input_file).load_dataframe(['name', 'created_at'], limit=limit)
+    else:
+        repos_df = pd.read_json(input_file, encoding='utf-8').head(limit)
+    created_at = repos_df['created_at'] if 'created_at' in repos_df.columns else [None] * len(repos_df)
+    return list(zip(repos_df['name'], created_at))
+
+def main():
+    parser = argparse.ArgumentParser(description='Série histórica de CBO/DIT/LCOM por repositório (um clone por repositório)')
+    parser.add_argument('entrada', nargs='?', default=pipeline.INPUT_JSON_FILE, help='repo.json ou catálogo .db')
+    parser.add_argument('--politica', choices=['anual', 'tags'], default=SNAPSHOT_POLICY)
+    parser.add_argument('--max-versoes', type=int, default=MAX_SNAPSHOTS)
+    parser.add_argument('--limite', type=int, default=1000, help='Quantidade de repositórios da entrada')
+    parser.add_argument('--workers', type=int, default=None, help='Análises do CK simultâneas')
+    parser.add_argument('--clone-workers', type=int, default=None, help='Clones históricos simultâneos')
+    parser.add_argument('--saida', default=HISTORY_OUTPUT_CSV)
+    args = parser.parse_args()
+
+    try:
+        repos = carregar_entrada(args.entrada, args.limite)
+    except FileNotFoundError:
+        print(f"ERRO: Arquivo de entrada '{args.entrada}' não encontrado.")
+        return
+
+    max_workers = args.workers or pipeline.dimensionar_workers()[0]
+    # Cada clone alimenta o CK com várias versões: poucos clones bastam
+    clone_workers = args.clone_workers or max(1, max_workers // 2)
+    analysis = AnaliseHistorica(args.saida, args.politica, args.max_versoes)
+
+    start_time = time.time()
+    logging.info(f"Série histórica de {len(repos)} repositórios ({args.politica}, até {args.max_versoes} versões): "
+                 f"{max_workers} workers de CK e {clone_workers} de clonagem")
+    analysis.executar(repos, max_workers, clone_workers)
+    execution_time = time.time() - start_time
+
+    print(f"\nSérie histórica concluída: {analysis.analyzed.value} versões analisadas, {analysis.failed.value} falhas")
+    print(f"Resultados salvos em '{args.saida}'")
+    print(f"Tempo de execução: {execution_time:.2f} segundos")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+import os
+import sys
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+# Os módulos do projeto ficam na raiz do repositório (sem pacote)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark_pipeline
+
+# Repositórios bare locais (file://) no lugar do GitHub, como no benchmark:
+#   repositorio_bare('bench/repo', arquivos)            -> caminho do repositório bare
+#   publicar_commit(bare, arquivos, data=..., tag=...)  -> novo commit no ramo principal
+GIT_IDENTITY = ['-c', 'user.name=testes', '-c', 'user.email=testes@localhost']
+
+def git(*args, cwd=None, env=None):
+    return subprocess.run(['git', *args], cwd=cwd, check=True, capture_output=True, text=True, env=env).stdout
+
+def _commit(work_path, arquivos, mensagem, data=None, tag=None):
+    """Commit dos arquivos com data (ISO 8601) de autor e de commit opcional, e tag anotada opcional."""
+    for caminho, conteudo in arquivos.items():
+        destino = os.path.join(work_path, caminho)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        with open(destino, 'w', encoding='utf-8') as f:
+            f.write(conteudo)
+    env = dict(os.environ, GIT_AUTHOR_DATE=data, GIT_COMMITTER_DATE=data) if data else None
+    git('add', '-A', cwd=work_path)
+    git(*GIT_IDENTITY, 'commit', '-q', '-m', mensagem, cwd=work_path, env=env)
+    if tag:
+        git(*GIT_IDENTITY, 'tag', '-a', tag, '-m', tag, cwd=work_path, env=env)
+
+@pytest.fixture
+def repositorio_bare(tmp_path):
+    """Cria repositórios bare em tmp_path/bare/<owner>/<nome>.git a partir de {caminho: conteúdo}."""
+    raiz = tmp_path / 'bare'
+
+    def criar(nome, arquivos, permitir_filtro=True, data=None, tag=None):
+        bare_path = raiz / f"{nome}.git"
+        work_path = tmp_path / 'trabalho' / nome
+        work_path.mkdir(parents=True)
+        git('init', '-q', '-b', 'main', cwd=work_path)
+        _commit(work_path, arquivos, 'Versão inicial', data, tag)
+        git('clone', '-q', '--bare', str(work_path), str(bare_path))
+        shutil.rmtree(work_path)
+        if permitir_filtro:
+            # Clones parciais (--filter=blob:none) e busca de commits pelo SHA pelo transporte file://
+            git('config', 'uploadpack.allowFilter', 'true', cwd=bare_path)
+            git('config', 'uploadpack.allowAnySHA1InWant', 'true', cwd=bare_path)
+        return bare_path
+
+    criar.raiz = raiz
+    return criar
+
+def publicar_commit(bare_path, arquivos, mensagem='Alteração', data=None, tag=None):
+    """Clona o repositório bare, grava os arquivos e publica um novo commit (e a tag, se houver)."""
+    work_path = f"{bare_path}.trabalho"
+    git('clone', '-q', str(bare_path), work_path)
+    try:
+        _commit(work_path, arquivos, mensagem, data, tag)
+        git('push', '-q', '--follow-tags', 'origin', 'HEAD', cwd=work_path)
+    finally:
+        shutil.rmtree(work_path)
+
+@pytest.fixture
+def modulo_main(tmp_path, monkeypatch):
+    """main.py importado a partir de tmp_path; os globais do módulo são restaurados ao final do teste."""
+    monkeypatch.chdir(tmp_path)
+    import main
+    estado = dict(vars(main))
+    yield main
+    for nome in set(vars(main)) - set(estado):
+        delattr(main, nome)
+    vars(main).update(estado)
+
+@pytest.fixture
+def pipeline(modulo_main):
+    """
+    Configura main.py como no benchmark (CK substituto, sem JVMs residentes
+    nem concorrência adaptativa), com as saídas em run_dir:
+        main = pipeline(run_dir, raiz_dos_repositorios_bare)
+    """
+    main = modulo_main
+    args = SimpleNamespace(modo_clone='esparso', arquivar=False, ck='stub', ck_residente=False, adaptativo=False,
+                           escalonamento='original', historico=None)
+
+    def configurar(run_dir, bare_root):
+        os.makedirs(run_dir, exist_ok=True)
+        benchmark_pipeline.configure_pipeline(main, str(run_dir), str(bare_root), args)
+        main.ck_pool = None
+        main.MAX_RETRIES = 0
+        return main
+
+    return configurar
@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+import agregacao_ck
+
+def test_somas_inteiras_exatas_acima_de_2_24(tmp_path):
+    grande = 2 ** 24 + 1  # Primeiro inteiro que float32 não representa
+    df = pd.DataFrame({'file': ['A.java'] * 5, 'class': list('abcde'), 'cbo': [1, 2, 3, 4, 5],
+                       'dit': [1, 1, 1, 2, 1], 'lcom': [grande, grande + 2, 3, 0, 7], 'loc': [10, 20, 30, 40, 50]})
+    path = tmp_path / 'class.csv'
+    df.to_csv(path, index=False)
+
+    stats = agregacao_ck.aggregate_csv(str(path), agregacao_ck.CLASS_METRIC_COLUMNS, chunksize=2)
+
+    for column in agregacao_ck.CLASS_METRIC_COLUMNS:
+        assert stats[column]['sum'] == df[column].sum()
+        assert stats[column]['min'] == df[column].min()
+        assert stats[column]['max'] == df[column].max()
+        assert np.isclose(stats[column]['mean'], df[column].mean())
+        assert np.isclose(stats[column]['std'], df[column].std())
+
+def test_valores_ausentes_sao_descartados(tmp_path):
+    path = tmp_path / 'class.csv'
+    path.write_text('file,class,cbo,dit,lcom,loc\nA.java,a,1,1,,3\nA.java,b,2,1,NaN,4\n', encoding='utf-8')
+
+    stats = agregacao_ck.aggregate_csv(str(path), agregacao_ck.CLASS_METRIC_COLUMNS)
+
+    assert stats['cbo']['count'] == 2 and stats['cbo']['sum'] == 3
+    assert stats['lcom']['count'] == 0
@@ -0,0 +1,46 @@
+import os
+import csv
+import json
+from types import SimpleNamespace
+
+import benchmark_pipeline
+
+def _args(diretorio, **kwargs):
+    args = dict(repos=3, classes=[4, 7], profundidade=2, acoplamento=2, metodos=1, ck='stub', ck_residente=False,
+                modo_clone='esparso', arquivar=False, workers=2, adaptativo=False, escalonamento='maior_primeiro',
+                historico=None, clone_workers=None, max_pendentes=None, diretorio=str(diretorio), verbose=False)
+    args.update(kwargs)
+    return SimpleNamespace(**args)
+
+def test_repositorios_sinteticos_sao_reaproveitados(tmp_path):
+    root, repos = benchmark_pipeline.generate_repositories(str(tmp_path), 2, [3], 2, 1, 1)
+    assert sorted(os.listdir(os.path.join(root, 'bench'))) == ['repo-0000.git', 'repo-0001.git']
+
+    assert benchmark_pipeline.generate_repositories(str(tmp_path), 2, [3], 2, 1, 1) == (root, repos)
+    assert benchmark_pipeline.generate_repositories(str(tmp_path), 2, [5], 2, 1, 1)[0] != root
+
+def test_execucao_offline_completa(tmp_path, modulo_main):
+    resultados = benchmark_pipeline.run_benchmark(_args(tmp_path / 'benchmark'))
+
+    assert resultados['status'] == {'concluido': 3}
+    for estagio in ('clone', 'ck', 'total'):
+        assert resultados['estagios'][estagio]['n'] == 3
+    assert resultados['repos_por_minuto'] > 0
+    with open(modulo_main.OUTPUT_CSV_FILE, 'r', encoding='utf-8', newline='') as f:
+        linhas = {row['repo_name']: row for row in csv.DictReader(f)}
+    assert sorted(linhas) == ['bench/repo-0000', 'bench/repo-0001', 'bench/repo-0002']
+    json.dumps(resultados)  # Gravável como resultados_benchmark.json
+
+def test_comparacao_entre_execucoes(tmp_path, capsys):
+    base = {'parametros': {'repos': 3}, 'tempo_total_s': 10.0, 'repos_por_minuto': 18.0}
+    nova = {'parametros': {'repos': 3}, 'tempo_total_s': 5.0, 'repos_por_minuto': 36.0}
+    for nome, resultados in (('base.json', base), ('nova.json', nova)):
+        (tmp_path / nome).write_text(json.dumps(resultados), encoding='utf-8')
+
+    benchmark_pipeline.compare(str(tmp_path / 'base.json'), str(tmp_path / 'nova.json'))
+
+    saida = capsys.readouterr().out
+    assert 'AVISO' not in saida
+    linhas = {linha.split()[0]: linha for linha in saida.splitlines()[1:]}
+    assert linhas['tempo_total_s'].rstrip().endswith('-50.0% +')
+    assert linhas['repos_por_minuto'].rstrip().endswith('100.0% +')
@@ -0,0 +1,76 @@
+import csv
+
+import pandas as pd
+import pytest
+
+import cache_resultados
+import clonagem
+from conftest import publicar_commit
+
+FONTES = {
+    'src/main/java/app/Pedido.java': 'package app;\npublic class Pedido { Cliente cliente; }\n',
+    'src/main/java/app/Cliente.java': 'package app;\npublic class Cliente {}\n',
+    'src/test/java/app/PedidoTest.java': 'package app;\npublic class PedidoTest { Pedido pedido; }\n',
+    'README.md': 'Projeto de teste\n',
+}
+
+@pytest.fixture
+def execucao(tmp_path, pipeline, repositorio_bare, monkeypatch):
+    """Executa o pipeline sobre 'org/app' num diretório novo a cada chamada, com um cache compartilhado."""
+    bare_path = repositorio_bare('org/app', FONTES)
+    cache = cache_resultados.ResultCache(str(tmp_path / 'cache'), 1024 ** 3)
+    chamadas_ck = []
+    contador = iter(range(100))
+
+    def executar():
+        main = pipeline(tmp_path / f"execucao{next(contador)}", repositorio_bare.raiz)
+        main.result_cache = cache
+        run_ck = main.run_ck
+
+        def run_ck_contado(repo_clone_path, *args, **kwargs):
+            chamadas_ck.append(clonagem.count_java_files(repo_clone_path))
+            return run_ck(repo_clone_path, *args, **kwargs)
+
+        monkeypatch.setattr(main, 'run_ck', run_ck_contado)
+        main.process_repositories_multithread(pd.DataFrame({'name': ['org/app']}), 1, 1)
+        with open(main.OUTPUT_CSV_FILE, 'r', encoding='utf-8', newline='') as f:
+            return list(csv.DictReader(f))
+
+    executar.chamadas_ck = chamadas_ck
+    executar.bare_path = bare_path
+    return executar
+
+def test_commit_inalterado_usa_o_cache(execucao):
+    primeira = execucao()
+    assert len(execucao.chamadas_ck) == 1
+
+    segunda = execucao()
+    assert len(execucao.chamadas_ck) == 1  # Acerto: nem clone nem CK
+    assert segunda == primeira
+    assert primeira[0]['repo_name'] == 'org/app'
+
+def test_novo_commit_invalida_o_cache(execucao):
+    primeira = execucao()
+    publicar_commit(execucao.bare_path, {'src/main/java/app/Produto.java': 'package app;\npublic class Produto {}\n'})
+
+    segunda = execucao()
+    assert execucao.chamadas_ck == [3, 4]
+    assert float(segunda[0]['cbo_total']) != float(primeira[0]['cbo_total']) \
+        or float(segunda[0]['lcom_total']) != float(primeira[0]['lcom_total'])
+
+def test_padroes_do_sparse_checkout_fazem_parte_da_chave(execucao, monkeypatch):
+    execucao()
+    import main
+    # Outro conjunto de arquivos analisados: o resultado anterior não vale
+    monkeypatch.setattr(main, 'SPARSE_EXCLUDE_PATTERNS', ['**/src/test/'])
+    execucao()
+    assert execucao.chamadas_ck == [3, 2]
+
+    execucao()
+    assert len(execucao.chamadas_ck) == 2
+
+def test_chave_muda_com_a_versao_do_ck():
+    base = dict(repo_name='org/app', commit_sha='a' * 40, ck_flags=['false', '0'], file_set=['esparso', '*.java'])
+    chave = cache_resultados.ResultCache.make_key(ck_version='1', **base)
+    assert chave == cache_resultados.ResultCache.make_key(ck_version='1', **base)
+    assert chave != cache_resultados.ResultCache.make_key(ck_version='2', **base)
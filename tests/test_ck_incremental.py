@@ -0,0 +1,134 @@
+import os
+import csv
+import gzip
+import shutil
+
+import pytest
+
+import benchmark_pipeline
+import ck_incremental
+import clonagem
+from conftest import GIT_IDENTITY, git, publicar_commit
+
+MARCADOR = '/org_app/'
+
+FONTES = {
+    'src/app/B.java': 'package app;\npublic class B {\n    int x;\n}\n',
+    'src/app/A.java': 'package app;\npublic class A extends B {\n}\n',
+    'src/app/C.java': 'package app;\npublic class C extends A {\n}\n',
+    'src/app/U.java': 'package app;\npublic class U {\n    B b;\n}\n',
+    'src/app/D.java': 'package app;\npublic class D {\n}\n',
+    'src/app/Y.java': 'package app;\npublic class Y {\n}\n',
+    'README.md': 'Projeto de teste\n',
+}
+
+def _arquivo(nome):
+    return f"src/app/{nome}.java"
+
+@pytest.fixture
+def versoes(tmp_path, repositorio_bare):
+    """
+    Analisa (com o CK substituto) a versão inicial de org/app e devolve
+    nova_versao(alterados, removidos), que publica um commit, clona a nova
+    versão como o pipeline (raso e esparso, buscando o commit anterior) e
+    retorna (clone, commit anterior, saída bruta anterior em .csv.gz).
+    """
+    bare_path = repositorio_bare('org/app', FONTES)
+    url = f"file://{bare_path}"
+    primeiro = tmp_path / 'v1' / 'org_app'
+    clonagem.clonar(url, str(primeiro))
+    anterior = {}
+    prefixo = str(tmp_path / 'v1' / 'saida_')
+    benchmark_pipeline.stub_run_ck(str(primeiro), prefixo, 'teste')
+    for nome in ('class.csv', 'method.csv'):
+        anterior[nome] = f"{prefixo}{nome}.gz"
+        with open(f"{prefixo}{nome}", 'rb') as origem, gzip.open(anterior[nome], 'wb') as destino:
+            shutil.copyfileobj(origem, destino)
+    commit_anterior = git('-C', str(primeiro), 'rev-parse', 'HEAD').strip()
+
+    def nova_versao(alterados=None, removidos=()):
+        if removidos:
+            work_path = tmp_path / 'edicao'
+            git('clone', '-q', url, str(work_path))
+            git('rm', '-q', *removidos, cwd=work_path)
+            git(*GIT_IDENTITY, 'commit', '-q', '-m', 'Remoção', cwd=work_path)
+            git('push', '-q', 'origin', 'HEAD', cwd=work_path)
+            shutil.rmtree(work_path)
+        if alterados:
+            publicar_commit(bare_path, alterados)
+        clone = tmp_path / 'v2' / 'org_app'
+        clonagem.clonar(url, str(clone))
+        ck_incremental.buscar_commit(str(clone), commit_anterior)
+        return str(clone), commit_anterior, anterior
+
+    return nova_versao
+
+def _planejar(clone, commit_anterior, anterior):
+    classes = ck_incremental.classes_por_arquivo(anterior['class.csv'], MARCADOR)
+    return ck_incremental.planejar(clone, commit_anterior, classes, clonagem.count_java_files(clone),
+                                   max_fraction=1.0)
+
+def test_alteracao_reanalisa_subclasses_e_quem_menciona(versoes):
+    clone, commit_anterior, anterior = versoes({_arquivo('B'): 'package app;\npublic class B {\n    long x;\n}\n'})
+
+    plano = _planejar(clone, commit_anterior, anterior)
+
+    assert plano['arquivos'] == sorted(_arquivo(nome) for nome in 'ABCU')
+    assert (plano['alterados'], plano['removidos'], plano['dependentes']) == (1, 0, 3)
+
+def test_nova_superclasse_e_a_anterior_sao_reanalisadas(versoes):
+    clone, commit_anterior, anterior = versoes({_arquivo('A'): 'package app;\npublic class A extends Y {\n}\n'})
+
+    plano = _planejar(clone, commit_anterior, anterior)
+
+    # C herda de A (DIT); B perde e Y ganha uma subclasse (NOC)
+    assert plano['arquivos'] == sorted(_arquivo(nome) for nome in 'ABCY')
+    assert plano['referenciados'] == 2
+
+def test_remocao_descarta_as_linhas_e_reanalisa_os_citados(versoes):
+    clone, commit_anterior, anterior = versoes(removidos=[_arquivo('U')])
+
+    plano = _planejar(clone, commit_anterior, anterior)
+
+    assert plano['removidos'] == 1
+    assert _arquivo('U') in plano['substituidos']
+    # B deixa de ser referenciada por U (FANIN)
+    assert plano['arquivos'] == [_arquivo('B')]
+
+def _linhas(path, marker):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        rows = list(csv.reader(f))
+    file_column = rows[0].index('file')
+    for row in rows[1:]:
+        row[file_column] = ck_incremental.caminho_relativo(row[file_column], marker)
+    return rows[0], sorted(rows[1:])
+
+def test_saida_mesclada_igual_a_da_analise_completa(versoes, tmp_path):
+    clone, commit_anterior, anterior = versoes(
+        {_arquivo('B'): 'package app;\npublic class B {\n    long x;\n    long y;\n}\n',
+         _arquivo('N'): 'package app;\npublic class N extends C {\n}\n'},
+        removidos=[_arquivo('D')])
+    plano = _planejar(clone, commit_anterior, anterior)
+    completa = str(tmp_path / 'completa_')
+    benchmark_pipeline.stub_run_ck(clone, completa, 'teste')
+
+    for nome in ('class.csv', 'method.csv'):
+        # Análise parcial: as linhas que o CK (substituto) produz só para os arquivos do plano
+        header, rows = _linhas(f"{completa}{nome}", MARCADOR)
+        parcial = tmp_path / f"parcial_{nome}"
+        with open(f"{completa}{nome}", 'r', encoding='utf-8', newline='') as origem, \
+                open(parcial, 'w', encoding='utf-8', newline='') as destino:
+            reader = csv.reader(origem)
+            writer = csv.writer(destino, lineterminator='\n')
+            writer.writerow(next(reader))
+            writer.writerows(row for row in reader
+                             if ck_incremental.caminho_relativo(row[0], MARCADOR) in plano['arquivos'])
+        mesclada = tmp_path / f"mesclada_{nome}"
+
+        count = ck_incremental.mesclar_saida(anterior[nome], str(parcial), str(mesclada), plano['substituidos'],
+                                             clone, MARCADOR)
+
+        assert count == len(rows)
+        assert _linhas(mesclada, MARCADOR) == (header, rows)
+        with open(mesclada, 'r', encoding='utf-8', newline='') as f:
+            assert all(row['file'].startswith(os.path.abspath(clone)) for row in csv.DictReader(f))
@@ -0,0 +1,87 @@
+import os
+import shutil
+import stat
+import subprocess
+
+import pytest
+
+import clonagem
+
+FONTES = {
+    'src/main/java/app/Pedido.java': 'package app;\npublic class Pedido {}\n',
+    'src/test/java/app/PedidoTest.java': 'package app;\npublic class PedidoTest {}\n',
+    'README.md': 'Projeto de teste\n',
+}
+
+def _arquivos(clone_path):
+    encontrados = set()
+    for root, dirs, files in os.walk(clone_path):
+        if '.git' in dirs:
+            dirs.remove('.git')
+        encontrados.update(os.path.relpath(os.path.join(root, name), clone_path) for name in files)
+    return encontrados
+
+@pytest.fixture
+def git_sem_sparse_checkout(tmp_path, monkeypatch):
+    """Põe no PATH um 'git' que repassa tudo ao git real, exceto o subcomando sparse-checkout."""
+    bin_path = tmp_path / 'bin'
+    bin_path.mkdir()
+    wrapper = bin_path / 'git'
+    wrapper.write_text(
+        '#!/bin/sh\n'
+        'for arg in "$@"; do\n'
+        '  if [ "$arg" = sparse-checkout ]; then\n'
+        '    echo "git: \'sparse-checkout\' is not a git command. See \'git --help\'." >&2\n'
+        '    exit 1\n'
+        '  fi\n'
+        'done\n'
+        f'exec {shutil.which("git")} "$@"\n'
+    )
+    wrapper.chmod(wrapper.stat().st_mode | stat.S_IXUSR)
+    monkeypatch.setenv('PATH', f"{bin_path}{os.pathsep}{os.environ['PATH']}")
+
+def test_clone_esparso_traz_apenas_os_fontes_java(tmp_path, repositorio_bare):
+    bare_path = repositorio_bare('org/app', FONTES)
+    clone_path = tmp_path / 'clone'
+
+    resultado = clonagem.clonar(f"file://{bare_path}", str(clone_path), mode='esparso')
+
+    assert resultado['clone_mode'] == 'esparso'
+    assert resultado['java_files'] == 2
+    assert _arquivos(clone_path) == {'src/main/java/app/Pedido.java', 'src/test/java/app/PedidoTest.java'}
+
+def test_exclusao_de_diretorio_remove_os_fontes_dele(tmp_path, repositorio_bare):
+    bare_path = repositorio_bare('org/app', FONTES)
+    clone_path = tmp_path / 'clone'
+
+    resultado = clonagem.clonar(f"file://{bare_path}", str(clone_path), mode='esparso',
+                                exclude_patterns=['**/src/test/'])
+
+    assert resultado['java_files'] == 1
+    assert _arquivos(clone_path) == {'src/main/java/app/Pedido.java'}
+
+def test_servidor_sem_filtro_mantem_o_clone_esparso(tmp_path, repositorio_bare):
+    bare_path = repositorio_bare('org/app', FONTES, permitir_filtro=False)
+    clone_path = tmp_path / 'clone'
+
+    resultado = clonagem.clonar(f"file://{bare_path}", str(clone_path), mode='esparso')
+
+    assert resultado['clone_mode'] == 'esparso_sem_filtro'
+    assert 'README.md' not in _arquivos(clone_path)
+
+def test_git_sem_sparse_checkout_recai_para_clone_completo(tmp_path, repositorio_bare, git_sem_sparse_checkout):
+    bare_path = repositorio_bare('org/app', FONTES)
+    clone_path = tmp_path / 'clone'
+
+    resultado = clonagem.clonar(f"file://{bare_path}", str(clone_path), mode='esparso')
+
+    assert resultado['clone_mode'] == 'completo'
+    assert _arquivos(clone_path) == set(FONTES)
+
+def test_repositorio_inexistente_nao_recai_para_clone_completo(tmp_path, repositorio_bare, monkeypatch):
+    chamadas = []
+    monkeypatch.setattr(clonagem, 'clone_full', lambda *args, **kwargs: chamadas.append(args))
+
+    with pytest.raises(subprocess.CalledProcessError):
+        clonagem.clonar(f"file://{repositorio_bare.raiz}/org/inexistente.git", str(tmp_path / 'clone'))
+    assert chamadas == []
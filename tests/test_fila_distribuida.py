@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import falhas
+import fila_distribuida
+from fila_distribuida import WorkQueue
+
+FONTES = {'src/main/java/app/Pedido.java': 'package app;\npublic class Pedido {}\n'}
+
+@pytest.fixture
+def fila(tmp_path):
+    work_queue = WorkQueue(str(tmp_path / 'fila.db'), worker_id='worker-a')
+    work_queue.populate(['org/a', 'org/b'])
+    return work_queue
+
+def test_falha_transitoria_volta_a_fila_apos_a_espera(fila, monkeypatch):
+    assert fila.claim() == (0, 'org/a', 1, None)
+    fila.complete('org/a', 'erro', error='conexão recusada', falha='rede')
+
+    # Em espera: o próximo da fila é reivindicado, não o que acabou de falhar
+    assert fila.claim() == (1, 'org/b', 1, None)
+    assert fila.claim() is None
+    assert fila.remaining() == 2
+
+    monkeypatch.setattr(fila_distribuida.time, 'time', lambda: 10 ** 10)
+    assert fila.claim() == (0, 'org/a', 2, 'rede')
+
+def test_falha_definitiva_nao_volta_a_fila(fila):
+    fila.claim()
+    fila.complete('org/a', 'erro', error='repositório não encontrado', falha='clone_falha')
+
+    assert fila.counts()['falhou'] == 1
+    assert fila.failures() == [{'name': 'org/a', 'attempts': 1, 'error': 'repositório não encontrado',
+                                'falha': 'clone_falha'}]
+
+def test_tentativas_esgotadas_marcam_falha(fila, monkeypatch, tmp_path):
+    monkeypatch.setattr(falhas, 'RETRY_BACKOFF_S', 0)
+    for tentativa in range(1, fila_distribuida.MAX_ATTEMPTS + 1):
+        assert fila.claim() == (0, 'org/a', tentativa, None if tentativa == 1 else 'ck_timeout')
+        fila.complete('org/a', 'erro', error='timeout', falha='ck_timeout')
+
+    assert fila.claim()[1] == 'org/b'
+    failed = fila.write_failures(str(tmp_path / 'falhas.json'))
+    assert failed == [{'name': 'org/a', 'falha': 'ck_timeout', 'erro': 'timeout',
+                       'tentativas': fila_distribuida.MAX_ATTEMPTS, 'definitiva': False}]
+    assert json.loads((tmp_path / 'falhas.json').read_text(encoding='utf-8')) == failed
+
+def test_worker_grava_as_falhas_de_todas_as_passadas(tmp_path, pipeline, repositorio_bare, monkeypatch):
+    for nome in ('org/a', 'org/c'):
+        repositorio_bare(nome, FONTES)
+    main = pipeline(tmp_path / 'execucao', repositorio_bare.raiz)
+    monkeypatch.setattr(fila_distribuida, 'IDLE_POLL_INTERVAL', 0.1)
+    queue_path = str(tmp_path / 'fila.db')
+    WorkQueue(queue_path).populate(['org/a', 'org/inexistente', 'org/c'])
+    # Outro worker mantém org/c: as passadas seguintes deste worker ficam ociosas até o lease vencer
+    with WorkQueue(queue_path)._transaction() as conn:
+        conn.execute("UPDATE tasks SET status = 'em_andamento', worker = 'worker-b', lease_expires = ?, "
+                     "attempts = 1 WHERE name = 'org/c'", (fila_distribuida.time.time() + 1,))
+
+    fila_distribuida.trabalhar(queue_path, max_workers=1)
+
+    counts = WorkQueue(queue_path).counts()
+    assert counts == {'concluido': 2, 'falhou': 1}
+    with open(main.FAILED_REPOS_FILE, 'r', encoding='utf-8') as f:
+        failed = json.load(f)
+    assert [(failure['name'], failure['falha'], failure['definitiva']) for failure in failed] == \
+        [('org/inexistente', 'clone_falha', True)]
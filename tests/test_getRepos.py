@@ -0,0 +1,187 @@
+import re
+import json
+import math
+import time
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import getRepos
+import agendador_requisicoes
+from agendador_requisicoes import RequestScheduler
+
+SEM_LIMITE = {'cost': 1, 'remaining': 5000, 'resetAt': '2099-01-01T00:00:00Z'}
+
+class ServidorGraphQL:
+    """
+    Servidor GraphQL falso com a busca de repositórios do GitHub: responde a
+    COUNT_QUERY e à QUERY paginada (cursor = posição na faixa) e informa
+    rateLimit em cada resposta. Respostas roteirizadas em 'respostas'
+    (status, cabeçalhos, corpo) são devolvidas antes das normais; as páginas
+    de faixas que começam em 'faixas_com_erro' respondem com erro GraphQL.
+    """
+    def __init__(self, repositorios=()):
+        self.repositorios = list(repositorios)  # (nameWithOwner, estrelas)
+        self.respostas = deque()
+        self.faixas_com_erro = set()
+        self.rate_limit = dict(SEM_LIMITE)
+        self.requisicoes = []  # (instante, Authorization, corpo)
+        self._lock = threading.Lock()
+
+    def _faixa(self, q):
+        low, high = map(int, re.search(r'stars:(\d+)\.\.(\d+)', q).groups())
+        return sorted((repo for repo in self.repositorios if low <= repo[1] <= high), key=lambda repo: -repo[1])
+
+    def _buscar(self, query, variables):
+        found = self._faixa(variables['q'])
+        if 'pageInfo' not in query:
+            return {'search': {'repositoryCount': len(found)}}
+        if int(re.search(r'stars:(\d+)', variables['q']).group(1)) in self.faixas_com_erro:
+            return None
+        start = int(variables.get('cursor') or 0)
+        end = start + variables['first']
+        edges = [{'node': {'nameWithOwner': name, 'stargazerCount': stars, 'createdAt': '2015-01-01T00:00:00Z',
+                           'releases': {'totalCount': 0}}} for name, stars in found[start:end]]
+        return {'search': {'pageInfo': {'endCursor': str(end), 'hasNextPage': end < len(found)}, 'edges': edges}}
+
+    def responder(self, body, authorization):
+        with self._lock:
+            self.requisicoes.append((time.monotonic(), authorization, body))
+            if self.respostas:
+                return self.respostas.popleft()
+            rate_limit = dict(self.rate_limit)
+        data = self._buscar(body['query'], body['variables'])
+        if data is None:
+            return 200, {}, {'errors': [{'message': 'Something went wrong while executing your query.'}]}
+        data['rateLimit'] = rate_limit
+        return 200, {}, {'data': data}
+
+    @property
+    def intervalos(self):
+        instantes = [instante for instante, _, _ in self.requisicoes]
+        return [b - a for a, b in zip(instantes, instantes[1:])]
+
+@pytest.fixture
+def servidor(monkeypatch):
+    monkeypatch.setenv('NO_PROXY', '127.0.0.1')
+    fake = ServidorGraphQL()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            status, headers, payload = fake.responder(body, self.headers.get('Authorization'))
+            content = (payload if isinstance(payload, str) else json.dumps(payload)).encode('utf-8')
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, *args):
+            pass
+
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    fake.url = f"http://127.0.0.1:{http_server.server_port}/graphql"
+    yield fake
+    http_server.shutdown()
+    http_server.server_close()
+
+def _agendador(servidor, tokens=('',), **kwargs):
+    return RequestScheduler(list(tokens), servidor.url, base_backoff=0.01, **kwargs)
+
+def test_coleta_divide_faixas_cheias_e_remove_duplicatas(servidor, monkeypatch):
+    monkeypatch.setattr(getRepos, '_schedulers', {})
+    monkeypatch.setattr(getRepos, 'SEARCH_RESULT_LIMIT', 10)
+    monkeypatch.setattr(getRepos, 'PAGE_SIZE', 4)
+    servidor.repositorios = [(f"org/repo{stars}", stars) for stars in range(100, 140)]
+    # Estrelas que mudam entre consultas: o mesmo repositório aparece em dois fragmentos
+    servidor.repositorios.append(('org/repo100', 135))
+
+    repos = getRepos.collect_java_repos(100, 139, max_workers=4, url=servidor.url)
+
+    assert sorted(repo['name'] for repo in repos) == sorted(f"org/repo{stars}" for stars in range(100, 140))
+    assert [repo['stars'] for repo in repos] == sorted((repo['stars'] for repo in repos), reverse=True)
+    paginas = [body['variables'] for _, _, body in servidor.requisicoes if 'pageInfo' in body['query']]
+    # Nenhum fragmento paginado atinge o limite de resultados da busca
+    assert paginas and all(len(servidor._faixa(variables['q'])) < 10 for variables in paginas)
+    assert all('rateLimit' in body['query'] for _, _, body in servidor.requisicoes)
+    assert getRepos.get_scheduler(servidor.url).stats['points'] == len(servidor.requisicoes)
+
+def test_fragmento_com_falha_torna_a_coleta_incompleta(servidor, monkeypatch):
+    monkeypatch.setattr(getRepos, '_schedulers', {})
+    monkeypatch.setattr(getRepos, 'SEARCH_RESULT_LIMIT', 10)
+    servidor.repositorios = [(f"org/repo{stars}", stars) for stars in range(100, 140)]
+    servidor.faixas_com_erro = {100}
+
+    with pytest.raises(getRepos.ColetaIncompleta) as excinfo:
+        getRepos.collect_java_repos(100, 139, max_workers=4, url=servidor.url)
+
+    (low, high), = excinfo.value.failed_shards
+    assert low == 100
+    coletados = {repo['stars'] for repo in excinfo.value.repos}
+    assert coletados == set(range(high + 1, 140))
+
+def test_retry_after_pausa_o_token_pelo_tempo_indicado(servidor):
+    servidor.respostas.append((403, {'Retry-After': '1'}, 'You have exceeded a secondary rate limit'))
+    agendador = _agendador(servidor)
+
+    result = agendador.execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+
+    assert result['data']['search']['repositoryCount'] == 0
+    assert len(servidor.requisicoes) == 2
+    assert servidor.intervalos[0] >= 0.9
+    assert agendador.stats['wait_time'] >= 0.9
+
+def test_limite_secundario_sem_retry_after_espera_o_minimo(servidor, monkeypatch):
+    monkeypatch.setattr(agendador_requisicoes, 'SECONDARY_LIMIT_WAIT', 0.5)
+    servidor.respostas.append((429, {}, 'Too Many Requests'))
+
+    _agendador(servidor).execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+
+    assert len(servidor.requisicoes) == 2
+    assert servidor.intervalos[0] >= 0.4
+
+def test_retry_after_pausa_apenas_o_token_afetado(servidor):
+    servidor.respostas.append((403, {'Retry-After': '60'}, 'You have exceeded a secondary rate limit'))
+    agendador = _agendador(servidor, tokens=('token-a', 'token-b'))
+
+    agendador.execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+
+    assert len(servidor.requisicoes) == 2
+    assert servidor.requisicoes[0][1] != servidor.requisicoes[1][1]
+    assert servidor.intervalos[0] < 5
+
+def test_saldo_baixo_espera_o_reset(servidor):
+    reset = math.ceil(time.time()) + 2
+    servidor.rate_limit = {'cost': 1, 'remaining': agendador_requisicoes.MIN_REMAINING - 1,
+                           'resetAt': datetime.fromtimestamp(reset, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')}
+    agendador = _agendador(servidor)
+
+    agendador.execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+    servidor.rate_limit = dict(SEM_LIMITE)
+    agendador.execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+
+    assert time.time() >= reset
+    assert servidor.intervalos[0] >= 1.5
+
+def test_erros_transitorios_sao_repetidos_com_backoff(servidor):
+    servidor.respostas.extend([(502, {}, 'Bad Gateway'), (503, {}, 'Service Unavailable')])
+
+    result = _agendador(servidor).execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+
+    assert 'data' in result
+    assert len(servidor.requisicoes) == 3
+
+def test_desiste_apos_o_limite_de_tentativas(servidor):
+    servidor.respostas.extend([(502, {}, 'Bad Gateway')] * 3)
+
+    with pytest.raises(Exception, match='2 tentativas'):
+        _agendador(servidor, max_retries=2).execute(getRepos.COUNT_QUERY, {'q': getRepos.star_query(1, 10)})
+    assert len(servidor.requisicoes) == 2
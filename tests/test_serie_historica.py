@@ -0,0 +1,96 @@
+import csv
+
+import pytest
+
+from conftest import git, publicar_commit
+
+def _fonte(campos):
+    return 'package app;\npublic class Pedido {\n' + ''.join(f"    int campo{i};\n" for i in range(campos)) + '}\n'
+
+@pytest.fixture
+def historico(repositorio_bare):
+    """
+    org/app com commits em 2019 (dois), 2021 e 2022, nenhum em 2020. Tags:
+    v1.0 (anotada) no segundo commit de 2019 e v1.1 (leve) no de 2021.
+
+    Returns:
+        list: SHAs dos commits, do mais antigo ao HEAD
+    """
+    bare_path = repositorio_bare('org/app', {'src/app/Pedido.java': _fonte(1), 'README.md': 'Teste\n'},
+                                 data='2019-03-10T12:00:00Z')
+    publicar_commit(bare_path, {'src/app/Pedido.java': _fonte(2)}, data='2019-11-20T12:00:00Z', tag='v1.0')
+    publicar_commit(bare_path, {'src/app/Cliente.java': 'package app;\npublic class Cliente {}\n'},
+                    data='2021-05-05T12:00:00Z')
+    publicar_commit(bare_path, {'src/app/Pedido.java': _fonte(3)}, data='2022-02-01T12:00:00Z')
+    commits = git('-C', str(bare_path), 'log', '--format=%H', 'main').split()[::-1]
+    git('-C', str(bare_path), 'tag', 'v1.1', commits[2])
+    return commits
+
+@pytest.fixture
+def serie_historica(modulo_main):
+    """O módulo importa main.py: importado só depois do chdir para tmp_path."""
+    import serie_historica
+    return serie_historica
+
+@pytest.fixture
+def clone_historico(tmp_path, historico, repositorio_bare, serie_historica):
+    clone_path = tmp_path / 'clone_historico'
+    serie_historica.clonar_historico(f"file://{repositorio_bare.raiz}/org/app.git", str(clone_path))
+    return str(clone_path)
+
+def _versoes(snapshots):
+    return [(snapshot['versao'], snapshot['commit']) for snapshot in snapshots]
+
+def test_versoes_anuais_pulam_anos_sem_commits(historico, clone_historico, serie_historica):
+    assert _versoes(serie_historica.selecionar_versoes(clone_historico, 'anual')) == \
+        [('2019', historico[1]), ('2021', historico[2]), ('2022', historico[3])]
+    # created_at posterior ao primeiro commit: a série começa no ano da criação
+    assert _versoes(serie_historica.selecionar_versoes(clone_historico, 'anual', created_at='2021-01-15')) == \
+        [('2021', historico[2]), ('2022', historico[3])]
+    # Amostragem: a primeira e a última versão sempre ficam
+    assert _versoes(serie_historica.selecionar_versoes(clone_historico, 'anual', max_snapshots=2)) == \
+        [('2019', historico[1]), ('2022', historico[3])]
+
+def test_versoes_por_tag_anotada_e_leve_mais_o_head(historico, clone_historico, serie_historica):
+    assert _versoes(serie_historica.selecionar_versoes(clone_historico, 'tags')) == \
+        [('v1.0', historico[1]), ('v1.1', historico[2]), ('HEAD', historico[3])]
+
+def _linhas(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+def test_retomada_nao_clona_repositorios_completos(tmp_path, historico, pipeline, repositorio_bare, serie_historica,
+                                                   monkeypatch):
+    pipeline(tmp_path / 'execucao', repositorio_bare.raiz)
+    saida = str(tmp_path / 'serie.csv')
+    clones = []
+    clonar_historico = serie_historica.clonar_historico
+    monkeypatch.setattr(serie_historica, 'clonar_historico',
+                        lambda *args, **kwargs: clones.append(args[0]) or clonar_historico(*args, **kwargs))
+
+    def executar():
+        analise = serie_historica.AnaliseHistorica(saida, 'anual', 10, clone_dir=str(tmp_path / 'clones'))
+        analise.executar([('org/app', None)], 2, 1)
+        return analise
+
+    primeira = executar()
+    linhas = _linhas(saida)
+    assert primeira.analyzed.value == 3 and len(clones) == 1
+    # As versões são gravadas conforme terminam, em qualquer ordem
+    assert sorted((linha['versao'], linha['commit'], linha['classes']) for linha in linhas) == \
+        [('2019', historico[1], '1'), ('2021', historico[2], '2'), ('2022', historico[3], '2')]
+
+    # Todas as versões escolhidas já estão no CSV: nem clone nem CK
+    segunda = executar()
+    assert segunda.analyzed.value == 0 and len(clones) == 1
+    assert _linhas(saida) == linhas
+
+    # Uma versão faltando: clona de novo e analisa só ela
+    with open(saida, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=serie_historica.HISTORY_CSV_HEADER)
+        writer.writeheader()
+        writer.writerows(linhas[:2])
+    terceira = executar()
+    assert terceira.analyzed.value == 1 and len(clones) == 2
+    assert sorted(map(tuple, (linha.values() for linha in _linhas(saida)))) == \
+        sorted(map(tuple, (linha.values() for linha in linhas)))
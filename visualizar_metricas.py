@@ -1,36 +1,62 @@
+import time
+INICIO_IMPORTACOES = time.perf_counter()
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 import numpy as np
 import json
-from matplotlib.patches import Rectangle
+import os
+import hashlib
+import inspect
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
+from catalogo import RepositoryCatalog, CATALOG_FILE
+import dados_metricas
+from analise_metricas import (calcular_analise, METRICAS_QUALIDADE_MEDIA, METRICAS_QUALIDADE_TOTAL,
+                             METRICAS_REPOSITORIO, PARES_RQ, N_BOOTSTRAP)
+FIM_IMPORTACOES = time.perf_counter()
 
-# Configurações do Seaborn
-sns.set_style("whitegrid")
-sns.set_palette("husl")
-plt.rcParams['figure.figsize'] = (12, 8)
-plt.rcParams['font.size'] = 10
+# Uso:
+#   python visualizar_metricas.py stats [--bootstrap [N]]   estatísticas, sem importar matplotlib/seaborn
+#                                    (intervalos de confiança só com --bootstrap: N padrão = N_BOOTSTRAP)
+#   python visualizar_metricas.py plot scatter ranking [--modo rapido] [--forcar]
+#   python visualizar_metricas.py all [--modo publicacao_pdf] [--bootstrap [N]]   (padrão sem subcomando)
 
-def carregar_dados():
-    """Carrega e combina os dados do CSV e JSON"""
+# matplotlib/seaborn (≈1 s de importação) só são carregados quando uma figura é pedida
+plt = None
+sns = None
+Rectangle = None
+
+def _importar_plotagem():
+    """Importa e configura matplotlib/seaborn na primeira figura do processo"""
+    global plt, sns, Rectangle
+    if plt is not None:
+        return
+    import matplotlib.pyplot as pyplot
+    import seaborn
+    from matplotlib.patches import Rectangle as retangulo
+
+    # Configurações do Seaborn
+    seaborn.set_style("whitegrid")
+    seaborn.set_palette("husl")
+    pyplot.rcParams['figure.figsize'] = (12, 8)
+    pyplot.rcParams['font.size'] = 10
+    plt, sns, Rectangle = pyplot, seaborn, retangulo
+
+def carregar_dados(usar_cache=True):
+    """
+    Carrega e combina os dados do CSV e JSON (ou catálogo SQLite) em uma tabela
+    compacta; com usar_cache, reaproveita a cópia Arrow da execução anterior
+    """
     try:
-        # Carregar dados de métricas de qualidade
-        df_metricas = pd.read_csv('resultados_metricas.csv')
-        print(f"Métricas de qualidade carregadas: {len(df_metricas)} repositórios")
-        
-        # Carregar dados do repositório (JSON)
-        with open('repo.json', 'r', encoding='utf-8') as f:
-            repos_data = json.load(f)
-        
-        # Converter para DataFrame
-        df_repos = pd.DataFrame(repos_data)
-        print(f"Dados de repositórios carregados: {len(df_repos)} repositórios")
-        
-        # Combinar os dados usando o nome do repositório
-        df_combined = pd.merge(df_metricas, df_repos, left_on='repo_name', right_on='name', how='inner')
-        print(f"Dados combinados com sucesso: {len(df_combined)} repositórios")
-        
+        catalogo = RepositoryCatalog(CATALOG_FILE) if Path(CATALOG_FILE).exists() else None
+        df_combined, origem = dados_metricas.carregar_tabela(
+            'resultados_metricas.csv', 'repo.json', catalogo,
+            cache_path=dados_metricas.CACHE_FILE if usar_cache else None)
+        if origem == 'cache':
+            print(f"Dados combinados lidos do cache '{dados_metricas.CACHE_FILE}'")
+        print(f"Dados combinados com sucesso: {len(df_combined)} repositórios "
+              f"({df_combined.memory_usage(deep=True).sum() / 1024 ** 2:.1f} MB em memória)")
+
         return df_combined
     except FileNotFoundError as e:
         print(f"ERRO: Arquivo não encontrado - {e}")
@@ -39,9 +65,36 @@ def carregar_dados():
         print(f"ERRO ao carregar dados: {e}")
         return None
 
-def criar_histogramas_completos(df):
-    """Cria histogramas para todas as métricas"""
+# Acima deste número de repositórios os gráficos passam ao modo agregado:
+# densidade 2D (hexbin), tendência por quantis e KDE ajustado na amostra
+LIMITE_MODO_AGREGADO = 20000
+
+def modo_agregado(analise):
+    return len(analise.dados) > LIMITE_MODO_AGREGADO
+
+def _histograma(ax, analise, valores, bins):
+    """Histograma com KDE; no modo agregado o KDE é ajustado apenas na amostra. Retorna o rótulo do eixo y"""
+    if not modo_agregado(analise):
+        sns.histplot(data=valores, bins=bins, kde=True, ax=ax)
+        return 'Frequência'
+    # Contagem por faixas é O(N); o KDE (custo N x pontos de avaliação) usa a amostra de tamanho fixo
+    sns.histplot(data=valores, bins=bins, stat='density', ax=ax)
+    sns.kdeplot(data=valores.iloc[analise.amostra], ax=ax, linewidth=2)
+    return 'Densidade'
+
+def salvar_figura(nome, descricao, formato='png', dpi=600):
+    """Salva a figura atual em graficos/<nome>.<formato> e a fecha"""
     Path('graficos').mkdir(exist_ok=True)
+    caminho = f'graficos/{nome}.{formato}'
+    plt.savefig(caminho, dpi=dpi, bbox_inches='tight')
+    plt.close()
+    print(f"✓ {descricao} como '{caminho}'")
+    return caminho
+
+def criar_histogramas_completos(analise, formato='png', dpi=600):
+    """Cria histogramas para todas as métricas"""
+    _importar_plotagem()
+    df = analise.dados
     
     # Histogramas para métricas de qualidade (médias)
     fig, axes = plt.subplots(2, 3, figsize=(24, 16))
@@ -53,10 +106,10 @@ def criar_histogramas_completos(df):
     
     for i, (metrica, titulo) in enumerate(zip(metricas_qualidade, titulos_qualidade)):
         bins = min(30, max(10, len(df) // 20))
-        sns.histplot(data=df, x=metrica, bins=bins, kde=True, ax=axes[0, i])
+        rotulo_y = _histograma(axes[0, i], analise, df[metrica], bins)
         axes[0, i].set_title(f'{titulo}', fontweight='bold', fontsize=14)
         axes[0, i].set_xlabel(f'{titulo}', fontsize=12)
-        axes[0, i].set_ylabel('Frequência', fontsize=12)
+        axes[0, i].set_ylabel(rotulo_y, fontsize=12)
     
     # Métricas do repositório
     metricas_repo = ['stars', 'releases', 'age_years']
@@ -67,22 +120,24 @@ def criar_histogramas_completos(df):
         if metrica == 'stars':
             # Usar escala log para stars devido à grande variação
             data_log = np.log1p(df[metrica])
-            sns.histplot(data=data_log, bins=bins, kde=True, ax=axes[1, i])
+            rotulo_y = _histograma(axes[1, i], analise, data_log, bins)
             axes[1, i].set_xlabel(f'{titulo} (Log Scale)', fontsize=12)
         else:
-            sns.histplot(data=df, x=metrica, bins=bins, kde=True, ax=axes[1, i])
+            rotulo_y = _histograma(axes[1, i], analise, df[metrica], bins)
             axes[1, i].set_xlabel(f'{titulo}', fontsize=12)
         
         axes[1, i].set_title(f'{titulo}', fontweight='bold', fontsize=14)
-        axes[1, i].set_ylabel('Frequência', fontsize=12)
+        axes[1, i].set_ylabel(rotulo_y, fontsize=12)
     
     plt.tight_layout()
-    plt.savefig('graficos/histogramas_todas_metricas.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Histogramas completos salvos como 'graficos/histogramas_todas_metricas.png'")
+    return salvar_figura('histogramas_todas_metricas', "Histogramas completos salvos", formato, dpi)
 
-def criar_boxplots_completos(df):
+def criar_boxplots_completos(analise, formato='png', dpi=600):
     """Cria boxplots para todas as métricas"""
+    _importar_plotagem()
+    df = analise.dados
+    # No modo agregado, milhares de outliers individuais dominariam o tempo de desenho
+    mostrar_outliers = not modo_agregado(analise)
     fig, axes = plt.subplots(2, 3, figsize=(24, 16))
     fig.suptitle('Boxplots de Todas as Métricas', fontsize=20, fontweight='bold')
     
@@ -91,10 +146,10 @@ def criar_boxplots_completos(df):
     titulos_qualidade = ['CBO (Média)', 'DIT (Média)', 'LCOM (Média)']
     
     for i, (metrica, titulo) in enumerate(zip(metricas_qualidade, titulos_qualidade)):
-        sns.boxplot(data=df, y=metrica, ax=axes[0, i], palette='Set2')
+        sns.boxplot(data=df, y=metrica, ax=axes[0, i], palette='Set2', showfliers=mostrar_outliers)
         axes[0, i].set_title(titulo, fontweight='bold', fontsize=14)
         axes[0, i].set_ylabel('Valor', fontsize=12)
-        mean_val = df[metrica].mean()
+        mean_val = analise.resumo[metrica]['media']
         axes[0, i].text(0.02, 0.98, f'Média: {mean_val:.2f}', transform=axes[0, i].transAxes, 
                        verticalalignment='top', bbox=dict(boxstyle='round', facecolor='wheat', alpha=0.8))
     
@@ -103,7 +158,7 @@ def criar_boxplots_completos(df):
     titulos_repo = ['Stars', 'Releases', 'Idade (Anos)']
     
     for i, (metrica, titulo) in enumerate(zip(metricas_repo, titulos_repo)):
-        sns.boxplot(data=df, y=metrica, ax=axes[1, i], palette='Set1')
+        sns.boxplot(data=df, y=metrica, ax=axes[1, i], palette='Set1', showfliers=mostrar_outliers)
         axes[1, i].set_title(titulo, fontweight='bold', fontsize=14)
         
         if metrica == 'stars':
@@ -112,22 +167,17 @@ def criar_boxplots_completos(df):
         else:
             axes[1, i].set_ylabel('Valor', fontsize=12)
         
-        mean_val = df[metrica].mean()
+        mean_val = analise.resumo[metrica]['media']
         axes[1, i].text(0.02, 0.98, f'Média: {mean_val:.0f}', transform=axes[1, i].transAxes, 
                        verticalalignment='top', bbox=dict(boxstyle='round', facecolor='lightblue', alpha=0.8))
     
     plt.tight_layout()
-    plt.savefig('graficos/boxplots_todas_metricas.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Boxplots completos salvos como 'graficos/boxplots_todas_metricas.png'")
+    return salvar_figura('boxplots_todas_metricas', "Boxplots completos salvos", formato, dpi)
 
-def criar_matriz_correlacao_completa(df):
+def criar_matriz_correlacao_completa(analise, formato='png', dpi=600):
     """Cria matriz de correlação entre todas as métricas"""
-    # Selecionar todas as métricas numéricas
-    metricas = ['cbo_mean', 'dit_mean', 'lcom_mean', 'cbo_total', 'dit_total', 'lcom_total', 
-                'stars', 'releases', 'age_years']
-    
-    correlation_matrix = df[metricas].corr()
+    _importar_plotagem()
+    correlation_matrix = analise.matriz('pearson')
     
     plt.figure(figsize=(14, 12))
     
@@ -153,12 +203,24 @@ def criar_matriz_correlacao_completa(df):
     plt.yticks(range(len(labels)), labels, rotation=0, fontsize=11)
     
     plt.tight_layout()
-    plt.savefig('graficos/matriz_correlacao_completa.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Matriz de correlação completa salva como 'graficos/matriz_correlacao_completa.png'")
+    return salvar_figura('matriz_correlacao_completa', "Matriz de correlação completa salva", formato, dpi)
 
-def criar_scatter_plots_correlacoes(df):
+def _densidade_2d(ax, analise, x_col, y_col, escala_log=False):
+    """Densidade 2D (hexbin) com a mediana e o intervalo interquartil de y por faixa de quantis de x"""
+    x = analise.dados[x_col].to_numpy()
+    if escala_log:
+        x = np.maximum(x, 1)
+    hexbin = ax.hexbin(x, analise.dados[y_col].to_numpy(), gridsize=60, bins='log', mincnt=1, cmap='viridis',
+                       xscale='log' if escala_log else 'linear')
+    plt.colorbar(hexbin, ax=ax, label='Repositórios (log)')
+    quantis = analise.tendencias_quantis[(x_col, y_col)]
+    ax.fill_between(quantis['x'], quantis['p25'], quantis['p75'], color='red', alpha=0.2)
+    ax.plot(quantis['x'], quantis['mediana'], "r-", alpha=0.9, linewidth=2)
+
+def criar_scatter_plots_correlacoes(analise, formato='png', dpi=600):
     """Cria scatter plots para correlações interessantes"""
+    _importar_plotagem()
+    df = analise.dados
     # Correlações entre métricas de qualidade e características do repositório
     fig, axes = plt.subplots(2, 3, figsize=(24, 16))
     fig.suptitle('Correlações entre Métricas de Qualidade e Características do Repositório', 
@@ -177,7 +239,10 @@ def criar_scatter_plots_correlacoes(df):
         row = i // 3
         col = i % 3
         
-        sns.scatterplot(data=df, x=x_col, y=y_col, ax=axes[row, col], alpha=0.7, s=60)
+        if modo_agregado(analise):
+            _densidade_2d(axes[row, col], analise, x_col, y_col, escala_log=x_col == 'stars')
+        else:
+            sns.scatterplot(data=df, x=x_col, y=y_col, ax=axes[row, col], alpha=0.7, s=60)
         axes[row, col].set_title(titulo, fontweight='bold', fontsize=14)
         axes[row, col].set_xlabel(x_col.replace('_', ' ').title(), fontsize=12)
         axes[row, col].set_ylabel(y_col.replace('_', ' ').title(), fontsize=12)
@@ -186,28 +251,26 @@ def criar_scatter_plots_correlacoes(df):
         if x_col == 'stars':
             axes[row, col].set_xscale('log')
         
-        # Adicionar linha de tendência
-        if len(df) > 1:
-            z = np.polyfit(df[x_col], df[y_col], 1)
-            p = np.poly1d(z)
-            axes[row, col].plot(df[x_col], p(df[x_col]), "r--", alpha=0.8, linewidth=2)
+        # Adicionar linha de tendência (coeficientes pré-calculados)
+        if len(df) > 1 and not modo_agregado(analise):
+            inclinacao, intercepto = analise.tendencias[(x_col, y_col)]
+            x_linha = np.linspace(analise.resumo[x_col]['minimo'], analise.resumo[x_col]['maximo'], 200)
+            axes[row, col].plot(x_linha, inclinacao * x_linha + intercepto, "r--", alpha=0.8, linewidth=2)
         
-        # Calcular e mostrar correlação
-        corr = df[x_col].corr(df[y_col])
+        # Mostrar correlação
+        corr = analise.correlacao(x_col, y_col)
         axes[row, col].text(0.05, 0.95, f'r = {corr:.3f}', transform=axes[row, col].transAxes,
                            bbox=dict(boxstyle='round', facecolor='white', alpha=0.9), fontsize=11)
     
     plt.tight_layout()
-    plt.savefig('graficos/scatter_correlacoes_qualidade_repo.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Scatter plots de correlações salvos como 'graficos/scatter_correlacoes_qualidade_repo.png'")
+    return salvar_figura('scatter_correlacoes_qualidade_repo', "Scatter plots de correlações salvos", formato, dpi)
 
-def criar_grafico_popularidade_qualidade(df):
+def criar_grafico_popularidade_qualidade(analise, formato='png', dpi=600):
     """Cria gráfico relacionando popularidade (stars) com qualidade de código"""
-    # Criar categorias de popularidade
-    df['categoria_stars'] = pd.cut(df['stars'], 
-                                   bins=[0, 1000, 10000, 50000, float('inf')],
-                                   labels=['Baixa (<1K)', 'Média (1K-10K)', 'Alta (10K-50K)', 'Muito Alta (>50K)'])
+    _importar_plotagem()
+    # Cópia com as categorias de popularidade
+    df = analise.tabela()
+    mostrar_outliers = not modo_agregado(analise)
     
     fig, axes = plt.subplots(1, 3, figsize=(24, 8))
     fig.suptitle('Qualidade de Código por Categoria de Popularidade (Stars)', 
@@ -217,73 +280,54 @@ def criar_grafico_popularidade_qualidade(df):
     titulos = ['CBO (Média)', 'DIT (Média)', 'LCOM (Média)']
     
     for i, (metrica, titulo) in enumerate(zip(metricas, titulos)):
-        sns.boxplot(data=df, x='categoria_stars', y=metrica, ax=axes[i], palette='viridis')
+        sns.boxplot(data=df, x='categoria_stars', y=metrica, ax=axes[i], palette='viridis', showfliers=mostrar_outliers)
         axes[i].set_title(titulo, fontweight='bold', fontsize=14)
         axes[i].set_xlabel('Categoria de Popularidade', fontsize=12)
         axes[i].set_ylabel('Valor da Métrica', fontsize=12)
         axes[i].tick_params(axis='x', rotation=45)
     
     plt.tight_layout()
-    plt.savefig('graficos/qualidade_por_popularidade.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Gráfico de qualidade por popularidade salvo como 'graficos/qualidade_por_popularidade.png'")
+    return salvar_figura('qualidade_por_popularidade', "Gráfico de qualidade por popularidade salvo", formato, dpi)
 
-def criar_grafico_idade_metricas(df):
+def criar_grafico_idade_metricas(analise, formato='png', dpi=600):
     """Cria gráfico relacionando idade do repositório com métricas"""
-    # Criar categorias de idade
-    df['categoria_idade'] = pd.cut(df['age_years'], 
-                                   bins=[0, 2, 5, 10, float('inf')],
-                                   labels=['Novo (0-2 anos)', 'Jovem (2-5 anos)', 'Maduro (5-10 anos)', 'Antigo (>10 anos)'])
+    _importar_plotagem()
+    # Cópia com as categorias de idade
+    df = analise.tabela()
+    mostrar_outliers = not modo_agregado(analise)
     
     fig, axes = plt.subplots(2, 2, figsize=(20, 16))
     fig.suptitle('Métricas por Categoria de Idade do Repositório', 
                  fontsize=18, fontweight='bold')
     
     # Métricas de qualidade por idade
-    sns.boxplot(data=df, x='categoria_idade', y='cbo_mean', ax=axes[0, 0], palette='plasma')
+    sns.boxplot(data=df, x='categoria_idade', y='cbo_mean', ax=axes[0, 0], palette='plasma', showfliers=mostrar_outliers)
     axes[0, 0].set_title('CBO (Média) por Idade', fontweight='bold', fontsize=14)
     axes[0, 0].tick_params(axis='x', rotation=45)
     
-    sns.boxplot(data=df, x='categoria_idade', y='dit_mean', ax=axes[0, 1], palette='plasma')
+    sns.boxplot(data=df, x='categoria_idade', y='dit_mean', ax=axes[0, 1], palette='plasma', showfliers=mostrar_outliers)
     axes[0, 1].set_title('DIT (Média) por Idade', fontweight='bold', fontsize=14)
     axes[0, 1].tick_params(axis='x', rotation=45)
     
     # Stars e releases por idade
-    sns.boxplot(data=df, x='categoria_idade', y='stars', ax=axes[1, 0], palette='viridis')
+    sns.boxplot(data=df, x='categoria_idade', y='stars', ax=axes[1, 0], palette='viridis', showfliers=mostrar_outliers)
     axes[1, 0].set_title('Stars por Idade', fontweight='bold', fontsize=14)
     axes[1, 0].set_yscale('log')
     axes[1, 0].tick_params(axis='x', rotation=45)
     
-    sns.boxplot(data=df, x='categoria_idade', y='releases', ax=axes[1, 1], palette='viridis')
+    sns.boxplot(data=df, x='categoria_idade', y='releases', ax=axes[1, 1], palette='viridis', showfliers=mostrar_outliers)
     axes[1, 1].set_title('Releases por Idade', fontweight='bold', fontsize=14)
     axes[1, 1].tick_params(axis='x', rotation=45)
     
     plt.tight_layout()
-    plt.savefig('graficos/metricas_por_idade.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Gráfico de métricas por idade salvo como 'graficos/metricas_por_idade.png'")
+    return salvar_figura('metricas_por_idade', "Gráfico de métricas por idade salvo", formato, dpi)
 
-def criar_ranking_repositorios(df):
+def criar_ranking_repositorios(analise, formato='png', dpi=600):
     """Cria ranking dos repositórios considerando múltiplas métricas"""
-    # Calcular score composto (normalizado)
-    df_norm = df.copy()
-    
-    # Normalizar métricas (0-1)
-    metricas_para_normalizar = ['stars', 'releases', 'age_years', 'cbo_mean', 'dit_mean', 'lcom_mean']
-    
-    for metrica in metricas_para_normalizar:
-        min_val = df_norm[metrica].min()
-        max_val = df_norm[metrica].max()
-        if max_val > min_val:
-            df_norm[f'{metrica}_norm'] = (df_norm[metrica] - min_val) / (max_val - min_val)
-        else:
-            df_norm[f'{metrica}_norm'] = 0
-    
-    # Score de popularidade (stars + releases)
-    df_norm['score_popularidade'] = (df_norm['stars_norm'] + df_norm['releases_norm']) / 2
-    
-    # Score de qualidade (inverso das métricas de qualidade - menores valores são melhores)
-    df_norm['score_qualidade'] = (3 - (df_norm['cbo_mean_norm'] + df_norm['dit_mean_norm'] + df_norm['lcom_mean_norm'])) / 3
+    _importar_plotagem()
+    # Scores compostos (normalizados) já calculados na análise; nomes como texto para o
+    # seaborn não criar uma barra por categoria do DataFrame inteiro
+    df_norm = analise.tabela().astype({'repo_name': str})
     
     # Top 20 por popularidade
     top_popularidade = df_norm.nlargest(20, 'score_popularidade')
@@ -305,11 +349,102 @@ def criar_ranking_repositorios(df):
     axes[1].set_ylabel('Repositório', fontsize=12)
     
     plt.tight_layout()
-    plt.savefig('graficos/ranking_repositorios.png', dpi=600, bbox_inches='tight')
-    plt.close()
-    print("✓ Ranking de repositórios salvo como 'graficos/ranking_repositorios.png'")
+    return salvar_figura('ranking_repositorios', "Ranking de repositórios salvo", formato, dpi)
+
+# Figuras: função de criação e colunas de entrada (usadas na chave do cache)
+
+FIGURAS = {
+    'histogramas': (criar_histogramas_completos, METRICAS_QUALIDADE_MEDIA + METRICAS_REPOSITORIO),
+    'boxplots': (criar_boxplots_completos, METRICAS_QUALIDADE_MEDIA + METRICAS_REPOSITORIO),
+    'correlacao': (criar_matriz_correlacao_completa,
+                   METRICAS_QUALIDADE_MEDIA + METRICAS_QUALIDADE_TOTAL + METRICAS_REPOSITORIO),
+    'scatter': (criar_scatter_plots_correlacoes, METRICAS_QUALIDADE_MEDIA + METRICAS_REPOSITORIO),
+    'popularidade': (criar_grafico_popularidade_qualidade, ['stars'] + METRICAS_QUALIDADE_MEDIA),
+    'idade': (criar_grafico_idade_metricas, ['age_years', 'cbo_mean', 'dit_mean', 'stars', 'releases']),
+    'ranking': (criar_ranking_repositorios, ['repo_name'] + METRICAS_QUALIDADE_MEDIA + METRICAS_REPOSITORIO),
+}
 
-def gerar_estatisticas_completas(df):
+# Modos de saída: (formato, dpi)
+MODOS_SAIDA = {
+    'padrao': ('png', 600),
+    'rapido': ('png', 100),       # pré-visualização
+    'publicacao_svg': ('svg', 600),
+    'publicacao_pdf': ('pdf', 600),
+}
+
+ARQUIVO_CACHE_FIGURAS = 'graficos/.cache_figuras.json'
+
+# Código usado por todas as figuras: uma mudança nele invalida o cache de todas
+FUNCOES_COMPARTILHADAS = (_importar_plotagem, modo_agregado, _histograma, _densidade_2d, salvar_figura)
+
+def chave_figura(nome, analise, formato, dpi):
+    """Hash das colunas de entrada, dos parâmetros e do código da função de criação e dos auxiliares"""
+    funcao, colunas = FIGURAS[nome]
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([nome, formato, dpi, LIMITE_MODO_AGREGADO]).encode('utf-8'))
+    for codigo in (funcao, *FUNCOES_COMPARTILHADAS):
+        hasher.update(inspect.getsource(codigo).encode('utf-8'))
+    hasher.update(pd.util.hash_pandas_object(analise.dados[colunas], index=False).to_numpy().tobytes())
+    return hasher.hexdigest()
+
+def _renderizar_figura(nome, analise, formato, dpi):
+    """Executada em um processo do pool: cria uma figura e mede o tempo"""
+    inicio = time.perf_counter()
+    caminho = FIGURAS[nome][0](analise, formato=formato, dpi=dpi)
+    return nome, caminho, time.perf_counter() - inicio
+
+def renderizar_figuras(analise, nomes=None, formato='png', dpi=600, workers=None, forcar=False):
+    """
+    Renderiza as figuras em um pool de processos, pulando as que não mudaram.
+
+    Cada figura é identificada por um hash das suas colunas de entrada, do
+    formato/DPI e do código da função; se o hash coincidir com o do cache e o
+    arquivo existir, a figura não é redesenhada.
+
+    Returns:
+        dict: nome -> (caminho, tempo em segundos ou None se veio do cache)
+    """
+    nomes = list(nomes or FIGURAS)
+    Path('graficos').mkdir(exist_ok=True)
+
+    cache = {}
+    if Path(ARQUIVO_CACHE_FIGURAS).exists():
+        with open(ARQUIVO_CACHE_FIGURAS, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+
+    resultados = {}
+    pendentes = {}
+    for nome in nomes:
+        chave = chave_figura(nome, analise, formato, dpi)
+        anterior = cache.get(nome, {})
+        if not forcar and anterior.get('chave') == chave and Path(anterior.get('caminho', '')).exists():
+            resultados[nome] = (anterior['caminho'], None)
+            print(f"↺ {nome}: sem mudanças, mantido '{anterior['caminho']}'")
+        else:
+            pendentes[nome] = chave
+
+    if pendentes:
+        # Importadas antes do pool: com fork, os processos herdam os módulos já carregados
+        _importar_plotagem()
+        with ProcessPoolExecutor(max_workers=workers or min(len(pendentes), os.cpu_count() or 1)) as executor:
+            futures = [executor.submit(_renderizar_figura, nome, analise, formato, dpi)
+                       for nome in pendentes]
+            for future in as_completed(futures):
+                nome, caminho, tempo = future.result()
+                resultados[nome] = (caminho, tempo)
+                cache[nome] = {'chave': pendentes[nome], 'caminho': caminho}
+
+        with open(ARQUIVO_CACHE_FIGURAS, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, indent=2)
+
+    print("\n⏱ Tempo de renderização por figura:")
+    for nome in nomes:
+        caminho, tempo = resultados[nome]
+        print(f"   • {nome:<13} {'cache' if tempo is None else f'{tempo:.2f}s':>8}  {caminho}")
+
+    return resultados
+
+def gerar_estatisticas_completas(analise):
     """Gera estatísticas descritivas completas"""
     print("\n" + "="*80)
     print("ESTATÍSTICAS DESCRITIVAS COMPLETAS")
@@ -318,84 +453,147 @@ def gerar_estatisticas_completas(df):
     # Estatísticas das métricas de qualidade
     print("\n📊 MÉTRICAS DE QUALIDADE DE CÓDIGO:")
     print("-" * 40)
-    metricas_qualidade = ['cbo_total', 'dit_total', 'lcom_total']
-    for metrica in metricas_qualidade:
+    for metrica in METRICAS_QUALIDADE_TOTAL:
+        resumo = analise.resumo[metrica]
         print(f"\n{metrica.upper()}:")
-        print(f"  Média: {df[metrica].mean():.3f}")
-        print(f"  Mediana: {df[metrica].median():.3f}")
-        print(f"  Desvio Padrão: {df[metrica].std():.3f}")
-        print(f"  Mínimo: {df[metrica].min():.3f}")
-        print(f"  Máximo: {df[metrica].max():.3f}")
+        print(f"  Média: {resumo['media']:.3f}")
+        print(f"  Mediana: {resumo['mediana']:.3f}")
+        print(f"  Desvio Padrão: {resumo['desvio']:.3f}")
+        print(f"  Mínimo: {resumo['minimo']:.3f}")
+        print(f"  Máximo: {resumo['maximo']:.3f}")
     
     # Estatísticas das métricas do repositório
     print("\n🌟 MÉTRICAS DO REPOSITÓRIO:")
     print("-" * 40)
-    metricas_repo = ['stars', 'releases', 'age_years']
-    for metrica in metricas_repo:
+    for metrica in METRICAS_REPOSITORIO:
+        resumo = analise.resumo[metrica]
         print(f"\n{metrica.upper()}:")
-        print(f"  Média: {df[metrica].mean():.0f}")
-        print(f"  Mediana: {df[metrica].median():.0f}")
-        print(f"  Desvio Padrão: {df[metrica].std():.0f}")
-        print(f"  Mínimo: {df[metrica].min():.0f}")
-        print(f"  Máximo: {df[metrica].max():.0f}")
+        print(f"  Média: {resumo['media']:.0f}")
+        print(f"  Mediana: {resumo['mediana']:.0f}")
+        print(f"  Desvio Padrão: {resumo['desvio']:.0f}")
+        print(f"  Mínimo: {resumo['minimo']:.0f}")
+        print(f"  Máximo: {resumo['maximo']:.0f}")
     
-    # Correlações mais interessantes
+    # Correlações das RQs com intervalos de confiança bootstrap
     print("\n🔗 CORRELAÇÕES MAIS SIGNIFICATIVAS:")
     print("-" * 40)
-    correlacoes_interesse = [
-        ('stars', 'cbo_mean'),
-        ('stars', 'releases'),
-        ('age_years', 'releases'),
-        ('age_years', 'cbo_mean'),
-        ('releases', 'cbo_mean')
-    ]
-    
-    for metrica1, metrica2 in correlacoes_interesse:
-        corr = df[metrica1].corr(df[metrica2])
-        print(f"  {metrica1} vs {metrica2}: {corr:.3f}")
+    nivel = f"{analise.nivel_confianca:.0%}"
+    for metrica1, metrica2 in PARES_RQ:
+        pearson = analise.correlacao(metrica1, metrica2)
+        spearman = analise.correlacao(metrica1, metrica2, 'spearman')
+        linha = f"  {metrica1} vs {metrica2}: r = {pearson:.3f}, ρ = {spearman:.3f}"
+        intervalo = analise.intervalos.get((metrica1, metrica2))
+        if intervalo:
+            linha += (f"  (IC {nivel}: r [{intervalo['pearson'][0]:.3f}, {intervalo['pearson'][1]:.3f}],"
+                      f" ρ [{intervalo['spearman'][0]:.3f}, {intervalo['spearman'][1]:.3f}])")
+        print(linha)
+    if analise.intervalos:
+        print(f"  (intervalos bootstrap com {analise.n_bootstrap} reamostragens)")
 
-def main():
-    """Função principal"""
-    print("🎨 Iniciando análise visual completa das métricas...")
-    print("="*80)
-    
-    # Carregar dados combinados
-    df = carregar_dados()
+def preparar_analise(n_bootstrap=0, usar_cache=True):
+    """Carrega os dados e calcula a análise. Retorna (análise, tempos) ou (None, tempos)"""
+    tempos = {'importacoes': FIM_IMPORTACOES - INICIO_IMPORTACOES}
+    inicio = time.perf_counter()
+    df = carregar_dados(usar_cache)
+    tempos['dados'] = time.perf_counter() - inicio
     if df is None:
-        return
-    
+        return None, tempos
+
     # Exibir informações básicas
     print(f"\n📋 Dados combinados carregados:")
     print(f"   • {len(df)} repositórios analisados")
     print(f"   • {len(df.columns)} colunas por repositório")
     print(f"   • Métricas disponíveis: {', '.join(df.columns)}")
-    
+
+    # Análise pré-calculada e imutável, compartilhada por relatório e gráficos
+    inicio = time.perf_counter()
+    analise = calcular_analise(df, n_bootstrap=n_bootstrap)
+    tempos['analise'] = time.perf_counter() - inicio
+    return analise, tempos
+
+def imprimir_tempos(tempos):
+    """Tempo de inicialização (importações desde o início do módulo) e de cada etapa"""
+    print("\n⏱ Tempos:")
+    for etapa, tempo in tempos.items():
+        print(f"   • {etapa:<11} {tempo:.3f}s")
+    print(f"   • {'total':<11} {time.perf_counter() - INICIO_IMPORTACOES:.3f}s")
+
+def executar_estatisticas(n_bootstrap=0, usar_cache=True):
+    """Subcomando 'stats': apenas o relatório numérico, sem carregar bibliotecas de gráficos"""
+    analise, tempos = preparar_analise(n_bootstrap, usar_cache)
+    if analise is None:
+        return
+    inicio = time.perf_counter()
+    gerar_estatisticas_completas(analise)
+    tempos['relatorio'] = time.perf_counter() - inicio
+    imprimir_tempos(tempos)
+
+def executar_graficos(nomes=None, modo='padrao', forcar=False, workers=None, estatisticas=True, usar_cache=True,
+                      n_bootstrap=0):
+    """Subcomandos 'plot' (figuras escolhidas) e 'all' (estatísticas e todas as figuras)"""
+    print("🎨 Iniciando análise visual completa das métricas...")
+    print("="*80)
+
+    analise, tempos = preparar_analise(n_bootstrap, usar_cache)
+    if analise is None:
+        return
+
     # Gerar estatísticas descritivas
-    gerar_estatisticas_completas(df)
-    
+    if estatisticas:
+        gerar_estatisticas_completas(analise)
+
     print("\n🎯 Gerando visualizações completas...")
     print("-" * 50)
-    
-    # Criar todos os gráficos
-    criar_histogramas_completos(df)
-    criar_boxplots_completos(df)
-    criar_matriz_correlacao_completa(df)
-    criar_scatter_plots_correlacoes(df)
-    criar_grafico_popularidade_qualidade(df)
-    criar_grafico_idade_metricas(df)
-    criar_ranking_repositorios(df)
-    
+
+    # Criar os gráficos (em paralelo, pulando os que não mudaram)
+    formato, dpi = MODOS_SAIDA[modo]
+    inicio = time.perf_counter()
+    resultados = renderizar_figuras(analise, nomes, formato=formato, dpi=dpi, workers=workers, forcar=forcar)
+    tempos['figuras'] = time.perf_counter() - inicio
+
     print("\n✅ Análise visual completa concluída!")
-    print("📁 Novos arquivos gerados na pasta 'graficos':")
-    print("   • graficos/histogramas_todas_metricas.png")
-    print("   • graficos/boxplots_todas_metricas.png")
-    print("   • graficos/matriz_correlacao_completa.png")
-    print("   • graficos/scatter_correlacoes_qualidade_repo.png")
-    print("   • graficos/qualidade_por_popularidade.png")
-    print("   • graficos/metricas_por_idade.png")
-    print("   • graficos/ranking_repositorios.png")
-    print("\n🔍 Use esses gráficos para análise completa dos dados!")
-    print("📊 Agora você tem correlações entre qualidade de código e características dos repositórios!")
+    print("📁 Arquivos na pasta 'graficos':")
+    for caminho, _ in resultados.values():
+        print(f"   • {caminho}")
+    imprimir_tempos(tempos)
+
+def main():
+    """Função principal"""
+    parser = argparse.ArgumentParser(description='Estatísticas e gráficos das métricas de qualidade')
+    subparsers = parser.add_subparsers(dest='comando')
+
+    stats = subparsers.add_parser('stats', help='Apenas as estatísticas (sem matplotlib/seaborn)')
+
+    plot = subparsers.add_parser('plot', help='Gera as figuras escolhidas')
+    plot.add_argument('figuras', nargs='+', choices=list(FIGURAS))
+
+    todos = subparsers.add_parser('all', help='Estatísticas e todas as figuras (padrão)')
+
+    # Só o relatório usa os intervalos de confiança; as figuras não dependem deles
+    for subparser in (stats, todos):
+        subparser.add_argument('--bootstrap', type=int, nargs='?', default=0, const=N_BOOTSTRAP,
+                               help=f'Calcula intervalos de confiança com N reamostragens (padrão: {N_BOOTSTRAP})')
+
+    for subparser in (stats, plot, todos):
+        subparser.add_argument('--sem-cache', action='store_true',
+                               help=f"Relê as entradas sem usar/gravar '{dados_metricas.CACHE_FILE}'")
+    for subparser in (plot, todos):
+        subparser.add_argument('--modo', default='padrao', choices=list(MODOS_SAIDA))
+        subparser.add_argument('--forcar', action='store_true', help='Redesenha mesmo sem mudanças')
+        subparser.add_argument('--workers', type=int, default=None)
+
+    args = parser.parse_args()
+
+    usar_cache = not getattr(args, 'sem_cache', False)
+    if args.comando == 'stats':
+        executar_estatisticas(args.bootstrap, usar_cache)
+    elif args.comando == 'plot':
+        executar_graficos(args.figuras, args.modo, args.forcar, args.workers, estatisticas=False,
+                          usar_cache=usar_cache)
+    else:
+        executar_graficos(None, getattr(args, 'modo', 'padrao'), getattr(args, 'forcar', False),
+                          getattr(args, 'workers', None), usar_cache=usar_cache,
+                          n_bootstrap=getattr(args, 'bootstrap', 0))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()